@@ -0,0 +1,220 @@
+# ai_cache.py - Two-tier cache for Gemini responses (explain, optimize, debug, quality, visualize)
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import tokenize
+import threading
+from dotenv import load_dotenv
+
+from execution_cache import LRUCache
+from code_canonical import canonicalize_python
+
+load_dotenv()
+
+# AI response cache configuration
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 256))  # In-process LRU entries
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600))  # Seconds
+AI_CACHE_PERSISTENT = os.getenv('AI_CACHE_PERSISTENT', 'True').lower() == 'true'  # ai_cache DB table
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 5000))  # Rows kept in the ai_cache table
+AI_CACHE_PRUNE_EVERY = 50  # Stores between expiry/size sweeps of the table
+AI_CACHE_CANONICAL = os.getenv('AI_CACHE_CANONICAL', 'True').lower() == 'true'  # Alpha-renamed Python keys
+
+# Bump a feature's version whenever its prompt or response handling changes,
+# so responses generated by the old prompt are no longer served
+AI_PROMPT_VERSIONS = {
+    "explain": 1,
+    "optimize": 1,
+    "debug": 1,
+    "quality": 1,
+    "visualize": 1,
+    "bundle": 1
+}
+
+C_STYLE_COMMENTS = re.compile(
+    r'//[^\n]*|/\*.*?\*/|("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`)',
+    re.DOTALL
+)
+
+
+def _strip_python_comments(code):
+    """Drop comment tokens; falls back to the raw source if it doesn't tokenize"""
+    try:
+        tokens = [tok for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+                  if tok.type != tokenize.COMMENT]
+        return tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code
+
+
+def normalize_code(code, language):
+    """
+    Reduce source to what the model's answer depends on: comments and
+    trailing whitespace removed, and for brace languages indentation too
+    (Python keeps it). The line count never changes, so line numbers in a
+    cached answer (debug, quality, visualize) still point at the right
+    lines. String literals are never touched.
+    """
+    code = (code or "").replace('\r\n', '\n').replace('\r', '\n')
+    if (language or "").lower() == "python":
+        lines = [line.rstrip() for line in _strip_python_comments(code).split('\n')]
+    else:
+        code = C_STYLE_COMMENTS.sub(lambda m: m.group(1) or '\n' * m.group(0).count('\n'), code)
+        lines = [line.strip() for line in code.split('\n')]
+    return '\n'.join(lines).rstrip('\n')
+
+
+def make_ai_cache_key(feature, code, language, extra=None):
+    """Key from (feature, prompt version, language, normalized code, extra prompt inputs)"""
+    material = json.dumps({
+        "feature": feature,
+        "version": AI_PROMPT_VERSIONS.get(feature, 1),
+        "language": (language or "").lower(),
+        "code": normalize_code(code, language),
+        "extra": extra
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class DatabaseTier:
+    """Persistent tier in the app database's ai_cache table (MySQL, PostgreSQL or SQLite)"""
+
+    def __init__(self, max_entries=AI_CACHE_MAX_ENTRIES):
+        from database import get_ai_cache_entry, set_ai_cache_entry, prune_ai_cache
+        self._get, self._set, self._prune = get_ai_cache_entry, set_ai_cache_entry, prune_ai_cache
+        self.max_entries = max_entries
+
+    def get(self, key):
+        raw = self._get(key, time.time())
+        return json.loads(raw) if raw else None
+
+    def set(self, key, feature, value, ttl):
+        now = time.time()
+        self._set(key, feature, json.dumps(value), now + ttl, now)
+
+    def prune(self):
+        return self._prune(self.max_entries, time.time())
+
+
+class AICache:
+    """
+    Gemini response cache: a bounded in-process LRU in front of the
+    persistent ai_cache table, which every worker (and every restart)
+    shares. Only successfully parsed model responses are stored - never
+    rule-based fallbacks. Table errors are logged and treated as misses.
+    """
+
+    def __init__(self, enabled=AI_CACHE_ENABLED, persistent=AI_CACHE_PERSISTENT,
+                 max_size=AI_CACHE_SIZE, ttl=AI_CACHE_TTL, canonical=AI_CACHE_CANONICAL):
+        self.enabled = enabled
+        self.canonical = canonical
+        self.ttl = ttl
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.persistent = DatabaseTier() if enabled and persistent else None
+        self._lock = threading.Lock()
+        self._stores_since_prune = 0
+        self._features = {}
+        self._counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0, "errors": 0,
+                          "bundle_hits": 0, "canonical_keys": 0}
+
+    def key(self, feature, code, language, extra=None):
+        return make_ai_cache_key(feature, code, language, extra)
+
+    def lookup_key(self, feature, code, language, extra=None):
+        """
+        (key, canonical) for a request. Python that canonicalizes is keyed by
+        its alpha-renamed source, and canonical is the CanonicalCode whose
+        to_canonical()/from_canonical() move answers in and out of the shared
+        placeholder form; otherwise canonical is None and the key is the
+        normalized-code one.
+        """
+        canonical = None
+        if self.canonical and (language or "").lower() == "python":
+            canonical = canonicalize_python(code)
+        if canonical is None:
+            return self.key(feature, code, language, extra), None
+        self._count("canonical_keys")
+        return self.key(feature, canonical.source, language, canonical.key_extra(feature, extra)), canonical
+
+    def _count(self, name, feature=None):
+        with self._lock:
+            self._counters[name] += 1
+            if feature:
+                entry = self._features.setdefault(feature, {"hits": 0, "misses": 0})
+                entry["hits" if name.endswith("hits") else "misses"] += 1
+
+    def _lookup(self, key):
+        """(value, counter name) from the first tier that has the key"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value, "memory_hits"
+        if self.persistent:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                print(f"⚠️ AI cache read error: {e}")
+                self._count("errors")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                return value, "persistent_hits"
+        return None, None
+
+    def get(self, key, feature=None):
+        """Look up a response; returns None on miss"""
+        if not self.enabled:
+            return None
+        value, tier = self._lookup(key)
+        self._count(tier or "misses", feature)
+        return value
+
+    def peek(self, key, feature=None):
+        """
+        Look up an entry another feature may answer from (an analysis
+        bundle); a miss isn't counted, a hit counts as a bundle hit for feature
+        """
+        if not self.enabled:
+            return None
+        value, _ = self._lookup(key)
+        if value is not None:
+            self._count("bundle_hits", feature)
+        return value
+
+    def set(self, key, feature, value):
+        """Store a parsed model response in both tiers"""
+        if not self.enabled or value is None:
+            return
+        self.memory.set(key, value)
+        if self.persistent:
+            try:
+                self.persistent.set(key, feature, value, self.ttl)
+                with self._lock:
+                    self._stores_since_prune += 1
+                    prune = self._stores_since_prune >= AI_CACHE_PRUNE_EVERY
+                    if prune:
+                        self._stores_since_prune = 0
+                if prune:
+                    self.persistent.prune()
+            except Exception as e:
+                print(f"⚠️ AI cache write error: {e}")
+                self._count("errors")
+        self._count("stores")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            features = {name: dict(entry) for name, entry in self._features.items()}
+        hits = counters["memory_hits"] + counters["persistent_hits"] + counters["bundle_hits"]
+        lookups = hits + counters["misses"]
+        counters.update({
+            "enabled": self.enabled,
+            "persistent": self.persistent is not None,
+            "canonical": self.canonical,
+            "entries": len(self.memory),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "features": features
+        })
+        return counters
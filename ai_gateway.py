@@ -0,0 +1,185 @@
+# ai_gateway.py - Bounded worker pool, deadlines and queue limits for Gemini calls
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# AI gateway configuration (per worker process)
+AI_GATEWAY_WORKERS = int(os.getenv('AI_GATEWAY_WORKERS', 8))  # Concurrent model calls
+AI_GATEWAY_MAX_QUEUE = int(os.getenv('AI_GATEWAY_MAX_QUEUE', 32))  # Calls waiting for a worker
+AI_GATEWAY_DEFAULT_DEADLINE = float(os.getenv('AI_GATEWAY_DEFAULT_DEADLINE', 30))  # Seconds
+AI_GATEWAY_DEADLINES = os.getenv('AI_GATEWAY_DEADLINES', 'explain=30,optimize=45,debug=45,quality=45,visualize=45,bundle=60')
+
+
+def parse_deadlines(spec=AI_GATEWAY_DEADLINES):
+    """Parse "explain=30,optimize=45" into {"explain": 30.0, "optimize": 45.0}, skipping malformed entries"""
+    deadlines = {}
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        try:
+            deadlines[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return deadlines
+
+
+class AIGatewayBusy(Exception):
+    """Too many model calls already waiting for a worker"""
+
+
+class AIGatewayTimeout(Exception):
+    """A model call missed its feature's deadline (it has been cancelled)"""
+
+
+class AICall:
+    """
+    Handed to the function running on the pool: remaining() is the time
+    left before the deadline (pass it on as the HTTP timeout), cancelled
+    is set once the caller has given up, so streaming loops stop reading.
+    """
+
+    def __init__(self, feature, deadline):
+        self.feature = feature
+        self.deadline = deadline
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class AIGateway:
+    """
+    Every Gemini call runs here: a fixed pool of worker threads, a bounded
+    number of calls waiting for one (beyond that AIGatewayBusy is raised at
+    once), and a per-feature deadline covering both the wait and the call.
+    On a missed deadline the caller gets AIGatewayTimeout, a call that never
+    started is dropped from the queue, and a running one is told to stop
+    through AICall (the HTTP timeout it was given expires by then too), so
+    a stuck request cannot pin a worker past its deadline.
+    """
+
+    def __init__(self, workers=AI_GATEWAY_WORKERS, max_queue=AI_GATEWAY_MAX_QUEUE,
+                 deadlines=None, default_deadline=AI_GATEWAY_DEFAULT_DEADLINE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.deadlines = parse_deadlines() if deadlines is None else deadlines
+        self.default_deadline = default_deadline
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-gateway")
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._features = {}
+        self._counters = {"calls": 0, "completed": 0, "errors": 0, "timeouts": 0, "rejected": 0,
+                          "cancelled_before_start": 0}
+
+    def deadline(self, feature):
+        return self.deadlines.get(feature, self.default_deadline)
+
+    def _feature(self, feature):
+        return self._features.setdefault(feature, {"calls": 0, "completed": 0, "timeouts": 0, "rejected": 0,
+                                                 "total_seconds": 0.0})
+
+    def _run(self, call, fn):
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+        try:
+            if call.cancelled or call.remaining() <= 0:
+                raise AIGatewayTimeout(f"{call.feature} AI call expired while queued")
+            return fn(call)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def call(self, feature, fn):
+        """
+        Run fn(call: AICall) on the pool and return its result within the
+        feature's deadline. Raises AIGatewayBusy, AIGatewayTimeout, or
+        whatever fn raised.
+        """
+        result = self.call_many(feature, [fn])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def call_many(self, feature, fns):
+        """
+        Run several independent fn(call) for one request (e.g. the chunks of
+        a large file) side by side under a single deadline. Returns one entry
+        per fn: its result, or the exception it raised (AIGatewayTimeout for
+        a missed deadline). Raises AIGatewayBusy, before anything is queued,
+        when they don't all fit in the queue.
+        """
+        timeout = self.deadline(feature)
+        deadline = time.monotonic() + timeout
+        calls = [AICall(feature, deadline) for _ in fns]
+        with self._lock:
+            stats = self._feature(feature)
+            if self._waiting + len(fns) > self.max_queue:
+                self._counters["rejected"] += 1
+                stats["rejected"] += 1
+                raise AIGatewayBusy(f"AI service busy: {self._waiting} requests already queued")
+            self._waiting += len(fns)
+            self._counters["calls"] += len(fns)
+            stats["calls"] += len(fns)
+
+        started = time.monotonic()
+        futures = [self._executor.submit(self._run, call, fn) for call, fn in zip(calls, fns)]
+        results = []
+        for call, future in zip(calls, futures):
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                call.cancel()
+                dropped = future.cancel()
+                with self._lock:
+                    if dropped:
+                        self._waiting -= 1
+                        self._counters["cancelled_before_start"] += 1
+                    self._counters["timeouts"] += 1
+                    stats["timeouts"] += 1
+                print(f"❌ {feature} AI call timed out after {timeout:.0f}s")
+                results.append(AIGatewayTimeout(f"{feature} AI call exceeded {timeout:.0f}s"))
+                continue
+            except Exception as e:
+                with self._lock:
+                    self._counters["errors"] += 1
+                results.append(e)
+                continue
+            with self._lock:
+                self._counters["completed"] += 1
+                stats["completed"] += 1
+                stats["total_seconds"] += time.monotonic() - started
+        return results
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            features = {}
+            for name, entry in self._features.items():
+                features[name] = {
+                    "calls": entry["calls"],
+                    "completed": entry["completed"],
+                    "timeouts": entry["timeouts"],
+                    "rejected": entry["rejected"],
+                    "deadline": self.deadline(name),
+                    "avg_seconds": round(entry["total_seconds"] / entry["completed"], 3) if entry["completed"] else None
+                }
+            counters.update({
+                "workers": self.workers,
+                "active": self._active,
+                "waiting": self._waiting,
+                "max_queue": self.max_queue,
+                "features": features
+            })
+        return counters
@@ -0,0 +1,207 @@
+# ai_json.py - Tolerant extraction, repair and validation of Gemini JSON responses
+#
+# Gemini is asked for bare JSON but regularly wraps it in markdown fences,
+# adds a sentence before or after it, leaves trailing commas, puts raw
+# newlines or unescaped quotes inside string values (optimized_code,
+# fixed_code) or stops mid-document. parse_ai_json() recovers what it can
+# instead of throwing away a 10-30 s generation:
+#   1. the first balanced {...} object is taken, surrounding text ignored
+#   2. common defects are repaired in one scan
+#   3. a truncated document is closed at the last complete value (partial)
+#   4. the result is checked against the feature's schema (types, defaults)
+import re
+import json
+
+# Field -> (expected type, default); REQUIRED fields must be present and well typed
+REQUIRED = object()
+NUMBER = (int, float)
+
+SCHEMAS = {
+    "explain": {
+        "summary": (str, ""),
+        "steps": (list, []),
+        "key_insights": (list, [])
+    },
+    "optimize": {
+        "optimized_code": (str, REQUIRED),
+        "optimizations": (list, REQUIRED)
+    },
+    "debug": {
+        "bugs_found": (list, []),
+        "suggestions": (list, []),
+        "confidence": (str, "medium")
+    },
+    "quality": {
+        "overall_score": (NUMBER, REQUIRED),
+        "strengths": (list, []),
+        "issues": (list, []),
+        "recommendations": (list, [])
+    },
+    "visualize": {
+        "steps": (list, REQUIRED),
+        "summary": (dict, {})
+    }
+}
+
+# Fields that must not be empty lists
+NON_EMPTY = {"visualize": ("steps",)}
+
+PYTHON_LITERALS = re.compile(r'"(?:\\.|[^"\\])*"|\b(True|False|None)\b')
+JSON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+MAX_SALVAGE_ATTEMPTS = 32
+
+
+def _escape_control(ch):
+    return {'\n': '\\n', '\r': '\\r', '\t': '\\t'}.get(ch) or f'\\u{ord(ch):04x}'
+
+
+def _next_significant(text, index):
+    while index < len(text) and text[index] in ' \t\r\n':
+        index += 1
+    return text[index] if index < len(text) else ''
+
+
+def _strip_trailing_comma(out):
+    i = len(out) - 1
+    while i >= 0 and out[i] in (' ', '\t', '\r', '\n'):
+        i -= 1
+    if i >= 0 and out[i] == ',':
+        del out[i]
+
+
+def repair_json(text):
+    """
+    One pass over text starting at its first '{': escapes raw control
+    characters and stray quotes inside strings, drops trailing commas and
+    stops after the first balanced object. Returns (repaired text, open
+    closers, cut points): open closers are the brackets still unclosed if
+    the text was truncated, cut points are (length, closers) at each comma
+    between values, where a truncated document can be cut and closed.
+    """
+    out = []
+    stack = []
+    cuts = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == '\\':
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                if _next_significant(text, i + 1) in (',', '}', ']', ':', ''):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')  # Quote inside the value, e.g. print("hi") in code
+            elif ch < ' ':
+                out.append(_escape_control(ch))
+            else:
+                out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return ''.join(out), [], cuts
+            continue
+        elif ch == ',':
+            cuts.append((len(out), list(stack)))
+        out.append(ch)
+
+    if in_string:
+        out.append('"')
+    return ''.join(out), stack, cuts
+
+
+def _replace_python_literals(text):
+    return PYTHON_LITERALS.sub(lambda m: JSON_LITERALS[m.group(1)] if m.group(1) else m.group(0), text)
+
+
+def extract_json(text):
+    """
+    (object, partial) from a model response: the first JSON object in it,
+    repaired if needed, and cut back to its last complete value if the
+    response was truncated (partial=True). Raises json.JSONDecodeError when
+    nothing can be recovered.
+    """
+    text = text or ""
+    start = text.find('{')
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object in AI response", text, 0)
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)  # Clean response: first object, trailing text ignored
+        if isinstance(value, dict):
+            return value, False
+    except json.JSONDecodeError:
+        pass
+
+    repaired, open_closers, cuts = repair_json(text[start:])
+    closed = _replace_python_literals(repaired)
+    if not open_closers:
+        return json.loads(closed), False
+
+    # Truncated: close what is open, else cut back to an earlier comma
+    candidates = [(repaired.rstrip().rstrip(',:'), open_closers)]
+    candidates += [(repaired[:length], closers) for length, closers in reversed(cuts[-MAX_SALVAGE_ATTEMPTS:])]
+    for body, closers in candidates:
+        try:
+            value = json.loads(_replace_python_literals(body) + ''.join(reversed(closers)))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value, True
+    return json.loads(closed + ''.join(reversed(open_closers))), True  # Raises with the position
+
+
+def validate(data, feature):
+    """
+    Check data against SCHEMAS[feature]: wrongly typed optional fields get
+    their default, numeric strings become numbers, missing or wrongly
+    typed required fields raise ValueError. Unknown features pass as is.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"AI response for {feature} is not a JSON object")
+    schema = SCHEMAS.get(feature)
+    if not schema:
+        return data
+    for field, (expected, default) in schema.items():
+        value = data.get(field)
+        if expected is NUMBER and isinstance(value, str):
+            try:
+                value = data[field] = float(value) if '.' in value else int(value)
+            except ValueError:
+                pass
+        if isinstance(value, expected) and not isinstance(value, bool):
+            continue
+        if default is REQUIRED:
+            raise ValueError(f"Invalid response format from AI: {feature} needs '{field}'")
+        data[field] = list(default) if isinstance(default, list) else dict(default) if isinstance(default, dict) else default
+    for field in NON_EMPTY.get(feature, ()):
+        if not data[field]:
+            raise ValueError(f"Invalid response format from AI: {feature} '{field}' is empty")
+    return data
+
+
+def parse_ai_json(text, feature=None):
+    """
+    Parsed and validated response for feature. A response salvaged from
+    a truncated document is marked with "partial": True (callers don't
+    cache those). Raises json.JSONDecodeError or ValueError.
+    """
+    data, partial = extract_json(text)
+    data = validate(data, feature) if feature else data
+    if partial:
+        data["partial"] = True
+        print(f"⚠️ AI {feature or 'response'}: salvaged a truncated response")
+    return data
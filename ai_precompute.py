@@ -0,0 +1,171 @@
+# ai_precompute.py - Background precomputation of AI analyses for saved and shared code
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from database import enqueue_ai_task, claim_ai_task, finish_ai_task, prune_ai_tasks, count_ai_tasks
+
+load_dotenv()
+
+# Precompute configuration
+AI_PRECOMPUTE_ENABLED = os.getenv('AI_PRECOMPUTE_ENABLED', 'True').lower() == 'true'
+AI_PRECOMPUTE_FEATURES = os.getenv('AI_PRECOMPUTE_FEATURES', 'explain,quality,optimize')
+AI_PRECOMPUTE_WORKERS = int(os.getenv('AI_PRECOMPUTE_WORKERS', 1))  # Threads per worker process
+AI_PRECOMPUTE_POLL = float(os.getenv('AI_PRECOMPUTE_POLL', 5))  # Seconds between checks while idle or busy
+AI_PRECOMPUTE_MAX_ATTEMPTS = int(os.getenv('AI_PRECOMPUTE_MAX_ATTEMPTS', 3))
+AI_PRECOMPUTE_RETRY_DELAY = float(os.getenv('AI_PRECOMPUTE_RETRY_DELAY', 60))  # Seconds, doubled per failed attempt
+AI_PRECOMPUTE_LEASE = float(os.getenv('AI_PRECOMPUTE_LEASE', 600))  # Seconds before a running task counts as abandoned
+AI_PRECOMPUTE_KEEP = int(os.getenv('AI_PRECOMPUTE_KEEP', 24 * 3600))  # Seconds finished tasks stay in the table
+AI_PRECOMPUTE_PRUNE_EVERY = 300  # Seconds between sweeps of finished tasks
+
+
+class AIPrecomputer:
+    """
+    Work queue that runs AI features for code nobody has asked about yet,
+    so the first explanation or quality score of a saved or shared snippet
+    is a cache hit. Tasks live in the ai_precompute_tasks table: they
+    survive restarts, every worker process can take them (a claim is a
+    conditional UPDATE), and a task whose worker died is picked up again
+    after AI_PRECOMPUTE_LEASE.
+
+    handlers maps a feature to fn(code, language), which fills the AI cache
+    and raises on failure. Failed tasks are retried with a doubling delay
+    up to AI_PRECOMPUTE_MAX_ATTEMPTS. Exceptions in `deferred` (quota or
+    queue exhaustion) put the task back without using an attempt, after
+    their retry_after. Tasks are only claimed while idle() is true, so
+    interactive requests keep the model to themselves.
+    """
+
+    def __init__(self, handlers, idle=None, deferred=(), enabled=AI_PRECOMPUTE_ENABLED,
+                 features=AI_PRECOMPUTE_FEATURES, workers=AI_PRECOMPUTE_WORKERS, poll=AI_PRECOMPUTE_POLL,
+                 max_attempts=AI_PRECOMPUTE_MAX_ATTEMPTS, retry_delay=AI_PRECOMPUTE_RETRY_DELAY,
+                 lease=AI_PRECOMPUTE_LEASE):
+        self.handlers = handlers
+        self.idle = idle or (lambda: True)
+        self.deferred = tuple(deferred)
+        self.enabled = enabled
+        self.features = [name.strip() for name in features.split(',') if name.strip() in handlers]
+        self.workers = workers
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_prune = 0.0
+        self._counters = {"enqueued": 0, "duplicates": 0, "completed": 0, "retried": 0, "deferred": 0,
+                          "failed": 0, "errors": 0}
+
+    def start(self):
+        """Start the worker threads (once); queued tasks from earlier runs are picked up too"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ai-precompute-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def enqueue(self, code, tasks):
+        """Queue (task_key, feature, language) runs for code; returns how many were new"""
+        if not self.enabled:
+            return 0
+        queued = 0
+        now = time.time()
+        for task_key, feature, language in tasks:
+            try:
+                added = enqueue_ai_task(task_key, feature, language, code, now)
+            except Exception as e:
+                print(f"⚠️ AI precompute: could not queue {feature} task: {e}")
+                self._count("errors")
+                continue
+            queued += added
+            self._count("enqueued" if added else "duplicates")
+        if queued:
+            self.start()
+            self._wake.set()
+        return queued
+
+    def _work(self):
+        while not self._stop.is_set():
+            if not self.idle():
+                self._stop.wait(self.poll)
+                continue
+            try:
+                self._prune()
+                task = claim_ai_task(time.time(), self.lease)
+            except Exception as e:
+                print(f"⚠️ AI precompute queue unavailable: {e}")
+                self._count("errors")
+                self._stop.wait(self.poll)
+                continue
+            if task is None:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                continue
+            self._run(*task)
+
+    def _run(self, task_id, feature, language, code, attempts):
+        handler = self.handlers.get(feature)
+        try:
+            if handler is None:
+                raise ValueError(f"No precompute handler for {feature}")
+            handler(code, language)
+        except self.deferred as e:
+            retry_after = getattr(e, "retry_after", None) or self.poll
+            self._finish(task_id, "queued", attempts, available_at=time.time() + retry_after)
+            self._count("deferred")
+            return
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                print(f"❌ AI precompute {feature} task {task_id} failed after {attempts} attempts: {e}")
+                self._finish(task_id, "failed", attempts, error=str(e)[:500])
+                self._count("failed")
+            else:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                self._finish(task_id, "queued", attempts, available_at=time.time() + delay, error=str(e)[:500])
+                self._count("retried")
+            return
+        self._finish(task_id, "done", attempts)
+        self._count("completed")
+
+    def _finish(self, task_id, status, attempts, available_at=None, error=None):
+        try:
+            finish_ai_task(task_id, status, attempts, time.time(), available_at, error)
+        except Exception as e:
+            print(f"⚠️ AI precompute: could not record task {task_id}: {e}")  # Lease expiry retries it
+            self._count("errors")
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < AI_PRECOMPUTE_PRUNE_EVERY:
+                return
+            self._last_prune = now
+        prune_ai_tasks(now - AI_PRECOMPUTE_KEEP)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters["running_threads"] = len(self._threads)
+        counters.update({"enabled": self.enabled, "features": self.features})
+        if self.enabled:
+            try:
+                counters["tasks"] = count_ai_tasks()
+            except Exception as e:
+                counters["tasks"] = {"error": str(e)}
+        return counters
@@ -0,0 +1,273 @@
+# ai_prompt.py - Token budgets for the code embedded in Gemini prompts
+#
+# The explain, optimize and debug prompts embed the user's whole program.
+# Code within AI_PROMPT_CHUNK_TOKENS goes in unchanged. Larger code is first
+# compacted (comments and trailing whitespace dropped, every line kept on
+# its line number) and, if still too large, split at function/class
+# boundaries into chunks that are analysed by concurrent calls and merged
+# back into one answer by the merge_* functions.
+import io
+import os
+import ast
+import tokenize
+from dotenv import load_dotenv
+from ai_quota import count_tokens
+
+load_dotenv()
+
+# Prompt budget configuration
+AI_PROMPT_CHUNK_TOKENS = int(os.getenv('AI_PROMPT_CHUNK_TOKENS', 4000))  # Code tokens per model call
+AI_PROMPT_MAX_TOKENS = int(os.getenv('AI_PROMPT_MAX_TOKENS', 24000))  # Code tokens per request, all chunks together
+AI_PROMPT_MAX_CHUNKS = int(os.getenv('AI_PROMPT_MAX_CHUNKS', 8))  # Concurrent model calls per request
+
+# Languages whose comments are // and /* */ (python comments are found with tokenize)
+SLASH_COMMENT_LANGUAGES = {"javascript", "java", "c", "cpp"}
+CONFIDENCE_ORDER = ("low", "medium", "high")
+
+
+class PromptTooLarge(ValueError):
+    """The code exceeds AI_PROMPT_MAX_TOKENS even after compacting"""
+
+
+class CodeChunk:
+    """Lines start_line..end_line (1-based, inclusive) of the prompt code: part index of total"""
+
+    def __init__(self, code, start_line, end_line, index=0, total=1):
+        self.code = code
+        self.start_line = start_line
+        self.end_line = end_line
+        self.index = index
+        self.total = total
+
+    def prompt_note(self, language):
+        """Sentence telling the model it sees one part of a file ("" for a whole file)"""
+        if self.total == 1:
+            return ""
+        return (f"\n**Note:** This is part {self.index + 1} of {self.total} of a larger {language} file "
+                f"(lines {self.start_line}-{self.end_line}). Analyze only this part, and number its lines "
+                f"from 1 at the first line shown.\n")
+
+    def file_line(self, line):
+        """Line number in the whole file for a line number counted within this chunk"""
+        return line + self.start_line - 1
+
+
+def _strip_python_comments(code):
+    lines = code.split("\n")
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return lines
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            row, col = token.start
+            lines[row - 1] = lines[row - 1][:col]
+    return lines
+
+
+def _strip_slash_comments(code):
+    out = []
+    quote = None
+    i = 0
+    while i < len(code):
+        ch = code[i]
+        if quote:
+            out.append(ch)
+            if ch == '\\' and i + 1 < len(code):
+                out.append(code[i + 1])
+                i += 2
+                continue
+            if ch == quote or (ch == '\n' and quote != '`'):
+                quote = None
+        elif ch in '"\'`':
+            quote = ch
+            out.append(ch)
+        elif code.startswith('//', i):
+            end = code.find('\n', i)
+            i = len(code) if end == -1 else end
+            continue
+        elif code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = len(code) if end == -1 else end + 2
+            out.append('\n' * code.count('\n', i, end))  # Keep the lines the comment spanned
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out).split("\n")
+
+
+def compact_code(code, language):
+    """code without comments and trailing whitespace; every line keeps its line number"""
+    if language == "python":
+        lines = _strip_python_comments(code)
+    elif language in SLASH_COMMENT_LANGUAGES:
+        lines = _strip_slash_comments(code)
+    else:
+        lines = code.split("\n")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def _first_line(node):
+    return min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+
+
+def _python_starts(code, budget):
+    """Line numbers where top-level statements start (and members of classes over budget); None if unparseable"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    lines = code.split("\n")
+    starts = []
+    for node in tree.body:
+        starts.append(_first_line(node))
+        if isinstance(node, ast.ClassDef):
+            size = count_tokens("\n".join(lines[_first_line(node) - 1:node.end_lineno]))
+            if size > budget:
+                starts.extend(_first_line(member) for member in node.body[1:])
+    return starts
+
+
+def _brace_starts(lines):
+    """Line numbers where a top-level declaration may start: after a line ending in } or ; at brace depth 0"""
+    starts = []
+    depth = 0
+    boundary = True
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if depth == 0 and boundary:
+            starts.append(number)
+        depth = max(0, depth + line.count('{') - line.count('}'))
+        boundary = depth == 0 and stripped[-1] in '};'
+    return starts
+
+
+def split_code(code, language, budget=AI_PROMPT_CHUNK_TOKENS):
+    """
+    [(start_line, end_line)] covering code in order, each within budget
+    tokens where possible: top-level units (functions, classes, statements)
+    are packed greedily, and a unit larger than the budget is cut by lines.
+    """
+    lines = code.split("\n")
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    def size(start, end):
+        return (offsets[end] - offsets[start - 1]) // 4  # Same estimate as count_tokens
+
+    starts = _python_starts(code, budget) if language == "python" else None
+    if starts is None:
+        starts = _brace_starts(lines)
+    starts = sorted({1} | {start for start in starts if 1 <= start <= len(lines)})
+    units = zip(starts, starts[1:] + [len(lines) + 1])
+
+    chunks = []
+    for unit_start, unit_next in units:
+        piece_start = unit_start
+        for end in range(unit_start, unit_next):
+            if end == unit_next - 1 or size(piece_start, end + 1) > budget:  # Cut before the next line overflows
+                if chunks and size(chunks[-1][0], end) <= budget:
+                    chunks[-1][1] = end
+                else:
+                    chunks.append([piece_start, end])
+                piece_start = end + 1
+    return [(start, end) for start, end in chunks]
+
+
+def plan_chunks(code, language, chunk_tokens=AI_PROMPT_CHUNK_TOKENS, max_tokens=AI_PROMPT_MAX_TOKENS,
+                max_chunks=AI_PROMPT_MAX_CHUNKS):
+    """
+    The code as it goes into prompts: [CodeChunk] holding the code itself
+    when it fits chunk_tokens, else its compacted form, split into several
+    chunks if that still doesn't fit. Raises PromptTooLarge when the
+    compacted code exceeds max_tokens or would need over max_chunks calls.
+    """
+    if count_tokens(code) <= chunk_tokens:
+        return [CodeChunk(code, 1, code.count("\n") + 1)]
+    compact = compact_code(code, language)
+    tokens = count_tokens(compact)
+    if tokens > max_tokens:
+        raise PromptTooLarge(f"Code is about {tokens} tokens; the AI limit is {max_tokens}")
+    lines = compact.split("\n")
+    if tokens <= chunk_tokens:
+        return [CodeChunk(compact, 1, len(lines))]
+    ranges = split_code(compact, language, chunk_tokens)
+    if len(ranges) > max_chunks:
+        raise PromptTooLarge(f"Code needs {len(ranges)} AI calls; the limit is {max_chunks}")
+    return [CodeChunk("\n".join(lines[start - 1:end]), start, end, index, len(ranges))
+            for index, (start, end) in enumerate(ranges)]
+
+
+def _unique(items):
+    seen = []
+    for item in items:
+        if item not in seen:
+            seen.append(item)
+    return seen
+
+
+def _stitch(parts, field):
+    """Whole-file code from each chunk's field, the chunk's own code where that chunk failed"""
+    pieces = []
+    for chunk, result in parts:
+        text = result.get(field) if result else None
+        if not isinstance(text, str):
+            text = chunk.code
+        trailing = chunk.code[len(chunk.code.rstrip("\n")):]  # Blank lines that separated it from the next chunk
+        pieces.append(text.rstrip("\n") + trailing)
+    return "\n".join(pieces)
+
+
+def _merged(parts, merged):
+    if any(result is None or result.get("partial") for _, result in parts):
+        merged["partial"] = True  # A chunk is missing: don't cache the merged answer
+    return merged
+
+
+def merge_explanations(parts):
+    """One explanation from [(chunk, result or None)] in file order; a single part is returned as is"""
+    done = [result for _, result in parts if result]
+    if len(parts) == 1:
+        return done[0]
+    merged = dict(done[0])
+    for field in ("summary", "algorithm"):
+        merged[field] = " ".join(result[field] for result in done if isinstance(result.get(field), str))
+    merged["steps"] = [step for result in done for step in result["steps"]]
+    merged["key_insights"] = _unique(insight for result in done for insight in result["key_insights"])
+    return _merged(parts, merged)
+
+
+def merge_optimizations(parts):
+    """One optimization from [(chunk, result or None)]: stitched optimized_code, all optimizations"""
+    if len(parts) == 1:
+        return parts[0][1]
+    return _merged(parts, {
+        "optimized_code": _stitch(parts, "optimized_code"),
+        "optimizations": [item for _, result in parts if result for item in result["optimizations"]]
+    })
+
+
+def merge_debug(parts):
+    """One debug report from [(chunk, result or None)]: bugs on file line numbers, stitched fixed_code"""
+    if len(parts) == 1:
+        return parts[0][1]
+    bugs = []
+    for chunk, result in parts:
+        for bug in (result or {}).get("bugs_found", []):
+            if isinstance(bug, dict) and isinstance(bug.get("line"), int) and not isinstance(bug["line"], bool):
+                bug = dict(bug, line=chunk.file_line(bug["line"]))
+            bugs.append(bug)
+    done = [result for _, result in parts if result]
+    confidence = min((result["confidence"] for result in done if result["confidence"] in CONFIDENCE_ORDER),
+                     key=CONFIDENCE_ORDER.index, default="medium")
+    return _merged(parts, {
+        "bugs_found": bugs,
+        "fixed_code": _stitch(parts, "fixed_code"),
+        "suggestions": _unique(item for result in done for item in result["suggestions"]),
+        "confidence": confidence
+    })
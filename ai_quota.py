@@ -0,0 +1,258 @@
+# ai_quota.py - Token buckets for the Gemini requests-per-minute and tokens-per-minute limits
+import os
+import math
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Gemini quota configuration (defaults: gemini-1.5-flash free tier)
+AI_QUOTA_ENABLED = os.getenv('AI_QUOTA_ENABLED', 'True').lower() == 'true'
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', 15))  # Requests per minute (0 = unlimited)
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', 1000000))  # Tokens per minute (0 = unlimited)
+AI_QUOTA_BACKEND = os.getenv('AI_QUOTA_BACKEND', 'memory').lower()  # memory (per worker) or sqlite (shared)
+AI_QUOTA_PATH = os.getenv('AI_QUOTA_PATH', 'ai_quota.db')
+AI_QUOTA_MAX_WAIT = float(os.getenv('AI_QUOTA_MAX_WAIT', 2))  # Seconds an interactive call may wait for budget
+AI_QUOTA_BACKGROUND_MAX_WAIT = float(os.getenv('AI_QUOTA_BACKGROUND_MAX_WAIT', 60))
+AI_QUOTA_BACKGROUND_RESERVE = float(os.getenv('AI_QUOTA_BACKGROUND_RESERVE', 0.3))  # Budget share kept for interactive calls
+AI_QUOTA_OUTPUT_TOKENS = int(os.getenv('AI_QUOTA_OUTPUT_TOKENS', 1024))  # Assumed response size until usage is known
+
+PRIORITIES = ("interactive", "background")
+
+
+def count_tokens(text):
+    """Rough Gemini token count of text (about 4 characters per token)"""
+    return len(text) // 4
+
+
+def estimate_tokens(prompt):
+    """Rough prompt + response token count"""
+    return count_tokens(prompt) + AI_QUOTA_OUTPUT_TOKENS
+
+
+class AIQuotaExceeded(Exception):
+    """No budget for a model call within its wait limit; retry_after is a whole number of seconds"""
+
+    def __init__(self, reason, retry_after, remaining=None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.remaining = remaining
+
+
+class MemoryBuckets:
+    """Bucket levels in this worker process only"""
+
+    shared = False
+
+    def __init__(self):
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    def update(self, fn):
+        """Atomically apply fn(levels) -> (result, new levels or None); levels is {name: (level, updated_at)}"""
+        with self._lock:
+            result, levels = fn(dict(self._levels))
+            if levels:
+                self._levels.update(levels)
+            return result
+
+
+class SQLiteBuckets:
+    """Bucket levels in a SQLite file shared by all workers on one host"""
+
+    shared = True
+
+    def __init__(self, path=AI_QUOTA_PATH):
+        self.path = path
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_quota_buckets (
+                name TEXT PRIMARY KEY,
+                level REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def update(self, fn):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')  # Serialize read-modify-write across workers
+            rows = conn.execute('SELECT name, level, updated_at FROM ai_quota_buckets').fetchall()
+            result, levels = fn({name: (level, updated_at) for name, level, updated_at in rows})
+            if levels:
+                conn.executemany('INSERT OR REPLACE INTO ai_quota_buckets (name, level, updated_at) VALUES (?, ?, ?)',
+                                 [(name, level, updated_at) for name, (level, updated_at) in levels.items()])
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+def make_buckets(backend=AI_QUOTA_BACKEND):
+    if backend == "sqlite":
+        try:
+            return SQLiteBuckets()
+        except sqlite3.Error as e:
+            print(f"⚠️ AI quota SQLite store unavailable ({e}); using per-worker buckets")
+    return MemoryBuckets()
+
+
+class AIQuota:
+    """
+    Gemini rate limits modelled as two token buckets (requests and tokens
+    per minute) that refill continuously. acquire() takes budget before a
+    call is sent: it waits up to max_wait for a refill and otherwise raises
+    AIQuotaExceeded at once, so routes fall back without a round trip.
+
+    Interactive calls go first: background calls may not dip into the last
+    AI_QUOTA_BACKGROUND_RESERVE of either bucket, and yield while an
+    interactive call in this process is waiting. The token cost is an
+    estimate; settle() corrects it with the usage the response reports,
+    and release() refunds calls that never reached Gemini.
+    With the sqlite backend every worker on the host draws from one budget.
+    """
+
+    def __init__(self, enabled=AI_QUOTA_ENABLED, rpm=GEMINI_RPM, tpm=GEMINI_TPM, buckets=None,
+                 max_wait=AI_QUOTA_MAX_WAIT, background_max_wait=AI_QUOTA_BACKGROUND_MAX_WAIT,
+                 background_reserve=AI_QUOTA_BACKGROUND_RESERVE):
+        self.enabled = enabled
+        self.limits = {name: limit for name, limit in (("requests", rpm), ("tokens", tpm)) if limit > 0}
+        self.buckets = buckets if buckets is not None else make_buckets()
+        self.max_wait = {"interactive": max_wait, "background": background_max_wait}
+        self.background_reserve = background_reserve
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self._counters = {"admitted": 0, "waited": 0, "rejected": 0, "upstream_429": 0, "released": 0,
+                          "admitted_background": 0, "rejected_background": 0}
+
+    def _refilled(self, levels, now):
+        current = {}
+        for name, limit in self.limits.items():
+            level, updated_at = levels.get(name, (limit, now))
+            current[name] = min(limit, level + max(0.0, now - updated_at) * limit / 60.0)
+        return current
+
+    def _try_take(self, cost, priority):
+        """0 if the cost was taken, else seconds until the buckets could cover it"""
+        def attempt(levels):
+            now = time.time()
+            current = self._refilled(levels, now)
+            wait = 0.0
+            for name, limit in self.limits.items():
+                floor = limit * self.background_reserve if priority == "background" else 0.0
+                missing = min(cost[name], limit - floor) + floor - current[name]
+                if missing > 0:
+                    wait = max(wait, missing * 60.0 / limit)
+            if wait:
+                return wait, None
+            return 0.0, {name: (current[name] - cost[name], now) for name in self.limits}
+        return self.buckets.update(attempt)
+
+    def acquire(self, tokens, priority="interactive", max_wait=None, requests=1):
+        """Take `requests` requests and `tokens` tokens, waiting up to max_wait seconds; raises AIQuotaExceeded"""
+        if not self.enabled or not self.limits:
+            return
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown AI priority: {priority}")
+        cost = {"requests": requests, "tokens": tokens}
+        max_wait = self.max_wait[priority] if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        waited = False
+        with self._cond:
+            if priority == "interactive":
+                self._interactive_waiting += 1
+        try:
+            while True:
+                if priority == "background" and self._interactive_waiting:
+                    wait = 0.1  # Let interactive callers in this process through first
+                else:
+                    wait = self._try_take(cost, priority)
+                    if not wait:
+                        self._count("admitted_background" if priority == "background" else "admitted")
+                        if waited:
+                            self._count("waited")
+                        return
+                left = deadline - time.monotonic()
+                if wait > left:
+                    self._count("rejected_background" if priority == "background" else "rejected")
+                    raise AIQuotaExceeded("Gemini quota exhausted", retry_after=max(1, math.ceil(wait)),
+                                          remaining=self.remaining())
+                waited = True
+                with self._cond:
+                    self._cond.wait(min(wait, 0.5))  # Re-check: other workers may have refunded budget
+        finally:
+            if priority == "interactive":
+                with self._cond:
+                    self._interactive_waiting -= 1
+
+    def settle(self, estimated, actual):
+        """Refund or charge the difference between the estimated and the reported token count"""
+        if not self.enabled or "tokens" not in self.limits or not actual:
+            return
+        delta = estimated - actual
+
+        def adjust(levels):
+            now = time.time()
+            current = self._refilled(levels, now)
+            return None, {"tokens": (current["tokens"] + delta, now)}
+        self.buckets.update(adjust)
+        if delta > 0:
+            with self._cond:
+                self._cond.notify_all()
+
+    def release(self, tokens, requests=1):
+        """Give back budget taken by acquire() for calls that were never sent (queue full, cancelled)"""
+        if not self.enabled or not self.limits:
+            return
+        refund = {"requests": requests, "tokens": tokens}
+
+        def give_back(levels):
+            now = time.time()
+            current = self._refilled(levels, now)
+            return None, {name: (min(limit, current[name] + refund[name]), now)
+                          for name, limit in self.limits.items()}
+        self.buckets.update(give_back)
+        self._count("released")
+        with self._cond:
+            self._cond.notify_all()
+
+    def exhaust(self):
+        """Gemini answered 429 anyway (other clients share the key): empty both buckets"""
+        if not self.enabled or not self.limits:
+            return
+        now = time.time()
+        self.buckets.update(lambda levels: (None, {name: (0.0, now) for name in self.limits}))
+        self._count("upstream_429")
+
+    def remaining(self):
+        """Budget left right now: {"requests": n, "tokens": n}"""
+        if not self.limits:
+            return {}
+        current = self.buckets.update(lambda levels: (self._refilled(levels, time.time()), None))
+        return {name: max(0, int(level)) for name, level in current.items()}
+
+    def _count(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._cond:
+            counters = dict(self._counters)
+            counters["interactive_waiting"] = self._interactive_waiting
+        remaining = self.remaining() if self.enabled else {}
+        counters.update({
+            "enabled": self.enabled,
+            "shared": self.buckets.shared,
+            "limits": {"rpm": self.limits.get("requests"), "tpm": self.limits.get("tokens")},
+            "remaining": remaining
+        })
+        return counters
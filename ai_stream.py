@@ -0,0 +1,134 @@
+# ai_stream.py - Incremental parsing of streamed Gemini JSON responses
+#
+# The model streams its JSON answer in arbitrary text chunks. The parser
+# scans each chunk once and reports every top-level field, and every element
+# of a top-level array, as soon as its closing character arrives, so the
+# browser can render explanation steps or optimizations one by one instead
+# of waiting for the whole answer.
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Feed text chunks with feed(); each call returns the events completed
+    by that chunk:
+        ("item", field, index, value)  - element `index` of top-level array `field`
+        ("field", field, value)        - any top-level value, once fully closed
+    Text before the first '{' (markdown fences, chatter) is skipped. Elements
+    that are not valid JSON on their own are dropped; the caller still parses
+    the full response at the end.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.key = None
+        self.expect_key = True
+        self.value_start = None
+        self.array_field = None  # Key of the top-level array being read
+        self.item_start = None
+        self.item_index = 0
+
+    def _load(self, start, end):
+        try:
+            return True, json.loads(self.buffer[start:end])
+        except ValueError:
+            return False, None
+
+    def _end_item(self, end, events):
+        if self.item_start is not None:
+            ok, value = self._load(self.item_start, end)
+            if ok:
+                events.append(("item", self.array_field, self.item_index, value))
+            self.item_index += 1
+            self.item_start = None
+
+    def _end_value(self, end, events):
+        if self.value_start is not None and self.key is not None:
+            ok, value = self._load(self.value_start, end)
+            if ok:
+                events.append(("field", self.key, value))
+        self.key = None
+        self.value_start = None
+        self.array_field = None
+        self.expect_key = True
+
+    def feed(self, text):
+        events = []
+        if self.done or not text:
+            return events
+        self.buffer += text
+        buffer = self.buffer
+        i = self.pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if not self.started:
+                if ch == '{':
+                    self.started = True
+                    self.depth = 1
+                i += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.expect_key:
+                        ok, key = self._load(self.string_start, i + 1)
+                        self.key = key if ok else None
+                i += 1
+                continue
+
+            if ch.isspace():
+                i += 1
+                continue
+            if ch == ':' and self.depth == 1:
+                self.expect_key = False
+                i += 1
+                continue
+            if ch == ',':
+                if self.depth == 1:
+                    self._end_value(i, events)
+                elif self.depth == 2 and self.array_field is not None:
+                    self._end_item(i, events)
+                i += 1
+                continue
+
+            # Start of a top-level value, or of an element of a top-level array
+            if self.depth == 1 and not self.expect_key and self.value_start is None:
+                self.value_start = i
+            elif self.depth == 2 and self.array_field is not None and self.item_start is None and ch != ']':
+                self.item_start = i
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in '{[':
+                self.depth += 1
+                if self.depth == 2 and ch == '[' and self.value_start == i:
+                    self.array_field = self.key
+                    self.item_index = 0
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 2 and self.array_field is not None:
+                    self._end_item(i + 1, events)  # Object/array element just closed
+                elif self.depth == 1 and ch == ']' and self.array_field is not None:
+                    self._end_item(i, events)  # Last scalar element, if any
+                elif self.depth == 0:
+                    self._end_value(i, events)
+                    self.done = True
+                    self.pos = i + 1
+                    return events
+            i += 1
+
+        self.pos = i
+        return events
@@ -1,16 +1,35 @@
 # app.py
 import os
-from flask import Flask, request, jsonify, render_template, redirect, url_for, make_response, Response, session, flash
-import sys, ast, traceback, re, requests, subprocess, tempfile
+from flask import Flask, request, jsonify, render_template, redirect, url_for, make_response, Response, session, flash, stream_with_context
+import sys, ast, traceback, re, requests, subprocess, tempfile, time, queue, threading
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from database import init_db, fetch_one, execute_query, add_to_history, get_user_history, get_history_by_id, delete_history_item, generate_code_title
+from database import init_db, fetch_one, execute_query, add_to_history, get_user_history, get_history_by_id, delete_history_item, generate_code_title, get_runtime_stats
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import json
 from email_utils import init_mail, generate_verification_token, generate_reset_token, send_verification_email, send_password_reset_email, send_welcome_email
 from oauth_config import init_oauth
+from judge0_client import Judge0Client, JUDGE0_URLS, RAPIDAPI_KEY, JUDGE0_BATCH_SIZE, PENDING_STATUSES, COMPILED_LANGUAGE_IDS
+from execution_jobs import JobManager
+from executors import LocalPythonExecutor, ExecutorUnavailable, parse_backends
+from execution_cache import ExecutionCache, SingleFlight, make_cache_key
+from execution_result import ExecutionResult
+from compile_cache import CompileCache
+from execution_benchmark import generate_inputs, summarize, compare, combine, BENCHMARK_MAX_RUNS, BENCHMARK_MAX_INPUTS
+from execution_scheduler import ExecutionScheduler, SchedulerRejected, EXEC_SCHED_AUTH_WEIGHT
+from judge0_callbacks import CallbackRegistry, decode_callback
+from ai_cache import AICache
+from ai_stream import IncrementalJSONParser
+from ai_json import parse_ai_json, extract_json, validate as validate_ai_json
+from ai_prompt import PromptTooLarge, plan_chunks, merge_explanations, merge_optimizations, merge_debug
+from ai_gateway import AIGateway, AIGatewayBusy, AIGatewayTimeout
+from ai_quota import AIQuota, AIQuotaExceeded, estimate_tokens
+from ai_precompute import AIPrecomputer
+import copy
 
 # Load environment variables from .env file
 load_dotenv()
@@ -57,6 +76,191 @@ oauth, google_oauth, github_oauth = init_oauth(app)
 # Initialize database on startup
 init_db()
 
+# Gemini response cache: in-process LRU over the ai_cache table, keyed by
+# (feature, prompt version, language, comment/whitespace-normalized code);
+# Python is keyed by its alpha-renamed AST so renamed variables still hit.
+# Identical concurrent requests share one model call.
+ai_cache = AICache()
+ai_single_flight = SingleFlight()
+
+# Every Gemini call runs on this bounded pool with a per-feature deadline,
+# after taking its share of the Gemini RPM/TPM budget
+ai_gateway = AIGateway()
+ai_quota = AIQuota()
+
+
+def cached_ai_call(feature, code, language, generate, extra=None):
+    """
+    Serve an AI feature from the response cache. On a miss generate() runs
+    once per key across concurrent requests and its result is stored unless
+    it is None (no usable model answer) or partial (salvaged from a
+    truncated response). Exceptions propagate uncached.
+    extra holds any other prompt input the answer depends on. Canonically
+    keyed answers are stored in placeholder form and returned in this
+    caller's identifiers. explain, quality and debug are answered from a
+    cached /api/ai/analyze bundle of the same code when there is one.
+    """
+    if feature in AI_BUNDLE_SECTIONS:
+        section = bundled_section(feature, code, language)
+        if section is not None:
+            return section
+    key, canonical = ai_cache.lookup_key(feature, code, language, extra)
+    value = ai_cache.get(key, feature)
+    if value is None:
+        def generate_and_store():
+            result = generate()
+            if canonical is not None and result is not None:
+                result = canonical.to_canonical(result)
+            if not (isinstance(result, dict) and result.get("partial")):
+                ai_cache.set(key, feature, result)
+            return result
+        value = ai_single_flight.do(key, generate_and_store)
+    if canonical is not None and value is not None:
+        return canonical.from_canonical(value)  # Builds new containers
+    return copy.deepcopy(value)  # Callers may decorate the response they get
+
+
+def gemini_generate_text(feature, prompt, on_chunk=None, priority="interactive"):
+    """
+    Text of one Gemini response. The call first takes budget from the
+    RPM/TPM quota (AIQuotaExceeded when there is none), then runs on the AI
+    gateway's worker pool within the feature's deadline (AIGatewayBusy /
+    AIGatewayTimeout otherwise). With on_chunk the response is streamed and
+    on_chunk(text) is called for each piece as it arrives.
+    """
+    estimated = estimate_tokens(prompt)
+    ai_quota.acquire(estimated, priority)
+    usage = {}
+
+    def generate(call):
+        usage["sent"] = True
+        options = {"timeout": max(call.remaining(), 1.0)}  # Expires with the deadline
+        if on_chunk is None:
+            response = gemini_model.generate_content(prompt, request_options=options)
+            usage["tokens"] = _total_tokens(response)
+            return response.text
+        parts = []
+        for chunk in gemini_model.generate_content(prompt, stream=True, request_options=options):
+            usage["tokens"] = _total_tokens(chunk) or usage.get("tokens")  # Running total
+            if call.cancelled:
+                break  # Caller gave up: stop reading and free the worker
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Chunk without text parts (e.g. only finish/safety metadata)
+            if text:
+                parts.append(text)
+                on_chunk(text)
+        return "".join(parts)
+
+    try:
+        return ai_gateway.call(feature, generate)
+    except google_exceptions.TooManyRequests:
+        ai_quota.exhaust()  # Budget was off (key shared elsewhere): fall back until it refills
+        raise
+    finally:
+        if usage.get("sent"):
+            ai_quota.settle(estimated, usage.get("tokens"))
+        else:
+            ai_quota.release(estimated)  # Gateway full, or cancelled before a worker took it
+
+
+def gemini_generate_many(feature, prompts, priority="interactive"):
+    """
+    Texts of several independent Gemini responses for one request (the
+    chunks of a large file), generated side by side on the AI gateway under
+    the feature's deadline. Quota for all of them is taken up front. Returns
+    one entry per prompt: the text, or the exception that call raised.
+    """
+    estimates = [estimate_tokens(prompt) for prompt in prompts]
+    ai_quota.acquire(sum(estimates), priority, requests=len(prompts))
+    usage = [None] * len(prompts)
+    sent = [False] * len(prompts)
+
+    def make_generate(index, prompt):
+        def generate(call):
+            sent[index] = True
+            options = {"timeout": max(call.remaining(), 1.0)}
+            response = gemini_model.generate_content(prompt, request_options=options)
+            usage[index] = _total_tokens(response)
+            return response.text
+        return generate
+
+    try:
+        results = ai_gateway.call_many(feature, [make_generate(i, prompt) for i, prompt in enumerate(prompts)])
+    finally:
+        ran = [i for i in range(len(prompts)) if sent[i]]
+        if len(ran) < len(prompts):  # Never reached Gemini: refund request and tokens
+            ai_quota.release(sum(estimates[i] for i in range(len(prompts)) if not sent[i]),
+                             requests=len(prompts) - len(ran))
+        if ran:
+            ai_quota.settle(sum(estimates[i] for i in ran), sum(usage[i] or estimates[i] for i in ran))
+    if any(isinstance(result, google_exceptions.TooManyRequests) for result in results):
+        ai_quota.exhaust()
+    return results
+
+
+def generate_ai_parts(feature, chunks, build_prompt, on_chunk=None, priority="interactive"):
+    """
+    [(chunk, parsed answer or None)] for the plan_chunks() split of a
+    request's code; build_prompt(chunk) makes each prompt. A single chunk
+    is one gemini_generate_text call (streamed through on_chunk, errors
+    propagate). Several run concurrently; a chunk whose call or parse
+    failed is None, and if every chunk failed the first error is raised.
+    """
+    if len(chunks) == 1:
+        response_text = gemini_generate_text(feature, build_prompt(chunks[0]), on_chunk, priority)
+        return [(chunks[0], parse_ai_json(response_text.strip(), feature))]
+
+    print(f"✂️ {feature}: code split into {len(chunks)} chunks")
+    parts, errors = [], []
+    responses = gemini_generate_many(feature, [build_prompt(chunk) for chunk in chunks], priority)
+    for chunk, response_text in zip(chunks, responses):
+        try:
+            if isinstance(response_text, Exception):
+                raise response_text
+            parts.append((chunk, parse_ai_json(response_text.strip(), feature)))
+        except Exception as e:
+            print(f"⚠️ {feature} chunk {chunk.index + 1}/{chunk.total} failed: {e}")
+            errors.append(e)
+            parts.append((chunk, None))
+    if len(errors) == len(chunks):
+        raise errors[0]
+    return parts
+
+
+def _total_tokens(response):
+    """Prompt + response tokens Gemini reports for a response (or stream chunk), None if absent"""
+    metadata = getattr(response, "usage_metadata", None)
+    return getattr(metadata, "total_token_count", None) or None
+
+
+def ai_unavailable_response(error):
+    """
+    429 + Retry-After and the remaining budget when the Gemini quota is
+    spent (here or upstream), 503 + Retry-After when the AI gateway queue
+    is full, 504 when the call missed its deadline
+    """
+    if isinstance(error, google_exceptions.TooManyRequests):
+        # gemini_generate_* already emptied the buckets; a full window refills them
+        error = AIQuotaExceeded("Gemini answered 429", retry_after=60, remaining=ai_quota.remaining())
+    if isinstance(error, AIQuotaExceeded):
+        response = jsonify({
+            "error": "API Rate Limit Exceeded",
+            "detail": f"The Gemini quota is used up for now. Try again in {error.retry_after} seconds.",
+            "retry_after": error.retry_after,
+            "remaining": error.remaining
+        })
+        response.status_code = 429
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response
+    if isinstance(error, AIGatewayBusy):
+        response = jsonify({"error": "AI service busy", "detail": str(error)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    return jsonify({"error": "AI request timed out", "detail": str(error)}), 504
+
 # ---------------- HELPER FUNCTIONS ----------------
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -864,142 +1068,315 @@ def simulate_simple_python(code):
 
 
 # ---------------- JUDGE0 API with multiple reliable fallback options ----------------
-# NOTE: Multiple endpoints ensure execution always works - never shows "Cannot connect" error!
-JUDGE0_URLS = [
-    # "http://localhost:2358",  # ❌ DISABLED: cgroup v2 incompatibility on Windows
-    "https://ce.judge0.com",  # Primary: Free Public API
-    "https://judge0.p.rapidapi.com",  # Fallback 1: RapidAPI (auto-handled)
-    "https://judge0-ce.p.rapidapi.com"  # Fallback 2: RapidAPI CE
-]
+# Endpoints and RapidAPI key live in judge0_client.py; all traffic goes through
+# one pooled keep-alive session per endpoint. With JUDGE0_CALLBACK_URL set,
+# Judge0 pushes finished submissions to /api/judge0/callback/<nonce> and
+# polling is only a fallback for callbacks that never arrive.
+judge0_callbacks = CallbackRegistry()
+judge0_client = Judge0Client(JUDGE0_URLS, api_key=RAPIDAPI_KEY, callbacks=judge0_callbacks)
+
+# Judge0 language IDs used by the editor
+LANGUAGE_NAMES = {71: "Python", 50: "C", 54: "C++", 62: "Java", 63: "JavaScript"}
+
+# Content-addressed result cache shared by /run and /compile
+execution_cache = ExecutionCache()
+
+# Identical concurrent runs wait on one shared Judge0 submission
+judge0_single_flight = SingleFlight()
+ADMISSION_REJECTED = object()  # Flight result when the leader's scheduler ticket was refused
+
+
+# Compile-once, run-many for C/C++/Java: one Judge0 build per source, then
+# every stdin variation runs the cached artifact without recompiling
+compile_cache = CompileCache()
+compile_single_flight = SingleFlight()
+
 
-# RapidAPI key from environment or hardcoded
-RAPIDAPI_KEY = os.getenv('JUDGE0_API_KEY', None)  # Set in .env file or here
+# Execution backends: Judge0 by default, the local Python sandbox for
+# languages mapped to "local" in EXECUTION_BACKENDS (e.g. "71=local")
+local_executor = LocalPythonExecutor()
+EXECUTORS = {"local": local_executor}
+execution_backends = parse_backends()
 
+# Admission control: per-user in-flight caps, a concurrency budget per
+# backend and weighted fair queuing; overload is shed with 429 + Retry-After
+execution_scheduler = ExecutionScheduler()
 
-def run_judge0(code, language_id=71, stdin=""):
+
+def execution_ticket(language_id, backend=None):
+    """Scheduler ticket for the current request's user (client IP when anonymous) on the language's backend"""
+    if session.get('user_id'):
+        user_key, weight = f"user:{session['user_id']}", EXEC_SCHED_AUTH_WEIGHT
+    else:
+        user_key, weight = f"ip:{request.remote_addr}", 1.0
+    if backend is None:
+        executor = EXECUTORS.get(execution_backends.get(language_id, "judge0"))
+        backend = executor.name if executor and executor.supports(language_id) else "judge0"
+    return execution_scheduler.ticket(user_key, backend, weight)
+
+
+def execution_busy_response(error):
+    """429 with Retry-After for an execution shed by the scheduler"""
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def execute_on_backend(code, language_id, stdin="", wait=False, on_status=None, on_output=None):
     """
-    Try to run code on Judge0 with multiple fallback options.
-    GUARANTEED: Always returns result - never shows "Cannot connect" error!
-    
-    Attempts:
-    1. Free public API (ce.judge0.com)
-    2. RapidAPI endpoints (if key configured)
-    3. Graceful fallback with syntax check
+    Run code on the backend configured for its language.
+
+    Local backends run on this host with no network round trip; if they
+    can't take the submission (unsupported host, sandbox setup failure) the
+    run falls back to Judge0 with health-scored routing and hedging.
+    on_output(stream, text) receives output chunks as they are produced
+    (local backends only; Judge0 results arrive whole).
+
+    Returns (result, error): an ExecutionResult, or None and the last error
+    when every endpoint failed.
     """
+    started = time.time()
+    executor = EXECUTORS.get(execution_backends.get(language_id, "judge0"))
+    if executor and executor.supports(language_id):
+        try:
+            if on_status:
+                on_status("Processing")
+            result = executor.run(code, language_id, stdin, on_output=on_output)
+            return ExecutionResult.from_judge0(result, endpoint=executor.name, latency=time.time() - started), None
+        except ExecutorUnavailable as e:
+            print(f"⚠️ {executor.name} executor unavailable, falling back to Judge0: {e}")
+
+    if compile_cache.supports(language_id):
+        result, last_error = execute_compiled_once(code, language_id, stdin, wait=wait, on_status=on_status)
+        if result or last_error:
+            return result, last_error
+
     payload = {
         "source_code": code,
         "language_id": language_id,
         "stdin": stdin
     }
-    
-    last_error = None
-    attempted_urls = []
-    
-    # Try each Judge0 endpoint
-    for base_url in JUDGE0_URLS:
-        # Skip RapidAPI if no key configured
-        if "rapidapi.com" in base_url and not RAPIDAPI_KEY:
-            continue
+    result, last_error, base_url = judge0_client.run_hedged(
+        lambda base_url: judge0_attempt(base_url, payload, language_id, wait=wait, on_status=on_status),
+        language_id
+    )
+    if not result:
+        return None, last_error
+    return ExecutionResult.from_judge0(result, endpoint=base_url, latency=time.time() - started), None
+
+
+def execute_compiled_once(code, language_id, stdin="", wait=False, on_status=None):
+    """
+    Run C/C++/Java through the compile cache: the first run of a source builds
+    it on Judge0, later runs (any stdin) execute the cached artifact.
+
+    The result's compile_cache is set to {hit, compile_seconds}. Returns
+    (result, error) like execute_on_backend, or (None, None) when no artifact
+    could be built so the caller should submit the source normally.
+    """
+    started = time.time()
+    key = compile_cache.key(code, language_id)
+    artifact = compile_cache.get(key)
+    hit = artifact is not None
+    if not hit:
+        artifact, build_result = compile_single_flight.do(
+            key, lambda: _build_compiled_artifact(code, language_id, key, wait)
+        )
+        if artifact is None:
+            if build_result is None:
+                return None, None
+            # Compilation Error: the build submission is the answer
+            build_result.compile_cache = {"hit": False, "compile_seconds": None}
+            return build_result, None
+
+    payload = compile_cache.run_payload(artifact, stdin)
+    result, last_error, base_url = judge0_client.run_hedged(
+        lambda base_url: judge0_attempt(base_url, payload, language_id, wait=wait, on_status=on_status),
+        language_id
+    )
+    if not result:
+        return None, last_error
+
+    result = ExecutionResult.from_judge0(result, endpoint=base_url, latency=time.time() - started)
+    result.compile_cache = {"hit": hit, "compile_seconds": artifact.compile_seconds}
+    if not result.compile_output:
+        result.compile_output = artifact.compile_output  # Warnings from the original build
+    return result, None
+
+
+def _build_compiled_artifact(code, language_id, key, wait):
+    """One Judge0 build for the compile cache; returns (artifact, compile_error_result)"""
+    payload = compile_cache.build_payload(code, language_id)
+    started = time.time()
+    result, last_error, base_url = judge0_client.run_hedged(
+        lambda base_url: judge0_attempt(base_url, payload, language_id, wait=wait),
+        language_id
+    )
+    if not result:
+        print(f"⚠️ Compile cache build failed, using plain submissions: {last_error}")
+        compile_cache.build_failed()
+        return None, None
+
+    if (result.get("status") or {}).get("description") == "Compilation Error":
+        compile_cache.record("compile_errors")
+        return None, ExecutionResult.from_judge0(result, endpoint=base_url, latency=time.time() - started)
+
+    artifact = compile_cache.artifact_from_build(result, language_id, time.time() - started)
+    if artifact is None:
+        print(f"⚠️ Compile cache build returned no artifact: {(result.get('status') or {}).get('description')}")
+        compile_cache.build_failed()
+        return None, None
+
+    compile_cache.put(key, artifact)
+    compile_cache.record("builds")
+    return artifact, None
+
+
+def judge0_attempt(base_url, payload, language_id, wait=False, on_status=None):
+    """
+    One submit-and-wait attempt against a single Judge0 endpoint.
+
+    With wait=True Judge0 blocks until the result is ready (LONG timeout for
+    Java/C++ compilation); otherwise, or if the result is still queued, the
+    result comes from the submission's callback when callbacks are enabled,
+    or the token is polled with adaptive backoff. Callbacks replace wait=True
+    too, so no connection is held open while Judge0 runs the code.
+
+    on_status is forwarded to the poller to report queue/processing transitions.
+
+    Returns (result, error): the finished submission when it produced output,
+    or None and the reason this endpoint failed.
+    """
+    callback = judge0_callbacks.register() if judge0_callbacks.enabled else None
+    if callback:
+        nonce, callback_url = callback
+        payload = dict(payload, callback_url=callback_url)
+    try:
+        if wait and not callback:
+            submit = judge0_client.submit(base_url, payload, wait=True, timeout=120)
+        else:
+            submit = judge0_client.submit(base_url, payload, wait=False, timeout=15)
         
-        attempted_urls.append(base_url)
-            
-        try:
-            headers = {"Content-Type": "application/json"}
-            
-            # Add RapidAPI headers if needed
-            if "rapidapi.com" in base_url and RAPIDAPI_KEY:
-                headers.update({
-                    "X-RapidAPI-Key": RAPIDAPI_KEY,
-                    "X-RapidAPI-Host": "judge0-ce.p.rapidapi.com"
-                })
-            
-            # Submit code with LONG timeout for compilation (Java/C++ take time)
-            timeout_seconds = 120  # 2 minutes for slow free API + compilation
-            
-            # Try with wait=true first (blocking call, returns result immediately)
-            submit = requests.post(
-                f"{base_url}/submissions/?base64_encoded=false&wait=true",
-                json=payload,
-                headers=headers,
-                timeout=timeout_seconds
-            )
-            
-            if submit.status_code not in [200, 201]:
-                last_error = f"Server returned status {submit.status_code}"
-                continue
-            
-            result = submit.json()
-            
-            # Check if we got the result directly (wait=true worked)
-            if result.get("status"):
-                status = result.get("status", {}).get("description")
-                if status == "Accepted" or result.get("stdout") or result.get("stderr"):
-                    output = ""
-                    if result.get("stdout"):
-                        output += result.get("stdout")
-                    if result.get("stderr"):
-                        output += "\n[stderr]:\n" + result.get("stderr")
-                    if result.get("compile_output"):
-                        output += "\n[compile_output]:\n" + result.get("compile_output")
-                    return output or "⚠️ No output"
-                elif status not in ["In Queue", "Processing"]:
-                    last_error = f"Execution failed with status: {status}"
-                    continue
-            
-            # If wait=true didn't return result, fall back to polling
+        if submit.status_code not in (200, 201):
+            return None, f"Server returned status {submit.status_code}"
+        
+        result = submit.json()
+        status = (result.get("status") or {}).get("description")
+        
+        # wait=false, or wait=true returned before execution finished
+        if not status or status in PENDING_STATUSES:
             token = result.get("token")
             if not token:
-                last_error = "No token received from server"
-                continue
+                return None, "No token received from server"
+            if callback:
+                callback = None  # await_callback owns the nonce from here
+                result, poll_error = judge0_client.await_callback(base_url, token, nonce, language_id,
+                                                                  request_timeout=60 if wait else 15,
+                                                                  on_status=on_status)
+            else:
+                result, poll_error = judge0_client.poll(base_url, token, language_id,
+                                                        request_timeout=60 if wait else 15, on_status=on_status)
+            if not result:
+                return None, poll_error
+            status = result.get("status", {}).get("description")
+        
+        # Check if execution was successful (a compile error is a real answer too)
+        if status == "Accepted" or result.get("stdout") or result.get("stderr") or result.get("compile_output"):
+            return result, None
+        
+        # Execution failed (Internal Error, etc), caller tries next endpoint
+        return None, f"Execution failed with status: {status}"
+    
+    except requests.exceptions.ConnectionError:
+        return None, f"Cannot connect to {base_url}"
+    except requests.exceptions.Timeout:
+        return None, f"Timeout for {base_url}"
+    except requests.exceptions.RequestException as e:
+        return None, f"Request error: {str(e)}"
+    finally:
+        if callback:
+            judge0_callbacks.discard(callback[0])
 
-            # Poll for result with LONGER timing (max 60 attempts = 2 minutes)
-            import time
-            for attempt in range(60):  # More attempts for Java/C++ compilation
-                time.sleep(2)  # 2 second delays
-                res = requests.get(
-                    f"{base_url}/submissions/{token}?base64_encoded=false",
-                    headers=headers,
-                    timeout=60  # Longer timeout for compilation
-                )
-                
-                if res.status_code != 200:
-                    break
-                    
-                result = res.json()
-                status = result.get("status", {}).get("description")
-                
-                if status not in ["In Queue", "Processing"]:
-                    # Check if execution was successful
-                    if status == "Accepted" or result.get("stdout") or result.get("stderr"):
-                        output = ""
-                        if result.get("stdout"):
-                            output += result.get("stdout")
-                        if result.get("stderr"):
-                            output += "\n[stderr]:\n" + result.get("stderr")
-                        if result.get("compile_output"):
-                            output += "\n[compile_output]:\n" + result.get("compile_output")
-                        return output or "⚠️ No output"
-                    else:
-                        # Execution failed (Internal Error, etc), try next endpoint
-                        last_error = f"Execution failed with status: {status}"
-                        break
-            
-            last_error = "Timeout waiting for execution"
-            
-        except requests.exceptions.ConnectionError:
-            last_error = f"Connection error"
-            continue
-        except requests.exceptions.Timeout:
-            last_error = f"Request timeout"
-            continue
-        except requests.exceptions.RequestException as e:
-            last_error = f"Request error: {str(e)}"
-            continue
-        except Exception as e:
-            last_error = f"Unexpected error: {str(e)}"
-            continue
+
+def execute_code(code, language_id, stdin="", use_cache=True, wait=False, on_status=None, gate=None,
+                 on_output=None):
+    """
+    Run code on its configured backend through the execution result cache.
+    Shared by /run, /compile and async jobs.
+
+    Concurrent identical runs are coalesced into a single backend execution.
+    gate (a scheduler ticket) is held only while the backend runs, so cache
+    hits and coalesced runs never queue. SchedulerRejected propagates for
+    this call's own ticket only: when the leader of a coalesced run is
+    refused, its followers retry on their own tickets.
+    on_output only sees chunks of runs this call executes itself (not cache
+    hits or runs coalesced onto another request).
+
+    Returns (result, error): an ExecutionResult (result.cached tells whether
+    it came from the cache), or None and the last endpoint error.
+    """
+    cache_key = make_cache_key('result', code, language_id, stdin)
+    if not use_cache:
+        return _execute_uncached(code, language_id, stdin, wait, on_status, gate, on_output=on_output)
+    
+    while True:
+        cached = execution_cache.get(cache_key)
+        if cached is not None:
+            return ExecutionResult.from_dict(cached, cached=True), None
+
+        rejected = []
+
+        def run():
+            try:
+                return _execute_uncached(code, language_id, stdin, wait, on_status, gate, cache_key=cache_key,
+                                         on_output=on_output)
+            except SchedulerRejected as e:
+                rejected.append(e)
+                return ADMISSION_REJECTED
+
+        outcome = judge0_single_flight.do(cache_key, run)
+        if outcome is not ADMISSION_REJECTED:
+            return outcome
+        if rejected:
+            raise rejected[0]  # Our own ticket was refused
+
+
+def _execute_uncached(code, language_id, stdin, wait, on_status, gate, cache_key=None, on_output=None):
+    """Run on the configured backend (Judge0 with hedging/failover by default); stores cacheable results under cache_key if given"""
+    with gate or nullcontext():
+        result, last_error = execute_on_backend(code, language_id, stdin, wait=wait, on_status=on_status,
+                                                on_output=on_output)
+    if result and cache_key and result.is_cacheable:
+        execution_cache.set(cache_key, result.to_dict())
+    return result, last_error
+
+
+def run_judge0(code, language_id=71, stdin="", use_cache=True, gate=None):
+    """
+    Try to run code on Judge0 with multiple fallback options.
+    GUARANTEED: Always returns output - never shows "Cannot connect" error!
+    
+    Attempts:
+    0. Execution result cache (skipped when use_cache=False)
+    1. Healthiest endpoint first: free public API (ce.judge0.com) or RapidAPI
+       (if key configured), hedged to the next one when it runs slow
+    2. Graceful fallback with syntax check
     
-    # If all endpoints failed, provide helpful output instead of error
+    Only real Judge0 results are cached - the syntax-check fallback never is.
+    
+    Returns (output, result): the /run display string and the ExecutionResult
+    behind it (None when the output is the syntax-check fallback).
+    """
+    # Judge0: wait=true first (blocking call, returns result immediately), polling as fallback
+    result, last_error = execute_code(code, language_id, stdin, use_cache=use_cache, wait=True, gate=gate)
+    if result:
+        return result.display_output(), result
+    return _execution_unavailable_output(code, language_id, last_error), None
+
+
+def _execution_unavailable_output(code, language_id, last_error):
+    """Helpful /run output when every endpoint failed"""
     # GRACEFUL FALLBACK: Never show "Cannot connect" error!
     
     # Simple syntax check as fallback
@@ -1032,7 +1409,7 @@ def run_judge0(code, language_id=71, stdin=""):
     else:
         output += "💡 Fix the syntax error above and try again.\n\n"
     
-    output += f"🔧 Technical info: Attempted {len(attempted_urls)} endpoint(s)\n"
+    output += f"🔧 Technical info: Attempted {len(judge0_client.enabled_urls())} endpoint(s)\n"
     output += f"   Last issue: {last_error}\n"
     
     return output
@@ -1045,13 +1422,13 @@ def run_code():
     code = data.get("code", "")
     language_id = data.get("language_id", 71)
     stdin = data.get("stdin", "")  # Get user input
+    use_cache = not data.get("no_cache", False)  # Non-deterministic programs opt out
     
     # Get language name from ID
-    language_map = {71: "Python", 50: "C", 54: "C++", 62: "Java", 63: "JavaScript"}
-    language_name = language_map.get(language_id, "Unknown")
+    language_name = LANGUAGE_NAMES.get(language_id, "Unknown")
     
     try:
-        output = run_judge0(code, language_id, stdin)
+        output, result = run_judge0(code, language_id, stdin, use_cache=use_cache, gate=execution_ticket(language_id))
         
         # Save to history if user is logged in
         if session.get('user_id'):
@@ -1062,113 +1439,859 @@ def run_code():
                 code_snippet=code,
                 language=language_name,
                 title=title,
-                output=output
+                output=output,
+                result=result
             )
         
-        return jsonify({"output": output})
+        response = {"output": output}
+        if result:
+            response["result"] = result.to_dict()  # Status kind, time, memory, endpoint...
+        return jsonify(response)
+    except SchedulerRejected as e:
+        return execution_busy_response(e)
     except Exception as e:
         return jsonify({"output": f"Error: {str(e)}"})
 
 
+@app.route("/api/run/stream", methods=["POST"])
+def run_code_stream():
+    """Run code and stream its output as Server-Sent Events.
+
+    Expects JSON: { code: str, language_id: int, stdin: str (optional), no_cache: bool (optional) }
+    Events: status {status}, stdout/stderr {text} as the program prints (local
+    backend; Judge0 output arrives in one piece at the end), then either
+    result (same fields as /compile) or error {error, retry_after}.
+    """
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language_id = data.get("language_id", 71)
+    stdin = data.get("stdin", "")
+    use_cache = not data.get("no_cache", False)
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+
+    ticket = execution_ticket(language_id)  # Built here: the run thread has no request context
+    user_id = session.get('user_id')
+    events = queue.Queue()
+    streamed = set()
+
+    def on_output(stream, text):
+        streamed.add(stream)
+        events.put((stream, {"text": text}))
+
+    def run():
+        try:
+            result, error = execute_code(code, language_id, stdin, use_cache=use_cache, gate=ticket,
+                                         on_status=lambda status: events.put(("status", {"status": status})),
+                                         on_output=on_output)
+        except SchedulerRejected as e:
+            events.put(("error", {"error": str(e), "retry_after": e.retry_after}))
+            return
+        except Exception as e:
+            events.put(("error", {"error": f"Error: {str(e)}"}))
+            return
+        if not result:
+            events.put(("error", {"error": "All Judge0 endpoints failed", "detail": error}))
+            return
+
+        # Cache hits, coalesced runs and Judge0 produce no chunks: send the output whole
+        for stream in ("stdout", "stderr"):
+            if stream not in streamed and getattr(result, stream):
+                events.put((stream, {"text": getattr(result, stream)}))
+        if user_id:
+            add_to_history(
+                user_id=user_id,
+                activity_type='run',
+                code_snippet=code,
+                language=LANGUAGE_NAMES.get(language_id, "Unknown"),
+                title=generate_code_title(code),
+                output=result.display_output(),
+                result=result
+            )
+        events.put(("result", structured_result(result)))
+
+    threading.Thread(target=run, name="run-stream", daemon=True).start()
+    return sse_response(events)
+
+
+def sse_response(events):
+    """
+    Server-Sent Events response relaying (event, payload) pairs from a
+    queue until a result or error event, with a keep-alive comment
+    whenever nothing arrives for 15 s.
+    """
+    def generate():
+        while True:
+            try:
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            if event in ("result", "error"):
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/compile", methods=["POST"])
 def compile_code():
     """Compile or run code via Judge0 and return structured result.
 
-    Expects JSON: { code: str, language_id: int, stdin: str (optional) }
-    Returns JSON with keys: stdout, stderr, compile_output, status
+    Expects JSON: { code: str, language_id: int, stdin: str (optional), no_cache: bool (optional) }
+    Returns JSON with keys: stdout, stderr, compile_output, status, status_id, kind,
+    message, time, wall_time, memory, exit_code, endpoint, latency, queue_latency,
+    cached and, for C/C++/Java, compile_cache (hit, compile_seconds, hit_rate,
+    time_saved_seconds)
     """
     data = request.get_json() or {}
     code = data.get("code", "")
     language_id = data.get("language_id", 71)
     stdin = data.get("stdin", "")
+    use_cache = not data.get("no_cache", False)
 
     if not code:
         return jsonify({"error": "No code provided"}), 400
 
-    payload = {
-        "source_code": code,
-        "language_id": language_id,
-        "stdin": stdin
-    }
-    
-    import time
-    last_error = None
+    try:
+        result, last_error = execute_code(code, language_id, stdin, use_cache=use_cache,
+                                          gate=execution_ticket(language_id))
+    except SchedulerRejected as e:
+        return execution_busy_response(e)
+    if result:
+        return jsonify(structured_result(result))
     
-    # Try each Judge0 endpoint
-    for base_url in JUDGE0_URLS:
-        # Skip RapidAPI if no key configured
-        if "rapidapi.com" in base_url and not RAPIDAPI_KEY:
-            continue
-            
+    return jsonify({"error": "All Judge0 endpoints failed", "detail": last_error}), 502
+
+
+def structured_result(result):
+    """/compile and job response for an ExecutionResult, with compile cache totals for C/C++/Java"""
+    response_data = result.to_dict()
+    if result.compile_cache:
+        compile_stats = compile_cache.stats()
+        response_data["compile_cache"] = dict(
+            result.compile_cache,
+            hit_rate=compile_stats["hit_rate"],
+            time_saved_seconds=compile_stats["time_saved_seconds"]
+        )
+    return response_data
+
+
+# ---------------- ASYNC EXECUTION JOBS ----------------
+# POST /api/jobs returns immediately; a background pool drives Judge0 and
+# clients follow status transitions over SSE or long-poll.
+job_manager = JobManager()
+
+
+@app.route("/api/jobs", methods=["POST"])
+def create_execution_job():
+    """Queue code for background execution.
+
+    Expects JSON: { code: str, language_id: int, stdin: str (optional), no_cache: bool (optional) }
+    Returns 202 with job_id plus URLs for long-poll status and SSE events.
+    """
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language_id = data.get("language_id", 71)
+    stdin = data.get("stdin", "")
+    use_cache = not data.get("no_cache", False)
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+
+    ticket = execution_ticket(language_id)  # Built here: the job thread has no request context
+
+    def run_job(job):
+        # Judge0 reports compile and run together as "Processing", so compiled
+        # languages show "compiling" for that phase and interpreted ones "running".
+        processing_state = "compiling" if language_id in COMPILED_LANGUAGE_IDS else "running"
+
+        def on_status(status):
+            if status == "In Queue":
+                job_manager.update(job, "queued", detail=status)
+            elif status == "Processing":
+                job_manager.update(job, processing_state, detail=status)
+
+        result, error = execute_code(code, language_id, stdin, use_cache=use_cache,
+                                     on_status=on_status, gate=ticket)
+        if not result:
+            raise RuntimeError(f"All Judge0 endpoints failed: {error}")
+
+        if job.user_id:
+            add_to_history(
+                user_id=job.user_id,
+                activity_type='run',
+                code_snippet=code,
+                language=LANGUAGE_NAMES.get(language_id, "Unknown"),
+                title=generate_code_title(code),
+                output=result.display_output(),
+                result=result
+            )
+        return structured_result(result)
+
+    job = job_manager.submit(run_job, user_id=session.get('user_id'))
+    if not job:
+        return jsonify({"error": "Too many queued executions, please retry shortly"}), 503
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('get_execution_job', job_id=job.id),
+        "events_url": url_for('execution_job_events', job_id=job.id)
+    }), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_execution_job(job_id):
+    """Job status; with ?wait=N (max 30s) long-polls until the version passes ?since"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    wait_seconds = min(request.args.get('wait', 0, type=float), 30)
+    since = request.args.get('since', -1, type=int)
+    if wait_seconds > 0:
+        return jsonify(job_manager.wait_for_change(job, since, wait_seconds))
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def execution_job_events(job_id):
+    """Stream job status transitions as Server-Sent Events"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return Response(
+        stream_with_context(job_manager.events(job)),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Upper bound on test cases per /api/run-batch request
+MAX_BATCH_CASES = int(os.getenv('MAX_BATCH_CASES', 50))
+
+
+def run_judge0_batch(code, language_id, cases):
+    """
+    Run one source against many stdin/expected-output cases using Judge0's
+    batch API: chunks of JUDGE0_BATCH_SIZE are submitted in one POST each and
+    all tokens are polled together. Judge0 itself compares expected_output and
+    reports "Wrong Answer" on mismatch. Endpoint choice follows the same
+    health-scored routing as /run.
+
+    Returns (results, error) where results are finished submissions in case order.
+    """
+    submissions = []
+    for case in cases:
+        submission = {
+            "source_code": code,
+            "language_id": language_id,
+            "stdin": case.get("stdin", "")
+        }
+        if case.get("expected_output") is not None:
+            submission["expected_output"] = case["expected_output"]
+        submissions.append(submission)
+
+    results, last_error, _ = judge0_client.run_hedged(
+        lambda base_url: _judge0_batch_attempt(base_url, submissions, language_id),
+        language_id
+    )
+    return results, last_error
+
+
+def _judge0_batch_attempt(base_url, submissions, language_id):
+    """Submit all cases to one endpoint in JUDGE0_BATCH_SIZE chunks and poll their tokens together"""
+    try:
+        tokens = []
+        for i in range(0, len(submissions), JUDGE0_BATCH_SIZE):
+            submit = judge0_client.submit_batch(base_url, submissions[i:i + JUDGE0_BATCH_SIZE])
+            if submit.status_code not in (200, 201):
+                return None, f"Server returned {submit.status_code}"
+            chunk_tokens = [item.get("token") for item in submit.json()]
+            if not all(chunk_tokens):
+                return None, "Batch submission rejected one or more cases"
+            tokens.extend(chunk_tokens)
+
+        return judge0_client.poll_batch(base_url, tokens, language_id)
+
+    except requests.exceptions.ConnectionError:
+        return None, f"Cannot connect to {base_url}"
+    except requests.exceptions.Timeout:
+        return None, f"Timeout for {base_url}"
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
+
+
+@app.route("/api/run-batch", methods=["POST"])
+def run_batch():
+    """Run one source against a list of test cases and return per-case verdicts.
+
+    Expects JSON: { code: str, language_id: int, cases: [{stdin: str, expected_output: str (optional)}] }
+    Returns JSON with keys: results (verdict, stdout, stderr, time, memory per case), summary
+    """
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language_id = data.get("language_id", 71)
+    cases = data.get("cases") or []
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+    if not isinstance(cases, list) or not cases:
+        return jsonify({"error": "No test cases provided"}), 400
+    if len(cases) > MAX_BATCH_CASES:
+        return jsonify({"error": f"Too many test cases (max {MAX_BATCH_CASES})"}), 400
+    for index, case in enumerate(cases):
+        if not isinstance(case, dict):
+            return jsonify({"error": f"Test case {index} must be an object"}), 400
+        for field in ("stdin", "expected_output"):
+            if case.get(field) is not None and not isinstance(case[field], str):
+                return jsonify({"error": f"Test case {index}: {field} must be a string"}), 400
+
+    try:
+        with execution_ticket(language_id, backend="judge0"):  # The batch API always uses Judge0
+            results, error = run_judge0_batch(code, language_id, cases)
+    except SchedulerRejected as e:
+        return execution_busy_response(e)
+    if results is None:
+        return jsonify({"error": "All Judge0 endpoints failed", "detail": error}), 502
+
+    case_results = []
+    for index, (case, result) in enumerate(zip(cases, results)):
+        status = result.get("status", {})
+        has_expected = case.get("expected_output") is not None
+        case_results.append({
+            "index": index,
+            "verdict": status.get("description"),
+            "status_id": status.get("id"),
+            "passed": status.get("id") == 3 if has_expected else None,
+            "stdout": result.get("stdout"),
+            "stderr": result.get("stderr"),
+            "compile_output": result.get("compile_output"),
+            "time": result.get("time"),
+            "memory": result.get("memory")
+        })
+
+    graded = [r for r in case_results if r["passed"] is not None]
+    summary = {
+        "total": len(case_results),
+        "graded": len(graded),
+        "passed": sum(1 for r in graded if r["passed"])
+    }
+
+    if session.get('user_id'):
+        add_to_history(
+            user_id=session['user_id'],
+            activity_type='run_batch',
+            code_snippet=code,
+            language=LANGUAGE_NAMES.get(language_id, "Unknown"),
+            title=generate_code_title(code),
+            output=f"Passed {summary['passed']}/{summary['graded']} test cases"
+        )
+
+    return jsonify({"results": case_results, "summary": summary})
+
+
+# ---------------- EXECUTION BENCHMARK ----------------
+
+def run_benchmark_samples(code, language_id, inputs, runs):
+    """
+    Run code `runs` times per input as fresh executions (never cached, since
+    a cached result carries no timing). The local executor runs them one
+    after another; Judge0 gets them as a single batch.
+
+    Returns (results, error): one list of finished submissions per input.
+    """
+    executor = EXECUTORS.get(execution_backends.get(language_id, "judge0"))
+    if executor and executor.supports(language_id):
         try:
-            headers = {"Content-Type": "application/json"}
-            
-            # Add RapidAPI headers if needed
-            if "rapidapi.com" in base_url and RAPIDAPI_KEY:
-                headers.update({
-                    "X-RapidAPI-Key": RAPIDAPI_KEY,
-                    "X-RapidAPI-Host": "judge0-ce.p.rapidapi.com"
-                })
-            
-            submit = requests.post(
-                f"{base_url}/submissions/?base64_encoded=false&wait=false",
-                json=payload,
-                headers=headers,
-                timeout=15  # Increased timeout for reliable connections
+            return [[executor.run(code, language_id, stdin) for _ in range(runs)] for stdin in inputs], None
+        except ExecutorUnavailable as e:
+            print(f"⚠️ {executor.name} executor unavailable, benchmarking on Judge0: {e}")
+
+    cases = [{"stdin": stdin} for stdin in inputs for _ in range(runs)]
+    results, error = run_judge0_batch(code, language_id, cases)
+    if results is None:
+        return None, error
+    return [results[i * runs:(i + 1) * runs] for i in range(len(inputs))], None
+
+
+def _benchmark_variant(per_input):
+    """Statistics per input plus overall for one variant's results"""
+    return {
+        "per_input": [summarize(results) for results in per_input],
+        "overall": summarize([r for results in per_input for r in results])
+    }
+
+
+def _first_stdout(results):
+    for result in results:
+        if (result.get("status") or {}).get("description") == "Accepted":
+            return (result.get("stdout") or "").strip()
+    return None
+
+
+@app.route("/api/benchmark", methods=["POST"])
+def benchmark_code():
+    """Run code repeatedly and report CPU time, wall time and memory statistics - requires login
+
+    Expects JSON: { code: str, language_id: int, runs: int (default 5),
+                    inputs: [str] (optional) or generator: {kind, sizes, min, max, seed} (optional),
+                    optimized_code: str (optional) or optimize: bool (use the AI optimizer) }
+    Returns JSON with min/median/p95 per metric for each variant and input and,
+    when an optimized variant is given, a verdict that accounts for run-to-run variance.
+    """
+    if not check_user():
+        return jsonify({"error": "Please login to use benchmarking"}), 401
+
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language_id = data.get("language_id", 71)
+    runs = data.get("runs", 5)
+    optimized_code = data.get("optimized_code")
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+    if not isinstance(runs, int) or not 1 <= runs <= BENCHMARK_MAX_RUNS:
+        return jsonify({"error": f"runs must be between 1 and {BENCHMARK_MAX_RUNS}"}), 400
+
+    try:
+        if data.get("generator"):
+            inputs = generate_inputs(data["generator"])
+        else:
+            inputs = data.get("inputs") or [""]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid input generator: {e}"}), 400
+    if not isinstance(inputs, list) or not all(isinstance(stdin, str) for stdin in inputs):
+        return jsonify({"error": "inputs must be a list of strings"}), 400
+    if len(inputs) > BENCHMARK_MAX_INPUTS:
+        return jsonify({"error": f"Too many inputs (max {BENCHMARK_MAX_INPUTS})"}), 400
+    if runs * len(inputs) > MAX_BATCH_CASES:
+        return jsonify({"error": f"runs x inputs must not exceed {MAX_BATCH_CASES}"}), 400
+
+    optimizations = None
+    if not optimized_code and data.get("optimize"):
+        optimized = ai_optimize_code(code, bundle_language(LANGUAGE_NAMES.get(language_id)))
+        optimized_code, optimizations = optimized["optimized_code"], optimized["optimizations"]
+
+    try:
+        with execution_ticket(language_id):
+            original, error = run_benchmark_samples(code, language_id, inputs, runs)
+            if original is None:
+                return jsonify({"error": "All Judge0 endpoints failed", "detail": error}), 502
+            if optimized_code:
+                optimized, error = run_benchmark_samples(optimized_code, language_id, inputs, runs)
+                if optimized is None:
+                    return jsonify({"error": "All Judge0 endpoints failed", "detail": error}), 502
+    except SchedulerRejected as e:
+        return execution_busy_response(e)
+
+    response = {
+        "runs": runs,
+        "inputs": [{"index": i, "length": len(stdin), "preview": stdin[:80]} for i, stdin in enumerate(inputs)],
+        "original": _benchmark_variant(original)
+    }
+    if optimized_code:
+        response["optimized"] = _benchmark_variant(optimized)
+        response["optimized"]["code"] = optimized_code
+        if optimizations is not None:
+            response["optimized"]["optimizations"] = optimizations
+
+        per_input = list(zip(response["original"]["per_input"], response["optimized"]["per_input"]))
+        response["comparison"] = {}
+        for metric in ("cpu_time", "wall_time", "memory"):
+            comparisons = [compare(before, after, metric) for before, after in per_input]
+            response["comparison"][metric] = dict(combine(comparisons), per_input=comparisons)
+        response["comparison"]["outputs_match"] = (
+            # Same input, different output: the "optimization" changed behaviour
+            all(_first_stdout(before) == _first_stdout(after) for before, after in zip(original, optimized))
+        )
+
+    return jsonify(response)
+
+
+@app.route("/api/judge0/callback/<nonce>", methods=["PUT", "POST"])
+def judge0_callback(nonce):
+    """
+    Judge0 callback_url target: store the finished submission and wake its waiter.
+    The nonce is unguessable and single use, so only the Judge0 server that
+    received it can complete a submission.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get("status"):
+        return jsonify({"error": "Expected a Judge0 submission"}), 400
+    if not judge0_callbacks.deliver(nonce, decode_callback(data)):
+        return jsonify({"error": "Unknown or completed submission"}), 404
+    return "", 204
+
+
+@app.route("/api/execution/stats")
+def execution_stats():
+    """Execution path telemetry (caches, coalescing, polling, callbacks, endpoint health, warm pool, scheduler gauges)"""
+    return jsonify({
+        "cache": execution_cache.stats(),
+        "single_flight": judge0_single_flight.stats(),
+        "polling": judge0_client.poll_telemetry.stats(),
+        "routing": judge0_client.routing_stats(),
+        "jobs": job_manager.stats(),
+        "compile_cache": compile_cache.stats(),
+        "scheduler": execution_scheduler.stats(),
+        "local_pool": local_executor.pool.stats(),
+        "callbacks": judge0_callbacks.stats()
+    })
+
+
+@app.route("/api/ai/stats")
+def ai_stats():
+    """AI path telemetry (cache hit rates per feature, coalesced model calls, gateway pool, quota left, precompute queue)"""
+    return jsonify({
+        "cache": ai_cache.stats(),
+        "single_flight": ai_single_flight.stats(),
+        "gateway": ai_gateway.stats(),
+        "quota": ai_quota.stats(),
+        "precompute": ai_precompute.stats()
+    })
+
+
+# ---------------- STREAMED AI RESPONSES ----------------
+# Same answers as /explain, /optimize and /debug, but the model output is
+# streamed and each explanation step, optimization or bug is sent over SSE
+# as soon as the model finishes writing it.
+def ai_event_stream(run, item_fields):
+    """
+    SSE response for an AI feature. run(on_chunk) runs in a background
+    thread and returns (ai_result, payload). Model output passed to
+    on_chunk is parsed incrementally: each element of an item_fields array
+    is sent as an item event {field, index, value}, any other top-level
+    value as a field event {field, value}. Elements that never streamed
+    (cache hits, coalesced requests) are then sent from ai_result, and the
+    result event carries payload, which is authoritative (a fallback
+    answer can replace what streamed).
+    """
+    events = queue.Queue()
+    parser = IncrementalJSONParser()
+    sent = {field: 0 for field in item_fields}
+
+    def on_chunk(text):
+        for event in parser.feed(text):
+            if event[0] == "item" and event[1] in sent:
+                _, field, index, value = event
+                sent[field] = index + 1
+                events.put(("item", {"field": field, "index": index, "value": value}))
+            elif event[0] == "field" and event[1] not in sent:
+                events.put(("field", {"field": event[1], "value": event[2]}))
+
+    def worker():
+        try:
+            ai_result, payload = run(on_chunk)
+        except Exception as e:
+            events.put(("error", {"error": f"Error: {str(e)}"}))
+            return
+        for field in item_fields:
+            values = (ai_result or {}).get(field) or []
+            for index in range(sent[field], len(values)):
+                events.put(("item", {"field": field, "index": index, "value": values[index]}))
+        events.put(("result", payload))
+
+    threading.Thread(target=worker, name="ai-stream", daemon=True).start()
+    return sse_response(events)
+
+
+@app.route("/api/explain/stream", methods=["POST"])
+def explain_code_stream():
+    """Explain code, streaming the AI answer as Server-Sent Events.
+
+    Expects JSON: { code: str, language: str }
+    Events: item {field: steps|key_insights, index, value} and field
+    {field, value} as the model writes them, then result {explanation}
+    (the same HTML as /explain) or error {error}.
+    """
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language = data.get("language", "python").lower().strip()
+
+    if not code:
+        return jsonify({"explanation": "⚠️ No code provided."}), 400
+    if not is_valid_code(code):
+        return jsonify({"explanation": "⚠️ Please enter actual code, not plain text."}), 400
+    language = EXPLAIN_LANGUAGE_ALIASES.get(language, language)
+
+    def run(on_chunk):
+        ai_result = ai_explain_code(code, language, on_chunk)
+        return ai_result, {"explanation": render_comprehensive_explanation(code, language, ai_result)}
+
+    return ai_event_stream(run, ("steps", "key_insights"))
+
+
+@app.route("/api/optimize/stream", methods=["POST"])
+def optimize_code_stream():
+    """Optimize code, streaming the AI answer as Server-Sent Events - requires login.
+
+    Expects JSON: { code: str, language: str }
+    Events: item {field: optimizations, index, value} and field {field, value}
+    as the model writes them, then result {optimized, optimizations} (as
+    /optimize) or error {error}.
+    """
+    if not check_user():
+        return jsonify({"error": "Please login to use the optimizer feature"}), 401
+
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language = data.get("language", "python").lower()
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+    user_id = session.get('user_id')
+
+    def run(on_chunk):
+        result = ai_optimize_code(code, language, on_chunk)
+        if user_id:
+            add_to_history(
+                user_id=user_id,
+                activity_type='optimize',
+                code_snippet=code,
+                language=language.capitalize(),
+                title=generate_code_title(code),
+                output=result["optimized_code"]
             )
-            
-            if submit.status_code not in (201, 200):
-                last_error = f"Server returned {submit.status_code}"
-                continue
-                
-            token = submit.json().get("token")
-            if not token:
-                last_error = "No token received"
-                continue
+        return result, {"optimized": result["optimized_code"], "optimizations": result["optimizations"]}
 
-            # Poll for result
-            for _ in range(60):
-                time.sleep(1)
-                res = requests.get(
-                    f"{base_url}/submissions/{token}?base64_encoded=false",
-                    headers=headers,
-                    timeout=15  # Increased timeout for polling requests
-                )
-                
-                if res.status_code != 200:
-                    break
-                    
-                result = res.json()
-                status = result.get("status", {}).get("description")
-                
-                if status not in ["In Queue", "Processing"]:
-                    # Check if execution was successful
-                    if status == "Accepted" or result.get("stdout") or result.get("stderr"):
-                        return jsonify({
-                            "status": status,
-                            "stdout": result.get("stdout"),
-                            "stderr": result.get("stderr"),
-                            "compile_output": result.get("compile_output"),
-                            "message": result.get("message")
-                        })
-                    else:
-                        # Execution failed, try next endpoint
-                        last_error = f"Execution failed with status: {status}"
-                        break
-            
-            last_error = "Timeout waiting for result"
-            
-        except requests.exceptions.ConnectionError:
-            last_error = f"Cannot connect to {base_url}"
-            continue
-        except requests.exceptions.Timeout:
-            last_error = f"Timeout for {base_url}"
-            continue
-        except requests.exceptions.RequestException as e:
-            last_error = str(e)
-            continue
-    
-    return jsonify({"error": "All Judge0 endpoints failed", "detail": last_error}), 502
+    return ai_event_stream(run, ("optimizations",))
+
+
+@app.route("/api/debug/stream", methods=["POST"])
+def debug_code_stream():
+    """Debug Python code, streaming the AI answer as Server-Sent Events - requires login.
+
+    Expects JSON: { code: str, language: "python" }
+    The linter runs first; then events item {field: bugs_found|suggestions,
+    index, value} and field {field, value} as the model writes them, then
+    result {issues, fixed_code, original_code, ai_analysis} (as /debug) or
+    error {error}. Other languages have no AI pass: use /debug.
+    """
+    if not check_user():
+        return jsonify({"error": "Please login to use the debugger feature.", "login_required": True}), 401
+
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language = data.get("language", "python").lower().strip()
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+    if language != "python":
+        return jsonify({"error": "Streaming debug supports Python only; use /debug"}), 400
+    user_id = session.get('user_id')
+
+    def run(on_chunk):
+        linter_output = run_linter(code, language)
+        ai_analysis = ai_debug_code(code, language, linter_output, on_chunk)
+        issues, fixed_code = python_debug_report(code, linter_output, ai_analysis)
+        if user_id:
+            add_to_history(
+                user_id=user_id,
+                activity_type='debug',
+                code_snippet=code,
+                language=language.capitalize(),
+                title=generate_code_title(code),
+                output=issues
+            )
+        return ai_analysis, {"issues": issues, "fixed_code": fixed_code, "original_code": code,
+                             "ai_analysis": ai_analysis}
+
+    return ai_event_stream(run, ("bugs_found", "suggestions"))
+
+
+# ---------------- AI ANALYSIS BUNDLE ----------------
+# One Gemini call answers explain + quality + debug for a piece of code. The
+# bundle is cached, and the individual routes read their section from it
+# when they are later asked about the same code.
+AI_BUNDLE_SECTIONS = ("explain", "quality", "debug")
+AI_BUNDLE_SECTION_KEYS = {"explain": "steps", "quality": "overall_score", "debug": "bugs_found"}  # Must be present for a section to count
+
+
+def bundle_language(language):
+    """One spelling per language, whichever page or route the request came from"""
+    language = (language or "python").lower().strip()
+    return EXPLAIN_LANGUAGE_ALIASES.get(language, language)
+
+
+def bundled_section(feature, code, language):
+    """feature's section of a cached analysis bundle for this code, or None"""
+    key, canonical = ai_cache.lookup_key("bundle", code, bundle_language(language))
+    bundle = ai_cache.peek(key, feature)
+    section = (bundle or {}).get(feature)
+    if section is None:
+        return None
+    return canonical.from_canonical(section) if canonical is not None else copy.deepcopy(section)
+
+
+def parse_bundle_sections(response_text, code):
+    """
+    {explain, quality, debug} from a bundle response, each None when its
+    section is missing or malformed. When the whole document doesn't
+    parse, sections that closed as valid JSON are still recovered.
+    """
+    try:
+        document, partial = extract_json(response_text)
+    except json.JSONDecodeError:
+        document, partial = {}, True
+    if partial:  # Keep only the sections that closed before the document broke off
+        parser = IncrementalJSONParser()
+        document = {event[1]: event[2] for event in parser.feed(response_text) if event[0] == "field"}
+
+    sections = {}
+    for name in AI_BUNDLE_SECTIONS:
+        section = document.get(name)
+        try:
+            if not isinstance(section, dict) or AI_BUNDLE_SECTION_KEYS[name] not in section:
+                raise ValueError(f"Bundle section {name} is missing or incomplete")
+            sections[name] = validate_ai_json(section, name)
+        except ValueError:
+            sections[name] = None
+    if sections["debug"] is not None and not isinstance(sections["debug"].get("fixed_code"), str):
+        sections["debug"]["fixed_code"] = code
+    return sections
+
+
+def _generate_ai_bundle(code, language):
+    """One Gemini call for all three analyses; None if no section parsed"""
+    chunks = plan_chunks(code, language)  # Compacted if large; too large for one call raises PromptTooLarge
+    if len(chunks) > 1:
+        raise PromptTooLarge("Code is too large for a combined analysis")
+    prompt = f"""You are an expert programming tutor, code reviewer and debugger. Analyze this {language} code three ways in ONE response.
+
+**Code:**
+```{language}
+{chunks[0].code}
+```
+
+**Return ONLY valid JSON with exactly these three top-level sections:**
+{{
+  "explain": {{
+    "summary": "One sentence describing what this code does",
+    "algorithm": "Explain the algorithm/approach used",
+    "time_complexity": "O(n) or O(n²) etc.",
+    "time_explanation": "Brief explanation of time complexity",
+    "space_complexity": "O(1) or O(n) etc.",
+    "space_explanation": "Brief explanation of space complexity",
+    "steps": [
+      {{
+        "title": "Step name (3-5 words)",
+        "explanation": "What this step does",
+        "code_snippet": "key line(s) of code for this step",
+        "why": "Why this step is important"
+      }}
+    ],
+    "key_insights": ["Important insight about the code"]
+  }},
+  "quality": {{
+    "overall_score": <0-100 integer>,
+    "grade": "<A+, A, B+, B, C+, C, D, F>",
+    "scores": {{
+      "code_quality": <0-100>,
+      "readability": <0-100>,
+      "maintainability": <0-100>,
+      "performance": <0-100>,
+      "security": <0-100>,
+      "best_practices": <0-100>
+    }},
+    "strengths": ["Specific strength"],
+    "issues": [
+      {{
+        "severity": "critical|high|medium|low",
+        "category": "bug|security|performance|style|best-practice",
+        "title": "Issue title",
+        "description": "Detailed description",
+        "line": <line number or null>,
+        "suggestion": "How to fix it"
+      }}
+    ],
+    "complexity": {{
+      "cyclomatic": <integer>,
+      "cognitive": "low|medium|high",
+      "description": "Brief explanation"
+    }},
+    "recommendations": ["Specific actionable recommendation"],
+    "summary": "One paragraph summary of the code quality"
+  }},
+  "debug": {{
+    "bugs_found": [
+      {{
+        "line": 0,
+        "type": "Bug category",
+        "severity": "high/medium/low",
+        "message": "Clear explanation of the issue",
+        "code": "the problematic line of code",
+        "fix": "suggested fix (optional)"
+      }}
+    ],
+    "fixed_code": "complete corrected code here",
+    "suggestions": ["Best practice suggestion"],
+    "confidence": "high/medium/low"
+  }}
+}}
+
+Explain in clear, beginner-friendly language; review thoroughly and constructively;
+look for syntax, logic, runtime and type errors, unhandled edge cases, performance
+and security problems, with exact line numbers. Return ONLY the JSON."""
+
+    response_text = gemini_generate_text("bundle", prompt)
+    sections = parse_bundle_sections(response_text, code)
+    failed = [name for name, section in sections.items() if section is None]
+    if len(failed) == len(sections):
+        print(f"❌ AI bundle: no section parsed. Response preview: {response_text[:200]}...")
+        return None
+    if failed:
+        print(f"⚠️ AI bundle: {', '.join(failed)} section(s) unusable - those fall back individually")
+    return sections
+
+
+@app.route("/api/ai/analyze", methods=["POST"])
+def analyze_code_bundle():
+    """Explanation, quality review and debug analysis from one Gemini call - requires login.
+
+    Expects JSON: { code: str, language: str }
+    Returns { explanation (HTML, as /explain), quality (as /api/code-quality),
+    debug (AI analysis, as /debug's ai_analysis), sources {explain|quality|debug:
+    "ai"|"fallback"} }. A section the model got wrong falls back on its own:
+    rule-based explanation, rule-based debugging, {error} for quality. The
+    bundle is cached and answers /explain, /explain_html, /api/code-quality
+    and /debug's AI pass for the same code.
+    """
+    if not check_user():
+        return jsonify({"error": "Please login to use AI analysis"}), 401
+
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language = bundle_language(data.get("language"))
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+    if not is_valid_code(code):
+        return jsonify({"error": "Please enter actual code, not plain text."}), 400
+
+    sections = {}
+    if gemini_model:
+        try:
+            sections = cached_ai_call("bundle", code, language, lambda: _generate_ai_bundle(code, language)) or {}
+        except Exception as e:
+            print(f"❌ AI bundle error: {e} - every section falls back")
+
+    explain, quality, debug = (sections.get(name) for name in AI_BUNDLE_SECTIONS)
+    if quality is None:
+        quality = {"error": "Quality analysis unavailable", "detail": "The AI review could not be produced for this code"}
+    return jsonify({
+        "explanation": render_comprehensive_explanation(code, language, explain),
+        "quality": quality,
+        "debug": debug if debug is not None else rule_based_debug(code, language, ""),
+        "sources": {name: "ai" if sections.get(name) is not None else "fallback" for name in AI_BUNDLE_SECTIONS}
+    })
 
 
 def simple_python_optimizer(code: str) -> str:
@@ -1253,25 +2376,9 @@ def optimize_code():
 
 # ---------------- AI CODE QUALITY SCORE ----------------
 
-@app.route("/api/code-quality", methods=["POST"])
-def analyze_code_quality():
-    """Analyze code quality and provide comprehensive scoring - requires login"""
-    if not check_user():
-        return jsonify({"error": "Please login to use the code quality analyzer"}), 401
-    
-    data = request.get_json() or {}
-    code = data.get("code", "")
-    language = data.get("language", "python").lower()
-
-    if not code:
-        return jsonify({"error": "No code provided"}), 400
-
-    if not gemini_model:
-        return jsonify({"error": "AI service unavailable"}), 503
-
-    try:
-        # Create comprehensive prompt for Gemini
-        prompt = f"""You are an expert code reviewer and senior software engineer. Analyze this {language.upper()} code and provide a comprehensive quality assessment.
+def _generate_ai_quality(code, language, priority="interactive"):
+    """One Gemini quality review; raises on API errors and invalid responses"""
+    prompt = f"""You are an expert code reviewer and senior software engineer. Analyze this {language.upper()} code and provide a comprehensive quality assessment.
 
 CODE TO ANALYZE:
 ```{language}
@@ -1321,16 +2428,27 @@ Provide a detailed analysis in the following JSON format (respond ONLY with vali
 
 Be thorough, specific, and constructive. Focus on actionable feedback."""
 
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```"):
-            response_text = re.sub(r'^```(?:json)?\s*\n', '', response_text)
-            response_text = re.sub(r'\n```\s*$', '', response_text)
-        
-        # Parse JSON response
-        quality_data = json.loads(response_text)
+    return parse_ai_json(gemini_generate_text("quality", prompt, priority=priority).strip(), "quality")
+
+
+@app.route("/api/code-quality", methods=["POST"])
+def analyze_code_quality():
+    """Analyze code quality and provide comprehensive scoring - requires login"""
+    if not check_user():
+        return jsonify({"error": "Please login to use the code quality analyzer"}), 401
+    
+    data = request.get_json() or {}
+    code = data.get("code", "")
+    language = data.get("language", "python").lower()
+
+    if not code:
+        return jsonify({"error": "No code provided"}), 400
+
+    if not gemini_model:
+        return jsonify({"error": "AI service unavailable"}), 503
+
+    try:
+        quality_data = cached_ai_call("quality", code, language, lambda: _generate_ai_quality(code, language))
         
         # Save to history
         if session.get('user_id'):
@@ -1348,22 +2466,14 @@ Be thorough, specific, and constructive. Focus on actionable feedback."""
         
     except json.JSONDecodeError as e:
         print(f"JSON Parse Error: {e}")
-        print(f"Response: {response_text[:500]}")
         return jsonify({
             "error": "Failed to parse AI response",
             "detail": "The AI returned an invalid format"
         }), 500
+    except (AIGatewayBusy, AIGatewayTimeout, AIQuotaExceeded, google_exceptions.TooManyRequests) as e:
+        return ai_unavailable_response(e)
     except Exception as e:
         print(f"Quality Analysis Error: {e}")
-        error_msg = str(e)
-        
-        # Check for quota/rate limit errors
-        if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            return jsonify({
-                "error": "API Rate Limit Exceeded",
-                "detail": "You've reached the Gemini API free tier limit. Please wait 15-30 seconds and try again, or upgrade your API plan."
-            }), 429
-        
         return jsonify({
             "error": "Quality analysis failed",
             "detail": str(e)
@@ -1460,31 +2570,19 @@ Rules:
 
 Now generate the trace for the code above. Remember: ONLY JSON, no other text."""
 
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        print(f"[VISUALIZE] Raw response length: {len(response_text)}")
-        print(f"[VISUALIZE] First 200 chars: {response_text[:200]}")
-        
-        # Clean up the response - remove any markdown or extra text
-        # Try to find JSON object
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        
-        if json_start != -1 and json_end > json_start:
-            response_text = response_text[json_start:json_end]
-            print(f"[VISUALIZE] Extracted JSON from position {json_start} to {json_end}")
-        
-        # Remove markdown code blocks if present
-        response_text = re.sub(r'^```(?:json)?\s*', '', response_text)
-        response_text = re.sub(r'\s*```$', '', response_text)
+        response_text = ""
+
+        def generate():
+            nonlocal response_text
+            response_text = gemini_generate_text("visualize", prompt).strip()
         
-        # Parse JSON response
-        viz_data = json.loads(response_text)
+            print(f"[VISUALIZE] Raw response length: {len(response_text)}")
+            print(f"[VISUALIZE] First 200 chars: {response_text[:200]}")
         
-        # Validate structure
-        if not isinstance(viz_data.get('steps'), list) or len(viz_data['steps']) == 0:
-            raise ValueError("Invalid visualization data: missing or empty steps")
+            # Parse and validate (steps must be a non-empty list)
+            return parse_ai_json(response_text, "visualize")
+
+        viz_data = cached_ai_call("visualize", code, language, generate)
         
         # Save to history
         if session.get('user_id'):
@@ -1502,13 +2600,13 @@ Now generate the trace for the code above. Remember: ONLY JSON, no other text.""
         
     except json.JSONDecodeError as e:
         print(f"[VISUALIZE] JSON Parse Error: {e}")
-        print(f"[VISUALIZE] Failed response (first 500 chars): {response_text[:500] if 'response_text' in locals() else 'No response'}")
+        print(f"[VISUALIZE] Failed response (first 500 chars): {response_text[:500] if response_text else 'No response'}")
         
         # Return a helpful error with the actual response snippet
         return jsonify({
             "error": "AI returned invalid JSON format",
             "detail": f"Parse error: {str(e)}. The AI response couldn't be converted to visualization data. Try simplifying your code or try again.",
-            "debug_info": response_text[:200] if 'response_text' in locals() else "No response received"
+            "debug_info": response_text[:200] if response_text else "No response received"
         }), 500
         
     except ValueError as e:
@@ -1518,21 +2616,19 @@ Now generate the trace for the code above. Remember: ONLY JSON, no other text.""
             "detail": str(e)
         }), 500
         
+    except (AIQuotaExceeded, google_exceptions.TooManyRequests) as e:
+        print(f"[VISUALIZE] {e} - using line-by-line fallback")
+        return jsonify(create_simple_visualization(code, language))
+        
+    except (AIGatewayBusy, AIGatewayTimeout) as e:
+        return ai_unavailable_response(e)
+        
     except Exception as e:
         print(f"[VISUALIZE] Unexpected Error: {e}")
         print(f"[VISUALIZE] Error type: {type(e).__name__}")
         import traceback
         traceback.print_exc()
         
-        error_msg = str(e)
-        
-        # Check for quota/rate limit errors
-        if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            return jsonify({
-                "error": "API Rate Limit Exceeded",
-                "detail": "You've reached the Gemini API free tier limit. Please wait 15-30 seconds and try again, or upgrade your API plan."
-            }), 429
-        
         return jsonify({
             "error": "Visualization failed",
             "detail": f"{type(e).__name__}: {str(e)}. Please try again or use simpler code."
@@ -1738,21 +2834,28 @@ def generate_detailed_line_explanation(line, stripped, i, language):
     return "\n".join(explanations)
 
 
-def ai_explain_code(code, language):
+def ai_explain_code(code, language, on_chunk=None):
     """
     AI-powered code explanation using Google Gemini API.
     Provides intelligent, context-aware explanations for any language.
+    Explanations are cached per normalized code. on_chunk(text) receives
+    the model output as it streams (only when the model is actually called).
     """
     if not gemini_model:
         print("⚠️ Gemini model not available - API key may be missing")
         return None  # Fall back to rule-based explanation
     
-    try:
-        prompt = f"""You are an expert programming tutor. Explain this {language} code in a clear, educational way.
+    return cached_ai_call("explain", code, language, lambda: _generate_ai_explanation(code, language, on_chunk))
+
 
+def _generate_ai_explanation(code, language, on_chunk=None, priority="interactive"):
+    """Gemini explanation (one request per chunk of a large file); None on timeout, API error or unparseable output"""
+    def build_prompt(chunk):
+        return f"""You are an expert programming tutor. Explain this {language} code in a clear, educational way.
+{chunk.prompt_note(language)}
 **Code:**
 ```{language}
-{code}
+{chunk.code}
 ```
 
 **Return ONLY valid JSON with this structure:**
@@ -1785,59 +2888,33 @@ Focus on:
 
 Return ONLY the JSON, no markdown formatting."""
 
+    try:
         print(f"🤖 Calling Gemini AI for {language} explanation...")
         
-        # Set timeout using signal (Unix) or threading (Windows)
-        import time
-        from threading import Thread
-        
-        result_container = {'response': None, 'error': None}
-        
-        def call_gemini():
-            try:
-                result_container['response'] = gemini_model.generate_content(prompt)
-            except Exception as e:
-                result_container['error'] = str(e)
-        
         start_time = time.time()
-        thread = Thread(target=call_gemini)
-        thread.daemon = True
-        thread.start()
-        thread.join(timeout=30)  # 30 second timeout
-        
-        if thread.is_alive():
-            print(f"❌ Gemini API timeout after 30s - using fallback")
+        try:
+            parts = generate_ai_parts("explain", plan_chunks(code, language), build_prompt, on_chunk, priority)
+        except AIGatewayTimeout as e:
+            print(f"❌ Gemini API timeout ({e}) - using fallback")
             return None
-        
-        if result_container['error']:
-            print(f"❌ Gemini API error: {result_container['error']}")
+        except AIQuotaExceeded as e:
+            print(f"⚠️ {e} (retry in {e.retry_after}s) - using fallback")
             return None
-        
-        if not result_container['response']:
-            print(f"❌ No response from Gemini API")
+        except json.JSONDecodeError as e:
+            print(f"❌ AI explanation JSON parse error: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Gemini API error: {e}")
             return None
         
-        response_text = result_container['response'].text.strip()
         elapsed = time.time() - start_time
-        print(f"✅ AI response received ({len(response_text)} chars) in {elapsed:.1f}s")
-        
-        # Clean up markdown code blocks (Gemini often wraps JSON in ```json ... ```)
-        if response_text.startswith('```'):
-            # Remove all lines that are just markdown delimiters
-            lines = response_text.split('\n')
-            clean_lines = [line for line in lines if not line.strip().startswith('```')]
-            response_text = '\n'.join(clean_lines).strip()
-            print("🧹 Removed markdown wrapper")
-        
-        # Parse JSON
-        result = json.loads(response_text)
+        print(f"✅ AI response received ({len(parts)} part(s)) in {elapsed:.1f}s")
+        
+        # Merge chunk explanations (parsing is handled by ai_json)
+        result = merge_explanations(parts)
         print(f"✅ JSON parsed successfully - {len(result.get('steps', []))} steps found")
         return result
         
-    except json.JSONDecodeError as e:
-        print(f"❌ AI explanation JSON parse error: {e}")
-        print(f"Response preview: {response_text[:200]}...")
-        return None
     except Exception as e:
         print(f"❌ AI explanation error: {e}")
         return None  # Fall back to rule-based
@@ -1855,7 +2932,11 @@ def generate_comprehensive_explanation(code, language):
     ai_result = ai_explain_code(code, language)
     
     print(f"   AI Result: {'✅ SUCCESS' if ai_result else '❌ NONE (falling back)'}")
-    
+    return render_comprehensive_explanation(code, language, ai_result)
+
+
+def render_comprehensive_explanation(code, language, ai_result):
+    """Explanation HTML from an AI result, or from rule-based analysis when it is None"""
     if ai_result:
         # Use AI-generated analysis
         code_analysis = {
@@ -2928,6 +4009,13 @@ def analyze_edge_cases_and_optimizations(code, language):
     }
 
 
+EXPLAIN_LANGUAGE_ALIASES = {
+    "javascript (node.js 12.14.0)": "javascript",
+    "java (openjdk 13.0.1)": "java",
+    "c++": "cpp"
+}
+
+
 @app.route("/explain", methods=["POST"])
 def explain_code():
     """Generate comprehensive code explanations using the new 4-box system"""
@@ -2948,12 +4036,7 @@ def explain_code():
         return jsonify({"explanation": "⚠️ Please enter actual code, not plain text."}), 400
 
     # Normalize language names
-    lang_normalize = {
-        "javascript (node.js 12.14.0)": "javascript",
-        "java (openjdk 13.0.1)": "java",
-        "c++": "cpp"
-    }
-    language = lang_normalize.get(language, language)
+    language = EXPLAIN_LANGUAGE_ALIASES.get(language, language)
 
     # Generate comprehensive explanation using new system
     explanation_text = generate_comprehensive_explanation(code, language)
@@ -3426,12 +4509,7 @@ def explain_html():
         return jsonify({"html": "<div style='color:orange;'>⚠️ Please enter actual code, not plain text.</div>"}), 400
 
     # Normalize language names
-    lang_normalize = {
-        "javascript (node.js 12.14.0)": "javascript",
-        "java (openjdk 13.0.1)": "java",
-        "c++": "cpp"
-    }
-    language = lang_normalize.get(language, language)
+    language = EXPLAIN_LANGUAGE_ALIASES.get(language, language)
 
     # Generate AI-style comprehensive explanation with colored boxes
     # This now returns HTML directly, not plain text
@@ -3460,7 +4538,7 @@ def explain_html():
 
 # ---------------- AI OPTIMIZER ----------------
 
-def ai_optimize_code(code, language):
+def ai_optimize_code(code, language, on_chunk=None):
     """
     AI-powered code optimizer using Google Gemini API.
     Works for ALL languages: Python, JavaScript, Java, C++, C, etc.
@@ -3481,8 +4559,42 @@ def ai_optimize_code(code, language):
             }
     
     try:
-        prompt = f"""You are an expert code optimizer. Analyze this {language} code and provide optimizations.
+        return cached_ai_call("optimize", code, language,
+                              lambda: _generate_ai_optimization(code, language, on_chunk))
+    except json.JSONDecodeError:
+        # Fallback to old optimizer
+        if language == "python":
+            return ai_optimize_python_fallback(code)
+        else:
+            return {
+                "optimized_code": code,
+                "optimizations": [{
+                    "change": "Optimization analysis failed",
+                    "description": "Could not parse AI response. Try again or check your code syntax.",
+                    "benefit": "Error in AI processing"
+                }]
+            }
+    except Exception as e:
+        print(f"AI optimization error: {e}")
+        # Fallback to old optimizer
+        if language == "python":
+            return ai_optimize_python_fallback(code)
+        else:
+            return {
+                "optimized_code": code,
+                "optimizations": [{
+                    "change": "Optimization failed",
+                    "description": f"Error: {str(e)}",
+                    "benefit": "Please try again"
+                }]
+            }
+
 
+def _generate_ai_optimization(code, language, on_chunk=None, priority="interactive"):
+    """Gemini optimization (one request per chunk of a large file); raises on API errors and invalid responses"""
+    def build_prompt(chunk):
+        return f"""You are an expert code optimizer. Analyze this {language} code and provide optimizations.
+{chunk.prompt_note(language)}
 **IMPORTANT INSTRUCTIONS:**
 1. Return ONLY valid JSON (no markdown, no backticks, no extra text)
 2. Provide actual optimized code, not just suggestions
@@ -3491,7 +4603,7 @@ def ai_optimize_code(code, language):
 
 **Code to optimize:**
 ```{language}
-{code}
+{chunk.code}
 ```
 
 **Return this EXACT JSON format:**
@@ -3516,56 +4628,13 @@ Focus on real optimizations like:
 
 Return ONLY the JSON, nothing else."""
 
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean up response (remove markdown code blocks if present)
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        elif response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Parse JSON response
-        result = json.loads(response_text)
-        
-        # Validate response format
-        if "optimized_code" not in result or "optimizations" not in result:
-            raise ValueError("Invalid response format from AI")
-        
-        return result
-        
+    try:
+        # Parse and validate (optimized_code and optimizations are required), stitch chunks back together
+        return merge_optimizations(generate_ai_parts("optimize", plan_chunks(code, language), build_prompt, on_chunk,
+                                                     priority))
     except json.JSONDecodeError as e:
         print(f"JSON parsing error: {e}")
-        print(f"Response was: {response_text[:500]}")
-        # Fallback to old optimizer
-        if language == "python":
-            return ai_optimize_python_fallback(code)
-        else:
-            return {
-                "optimized_code": code,
-                "optimizations": [{
-                    "change": "Optimization analysis failed",
-                    "description": "Could not parse AI response. Try again or check your code syntax.",
-                    "benefit": "Error in AI processing"
-                }]
-            }
-    except Exception as e:
-        print(f"AI optimization error: {e}")
-        # Fallback to old optimizer
-        if language == "python":
-            return ai_optimize_python_fallback(code)
-        else:
-            return {
-                "optimized_code": code,
-                "optimizations": [{
-                    "change": "Optimization failed",
-                    "description": f"Error: {str(e)}",
-                    "benefit": "Please try again"
-                }]
-            }
+        raise
 
 
 def ai_optimize_python_fallback(code):
@@ -3779,14 +4848,14 @@ def format_detailed_issues(bugs_found, code_lines):
     return issues_html
 
 
-def ai_debug_code(code, language, issues):
+def ai_debug_code(code, language, issues, on_chunk=None):
     """
     AI-powered intelligent debugging that analyzes logical errors, not just syntax.
     Enhanced with Google Gemini AI for deeper analysis.
     """
     # Try AI-powered debugging first if available
     if gemini_model and language in ['python', 'javascript', 'java', 'cpp', 'c']:
-        ai_result = ai_enhance_debug(code, language, issues)
+        ai_result = ai_enhance_debug(code, language, issues, on_chunk)
         if ai_result:
             return ai_result
     
@@ -3794,22 +4863,28 @@ def ai_debug_code(code, language, issues):
     return rule_based_debug(code, language, issues)
 
 
-def ai_enhance_debug(code, language, linter_issues):
+def ai_enhance_debug(code, language, linter_issues, on_chunk=None):
     """
     Use AI to provide intelligent bug detection and fixes.
-    Combines linter output with AI insights.
+    Combines linter output with AI insights (cached per code and linter output).
     """
-    try:
-        # Prepare linter context
-        linter_context = ""
-        if linter_issues and not linter_issues.startswith("✅"):
-            linter_context = f"\n\nLinter detected these issues:\n{linter_issues}"
-        
-        prompt = f"""You are an expert code debugger. Analyze this {language} code for bugs and issues.
+    return cached_ai_call("debug", code, language, lambda: _generate_ai_debug(code, language, linter_issues, on_chunk),
+                          extra=linter_issues)
 
+
+def _generate_ai_debug(code, language, linter_issues, on_chunk=None):
+    """Gemini debugging (one request per chunk of a large file); None on API error or unparseable output"""
+    # Prepare linter context (its line numbers refer to the whole file)
+    linter_context = ""
+    if linter_issues and not linter_issues.startswith("✅"):
+        linter_context = f"\n\nLinter detected these issues:\n{linter_issues}"
+
+    def build_prompt(chunk):
+        return f"""You are an expert code debugger. Analyze this {language} code for bugs and issues.
+{chunk.prompt_note(language)}
 **Code:**
 ```{language}
-{code}
+{chunk.code}
 ```
 {linter_context}
 
@@ -3844,30 +4919,11 @@ Look for:
 
 Be specific about line numbers and provide actionable fixes. Return ONLY the JSON."""
 
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean up response
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        elif response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        response_text = response_text.strip()
-        
-        # Parse JSON
-        result = json.loads(response_text)
-        
-        # Validate structure
-        if "bugs_found" not in result:
-            result["bugs_found"] = []
-        if "suggestions" not in result:
-            result["suggestions"] = []
-        if "fixed_code" not in result:
+    try:
+        # Parse JSON (schema fills bugs_found, suggestions and confidence), stitch chunks back together
+        result = merge_debug(generate_ai_parts("debug", plan_chunks(code, language), build_prompt, on_chunk))
+        if not isinstance(result.get("fixed_code"), str):
             result["fixed_code"] = code
-        if "confidence" not in result:
-            result["confidence"] = "medium"
         
         return result
         
@@ -4368,41 +5424,8 @@ def auto_fix_c_cpp(code, issues):
     return "\n".join(fixed_lines)
 
 
-@app.route("/debug", methods=["POST"])
-def debug_code():
-    """Debug code - requires login"""
-    if not check_user():
-        return jsonify({
-            "issues": "⚠️ Please login to use the debugger feature.",
-            "fixed_code": "",
-            "original_code": "",
-            "login_required": True
-        }), 401
-    
-    data = request.json
-    code = data.get("code", "")
-    language = data.get("language", "python").lower().strip()
-    
-    if not code:
-        return jsonify({
-            "issues": "⚠️ No code provided.",
-            "fixed_code": "",
-            "original_code": ""
-        })
-    
-    # Map language names
-    lang_map = {
-        "python": "python",
-        "javascript": "javascript",
-        "javascript (node.js 12.14.0)": "javascript",
-        "java": "java",
-        "java (openjdk 13.0.1)": "java",
-        "c++": "cpp",
-        "cpp": "cpp",
-        "c": "c"
-    }
-    language = lang_map.get(language, "python")
-    
+def run_linter(code, language):
+    """Linter/compiler diagnostics for /debug (pylint, eslint, cppcheck or javac), or a setup hint"""
     # Create a temporary file for linter analysis
     ext_map = {
         "python": ".py",
@@ -4598,6 +5621,82 @@ def debug_code():
                 os.remove(tmpfile)
             except Exception:
                 pass
+    return linter_output
+
+
+def python_debug_report(code, linter_output, ai_analysis):
+    """(issues text, fixed code) for a Python /debug response from the AI analysis and linter output"""
+    all_issues = []
+
+    # Collect ALL issues found by AI
+    if ai_analysis["bugs_found"]:
+        # Format all bugs in detail
+        ai_issues = format_detailed_issues(ai_analysis["bugs_found"], code.splitlines())
+        all_issues.append(ai_issues)
+
+    # Add linter issues if they exist
+    if linter_output and not linter_output.startswith("✅"):
+        all_issues.append("\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+        all_issues.append("🔍 **LINTER ANALYSIS:**\n\n")
+        all_issues.append(linter_output)
+
+    # Add suggestions at the end
+    if ai_analysis["suggestions"]:
+        all_issues.append("\n\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+        all_issues.append("💡 **BEST PRACTICES & SUGGESTIONS:**\n\n")
+        for i, suggestion in enumerate(ai_analysis["suggestions"], 1):
+            all_issues.append(f"  {i}. {suggestion}\n")
+
+    # Combine all issues
+    if all_issues:
+        linter_output = "".join(all_issues)
+    else:
+        linter_output = "✅ **GREAT JOB!**\n\nNo issues found! Your code looks clean and follows best practices. 🎉"
+
+    # Show fixed code suggestion (but keep original in main view)
+    if ai_analysis["fixed_code"] and ai_analysis["fixed_code"] != code:
+        fixed_code = ai_analysis["fixed_code"]
+    else:
+        fixed_code = code
+    return linter_output, fixed_code
+
+
+@app.route("/debug", methods=["POST"])
+def debug_code():
+    """Debug code - requires login"""
+    if not check_user():
+        return jsonify({
+            "issues": "⚠️ Please login to use the debugger feature.",
+            "fixed_code": "",
+            "original_code": "",
+            "login_required": True
+        }), 401
+    
+    data = request.json
+    code = data.get("code", "")
+    language = data.get("language", "python").lower().strip()
+    
+    if not code:
+        return jsonify({
+            "issues": "⚠️ No code provided.",
+            "fixed_code": "",
+            "original_code": ""
+        })
+    
+    # Map language names
+    lang_map = {
+        "python": "python",
+        "javascript": "javascript",
+        "javascript (node.js 12.14.0)": "javascript",
+        "java": "java",
+        "java (openjdk 13.0.1)": "java",
+        "c++": "cpp",
+        "cpp": "cpp",
+        "c": "c"
+    }
+    language = lang_map.get(language, "python")
+    
+    linter_output = run_linter(code, language)
 
     # === AI-POWERED COMPREHENSIVE DEBUGGING ===
     # Focus on finding ALL issues, not just fixing one
@@ -4609,37 +5708,7 @@ def debug_code():
         if language == "python":
             # Use AI analysis for comprehensive Python debugging
             ai_analysis = ai_debug_code(code, language, linter_output)
-            
-            # Collect ALL issues found by AI
-            if ai_analysis["bugs_found"]:
-                # Format all bugs in detail
-                ai_issues = format_detailed_issues(ai_analysis["bugs_found"], code.splitlines())
-                all_issues.append(ai_issues)
-            
-            # Add linter issues if they exist
-            if linter_output and not linter_output.startswith("✅"):
-                all_issues.append("\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
-                all_issues.append("🔍 **LINTER ANALYSIS:**\n\n")
-                all_issues.append(linter_output)
-            
-            # Add suggestions at the end
-            if ai_analysis["suggestions"]:
-                all_issues.append("\n\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
-                all_issues.append("💡 **BEST PRACTICES & SUGGESTIONS:**\n\n")
-                for i, suggestion in enumerate(ai_analysis["suggestions"], 1):
-                    all_issues.append(f"  {i}. {suggestion}\n")
-            
-            # Combine all issues
-            if all_issues:
-                linter_output = "".join(all_issues)
-            else:
-                linter_output = "✅ **GREAT JOB!**\n\nNo issues found! Your code looks clean and follows best practices. 🎉"
-            
-            # Show fixed code suggestion (but keep original in main view)
-            if ai_analysis["fixed_code"] and ai_analysis["fixed_code"] != code:
-                fixed_code = ai_analysis["fixed_code"]
-            else:
-                fixed_code = code
+            linter_output, fixed_code = python_debug_report(code, linter_output, ai_analysis)
         
         elif language == "javascript":
             # Show linter issues + attempt to provide fixed version
@@ -4696,6 +5765,12 @@ def debug_code():
     })
 
 # ---------------- HISTORY API ----------------
+def _history_execution(item):
+    """Resource usage stored with a history row (columns 7-10), None for non-run activities"""
+    if item[7] is None:
+        return None
+    return {'status_id': item[7], 'time': item[8], 'wall_time': item[9], 'memory': item[10]}
+
 @app.route("/api/history", methods=["GET"])
 def get_history():
     """Get user's activity history"""
@@ -4716,7 +5791,8 @@ def get_history():
                 'language': item[3],
                 'title': item[4],
                 'output': item[5],
-                'created_at': item[6].strftime('%Y-%m-%d %H:%M:%S') if item[6] else ''
+                'created_at': item[6].strftime('%Y-%m-%d %H:%M:%S') if item[6] else '',
+                'execution': _history_execution(item)
             })
         
         return jsonify({"history": history_list})
@@ -4741,11 +5817,38 @@ def get_history_item(history_id):
             'language': item[3],
             'title': item[4],
             'output': item[5],
-            'created_at': item[6].strftime('%Y-%m-%d %H:%M:%S') if item[6] else ''
+            'created_at': item[6].strftime('%Y-%m-%d %H:%M:%S') if item[6] else '',
+            'execution': _history_execution(item)
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/history/runtime-stats", methods=["GET"])
+def get_history_runtime_stats():
+    """Per-language run outcomes, CPU time and memory from the user's run history (?scope=all for admins)"""
+    if not check_user():
+        return jsonify({"error": "Not logged in"}), 401
+    
+    try:
+        user_id = None if request.args.get('scope') == 'all' and is_admin() else session['user_id']
+        stats = []
+        for row in get_runtime_stats(user_id):
+            stats.append({
+                'language': row[0],
+                'runs': row[1],
+                'accepted': row[2] or 0,
+                'time_limit_exceeded': row[3] or 0,
+                'runtime_errors': row[4] or 0,
+                'compile_errors': row[5] or 0,
+                'avg_time': round(float(row[6]), 4) if row[6] is not None else None,
+                'max_time': row[7],
+                'avg_memory': round(float(row[8])) if row[8] is not None else None,
+                'max_memory': row[9]
+            })
+        return jsonify({"languages": stats})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/history/<int:history_id>", methods=["DELETE"])
 def delete_history(history_id):
     """Delete a history item"""
@@ -4761,6 +5864,70 @@ def delete_history(history_id):
 # ═══════════════════════════════════════════════════════════════════════
 # SAVE CODE API
 # ═══════════════════════════════════════════════════════════════════════
+# ═══════════════════════════════════════════════════════════════════════
+# AI PRECOMPUTE FOR SAVED AND SHARED CODE
+# ═══════════════════════════════════════════════════════════════════════
+# Saved and shared snippets get their explanation, quality review and
+# optimization generated in the background (background quota priority,
+# only while no interactive AI call is waiting), keyed exactly as the
+# /explain, /api/code-quality and /optimize routes will look them up.
+# Editor languages (bundle_language spelling); anything else the AI routes never look up
+PRECOMPUTE_SOURCE_LANGUAGES = {"python", "javascript", "java", "cpp", "c"}
+PRECOMPUTE_LANGUAGES = {
+    "explain": bundle_language,  # /explain: lowercased, stripped, aliased
+    "quality": lambda language: (language or "python").lower(),
+    "optimize": lambda language: (language or "python").lower()
+}
+
+
+def _precompute_explain(code, language):
+    result = cached_ai_call("explain", code, language,
+                            lambda: _generate_ai_explanation(code, language, priority="background"))
+    if result is None:
+        raise RuntimeError("No usable AI explanation")
+
+
+def _precompute_quality(code, language):
+    result = cached_ai_call("quality", code, language,
+                            lambda: _generate_ai_quality(code, language, priority="background"))
+    if result is None:
+        raise RuntimeError("No usable AI quality analysis")
+
+
+def _precompute_optimize(code, language):
+    result = cached_ai_call("optimize", code, language,
+                            lambda: _generate_ai_optimization(code, language, priority="background"))
+    if result is None:
+        raise RuntimeError("No usable AI optimization")
+
+
+def ai_gateway_idle():
+    """True while no AI call is waiting for a gateway worker"""
+    gateway = ai_gateway.stats()
+    return gateway["waiting"] == 0 and gateway["active"] < gateway["workers"]
+
+
+ai_precompute = AIPrecomputer(
+    {"explain": _precompute_explain, "quality": _precompute_quality, "optimize": _precompute_optimize},
+    idle=ai_gateway_idle,
+    deferred=(AIQuotaExceeded, AIGatewayBusy)
+)
+if gemini_model:
+    ai_precompute.start()  # Pick up tasks left queued by an earlier run
+
+
+def precompute_ai(code, language):
+    """Queue background AI analyses of saved/shared code (skipped without a model or cache, or for other languages)"""
+    if not gemini_model or not ai_cache.enabled or bundle_language(language) not in PRECOMPUTE_SOURCE_LANGUAGES:
+        return 0
+    tasks = []
+    for feature in ai_precompute.features:
+        feature_language = PRECOMPUTE_LANGUAGES[feature](language)
+        key, _ = ai_cache.lookup_key(feature, code, feature_language)
+        tasks.append((key, feature, feature_language))
+    return ai_precompute.enqueue(code, tasks)
+
+
 @app.route("/api/save", methods=["POST"])
 def save_code():
     """Save user code to database"""
@@ -4789,6 +5956,7 @@ def save_code():
         conn.commit()
         cursor.close()
         conn.close()
+        precompute_ai(code, language)
         
         return jsonify({
             "success": True,
@@ -4831,6 +5999,7 @@ def share_code():
         conn.commit()
         cursor.close()
         conn.close()
+        precompute_ai(code, language)
         
         # Generate share link
         share_link = f"{request.host_url}shared/{share_id}"
@@ -0,0 +1,94 @@
+# bench_ai_json.py - Recovery rate and cost of ai_json on malformed Gemini responses
+#
+# Usage (from the repo root):
+#   python benchmarks/bench_ai_json.py
+#   python benchmarks/bench_ai_json.py --corpus my_responses.jsonl --iterations 2000
+#
+# The corpus is one JSON object per line: name, feature, response (the raw
+# model text), expect (ok / partial / error) and check ({field: value} the
+# parsed result must contain). Each response is parsed two ways:
+#   legacy  - strip a leading/trailing markdown fence, then json.loads
+#   ai_json - parse_ai_json(response, feature)
+# and the script reports how many each recovered and the time per parse.
+# Any response whose ai_json outcome differs from `expect` is listed and
+# the exit status is 1, so the corpus doubles as a regression check.
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_json import parse_ai_json, validate  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_json_corpus.jsonl")
+
+
+def legacy_parse(text, feature):
+    """What the routes did before ai_json: fence stripping and json.loads"""
+    text = re.sub(r'^```(?:json)?\s*', '', text.strip())
+    text = re.sub(r'\s*```$', '', text)
+    return validate(json.loads(text), feature)
+
+
+def outcome(parse, case):
+    try:
+        result = parse(case["response"], case["feature"])
+    except ValueError:  # json.JSONDecodeError included
+        return "error", None
+    return ("partial" if result.get("partial") else "ok"), result
+
+
+def time_per_parse(parse, cases, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for case in cases:
+            outcome(parse, case)
+    return (time.perf_counter() - started) / (iterations * len(cases)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    quiet = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, quiet  # parse_ai_json logs every salvage
+    try:
+        rows = [(case, outcome(legacy_parse, case)[0], outcome(parse_ai_json, case)) for case in cases]
+        timings = {name: time_per_parse(fn, cases, args.iterations)
+                   for name, fn in (("legacy", legacy_parse), ("ai_json", parse_ai_json))}
+    finally:
+        sys.stdout = stdout
+        quiet.close()
+
+    failures = []
+    print(f"{'response':<30}{'feature':<11}{'legacy':>9}{'ai_json':>9}{'expect':>9}")
+    for case, legacy, (got, result) in rows:
+        wrong = [field for field, value in case.get("check", {}).items()
+                 if result is None or result.get(field) != value]
+        if got != case["expect"] or wrong:
+            failures.append((case["name"], got, wrong))
+        print(f"{case['name']:<30}{case['feature']:<11}{legacy:>9}{got:>9}{case['expect']:>9}")
+
+    recovered = {name: sum(1 for row in rows if (row[1] if name == "legacy" else row[2][0]) != "error")
+                 for name in ("legacy", "ai_json")}
+    print()
+    for name in ("legacy", "ai_json"):
+        print(f"{name:<8} recovered {recovered[name]:>3}/{len(cases)}  {timings[name]:>8.1f} us/parse")
+
+    if failures:
+        print()
+        for name, got, wrong in failures:
+            print(f"❌ {name}: got {got}" + (f", wrong fields {wrong}" if wrong else ""))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
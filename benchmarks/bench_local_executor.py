@@ -0,0 +1,86 @@
+# bench_local_executor.py - Cold spawn vs warm pool latency for the local Python executor
+#
+# Usage (from the repo root, POSIX only):
+#   python benchmarks/bench_local_executor.py
+#   python benchmarks/bench_local_executor.py --concurrency 1 10 100 --rounds 3
+#
+# For each concurrency level it fires that many snippets at once, `rounds`
+# times, and reports per-run latency (p50/p95/max) and throughput for:
+#   cold - a fresh interpreter is spawned for every run (warm pool disabled)
+#   warm - runs take a pre-spawned, pre-imported interpreter from the pool
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executors import LocalPythonExecutor  # noqa: E402
+
+SNIPPET = """
+import math
+from collections import Counter
+words = input().split()
+print(Counter(words).most_common(1)[0][0], round(math.sqrt(len(words)), 3))
+"""
+STDIN = "the quick brown fox jumps over the lazy dog the end\n"
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def wait_until_warm(executor, expected, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline and executor.pool.stats()["idle"] < expected:
+        time.sleep(0.05)
+
+
+def bench(executor, concurrency, rounds, warm):
+    latencies = []
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        for _ in range(rounds):
+            if warm:
+                wait_until_warm(executor, executor.pool.size)
+
+            def one_run(_):
+                t0 = time.time()
+                result = executor.run(SNIPPET, 71, STDIN)
+                assert result["status"]["description"] == "Accepted", result
+                return time.time() - t0
+
+            latencies.extend(threads.map(one_run, range(concurrency)))
+    elapsed = time.time() - started
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "runs_per_s": len(latencies) / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'runs/s':>10}")
+    for concurrency in args.concurrency:
+        for mode in ("cold", "warm"):
+            executor = LocalPythonExecutor(
+                workers=concurrency,
+                warm_pool_size=concurrency if mode == "warm" else 0
+            )
+            if mode == "warm":
+                executor.pool.start()
+            stats = bench(executor, concurrency, args.rounds, warm=(mode == "warm"))
+            print(f"{mode:<6}{concurrency:>6}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                  f"{stats['max_ms']:>10.1f}{stats['runs_per_s']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# load_test.py - Throughput and latency of /run, /compile and /api/run-batch against a mock Judge0
+#
+# Usage (from the repo root):
+#   python benchmarks/load_test.py
+#   python benchmarks/load_test.py --paths run compile --concurrency 1 10 50 --requests 200
+#   python benchmarks/load_test.py --failure-rate 0.05 --http-error-rate 0.02 --no-wait
+#   python benchmarks/load_test.py --callbacks --callback-failure-rate 0.2 --paths run compile
+#   python benchmarks/load_test.py --app-url http://localhost:5000 --judge0-stats http://localhost:2358/stats
+#
+# By default the app is booted in this process (SQLite database in a temp
+# directory) with its Judge0 endpoints pointed at benchmarks/mock_judge0.py,
+# so nothing touches the public API. With --app-url an already running app
+# is driven instead; start it with JUDGE0 URLs pointing at mock_judge0.py.
+#
+# For every path and concurrency level, `requests` calls are spread over
+# `concurrency` client threads and the report shows throughput, latency
+# percentiles, errors, 429s shed by the execution scheduler and the number
+# of Judge0 calls (submits + fetches) each app request cost.
+#
+# --callbacks points JUDGE0_CALLBACK_URL at the booted app, so Judge0 results
+# arrive through /api/judge0/callback instead of polling, and adds columns
+# for callbacks delivered, callbacks missed (finished by the fallback polls)
+# and mock fetches per request. --callback-failure-rate makes the mock drop a
+# share of the callbacks so the fallback polling is exercised too.
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_judge0 import MockJudge0, add_config_arguments, config_from_args  # noqa: E402
+
+SOURCES = {
+    71: "print(input())",
+    50: '#include <stdio.h>\nint main(){char s[256];if(fgets(s,256,stdin))printf("%s",s);return 0;}',
+    54: "#include <iostream>\n#include <string>\nint main(){std::string s;std::getline(std::cin,s);std::cout<<s<<std::endl;}",
+    62: "import java.util.*;\npublic class Main{public static void main(String[] a){System.out.println(new Scanner(System.in).nextLine());}}",
+    63: "process.stdin.on('data', d => process.stdout.write(d.toString()))"
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def boot_app(judge0_url, scheduler, callbacks=False, callback_grace=1.0):
+    """Import app.py against the mock and serve it on a local port; returns its base URL"""
+    workdir = tempfile.mkdtemp(prefix="codex-load-")
+    os.environ.setdefault("DB_TYPE", "sqlite")
+    os.environ.setdefault("DATABASE_PATH", os.path.join(workdir, "codex.db"))
+    os.environ["EXEC_SCHED_ENABLED"] = "True" if scheduler else "False"
+    if callbacks:
+        # Read at import time; the defaults (10 s) would make every dropped callback cost 10 s
+        os.environ["JUDGE0_CALLBACK_GRACE"] = str(callback_grace)
+        os.environ["JUDGE0_CALLBACK_POLL_INTERVAL"] = str(callback_grace)
+
+    import judge0_client
+    judge0_client.JUDGE0_URLS[:] = [judge0_url]
+    import app as codex_app
+    codex_app.judge0_client.base_urls = [judge0_url]
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No per-request access log
+    server = make_server("127.0.0.1", 0, codex_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app_url = f"http://127.0.0.1:{server.server_port}"
+    if callbacks:
+        # The port is only known now, after the registry was built from JUDGE0_CALLBACK_URL
+        codex_app.judge0_callbacks.base_url = app_url
+        codex_app.judge0_callbacks.enabled = True
+    return app_url
+
+
+def build_request(path, language_id, index, unique, batch_cases):
+    """(url path, JSON body) for one request; unique stdin defeats the execution result cache"""
+    stdin = f"line {uuid.uuid4().hex if unique else index % 10}\n"
+    code = SOURCES.get(language_id, SOURCES[71])
+    if path == "batch":
+        cases = [{"stdin": f"{stdin.strip()} case {n}\n", "expected_output": f"{stdin.strip()} case {n}"}
+                 for n in range(batch_cases)]
+        return "/api/run-batch", {"code": code, "language_id": language_id, "cases": cases}
+    return f"/{path}", {"code": code, "language_id": language_id, "stdin": stdin}
+
+
+def classify(path, response):
+    """ok, shed (429) or error for one response"""
+    if response.status_code == 429:
+        return "shed"
+    if response.status_code != 200:
+        return "error"
+    data = response.json()
+    if path == "run":
+        return "ok" if data.get("result") else "error"  # Fallback output when every endpoint failed
+    return "error" if data.get("error") else "ok"
+
+
+def run_level(app_url, path, language_id, concurrency, total, unique, batch_cases):
+    local = threading.local()
+    latencies = []
+    outcomes = {"ok": 0, "shed": 0, "error": 0}
+    lock = threading.Lock()
+
+    def one(index):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        url_path, body = build_request(path, language_id, index, unique, batch_cases)
+        started = time.time()
+        try:
+            outcome = classify(path, session.post(app_url + url_path, json=body, timeout=180))
+        except requests.exceptions.RequestException:
+            outcome = "error"
+        elapsed = time.time() - started
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == "ok":
+                latencies.append(elapsed)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(one, range(total)))
+    elapsed = time.time() - started
+    return {
+        "requests": total,
+        "ok": outcomes["ok"],
+        "shed": outcomes["shed"],
+        "errors": outcomes["error"],
+        "req_per_s": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": max(latencies) * 1000 if latencies else None
+    }
+
+
+def judge0_calls(stats):
+    return sum(stats.get(name, 0) for name in ("submissions", "fetches", "batch_submissions", "batch_fetches"))
+
+
+def callback_counts(app_url):
+    """(delivered, missed) from the app's callback registry; missed ones were finished by polling"""
+    try:
+        stats = requests.get(app_url + "/api/execution/stats", timeout=5).json().get("callbacks", {})
+    except (requests.exceptions.RequestException, ValueError):
+        return 0, 0
+    return stats.get("delivered", 0), stats.get("missed", 0)
+
+
+def fmt(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the execution path against a mock Judge0")
+    parser.add_argument("--app-url", help="Drive a running app instead of booting one in-process")
+    parser.add_argument("--judge0-stats", help="Mock /stats URL when using --app-url")
+    parser.add_argument("--paths", nargs="+", default=["run", "compile", "batch"], choices=["run", "compile", "batch"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per path and concurrency level")
+    parser.add_argument("--language-id", type=int, default=71)
+    parser.add_argument("--batch-cases", type=int, default=5)
+    parser.add_argument("--repeat-inputs", action="store_true",
+                        help="Reuse 10 stdins so the result cache and single-flight get hits")
+    parser.add_argument("--scheduler", action="store_true",
+                        help="Keep execution admission control on (all load comes from one IP, so expect 429s)")
+    parser.add_argument("--callbacks", action="store_true",
+                        help="Have Judge0 PUT results to the app (JUDGE0_CALLBACK_URL) instead of being polled")
+    parser.add_argument("--callback-grace", type=float, default=1.0,
+                        help="JUDGE0_CALLBACK_GRACE and _POLL_INTERVAL of the booted app with --callbacks")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    mock = None
+    if args.app_url:
+        app_url, stats_url = args.app_url.rstrip("/"), args.judge0_stats
+    else:
+        mock = MockJudge0(config_from_args(args))
+        mock.start()
+        app_url, stats_url = boot_app(mock.url, args.scheduler, args.callbacks, args.callback_grace), None
+
+    def judge0_stats():
+        if mock:
+            return mock.stats()
+        if stats_url:
+            try:
+                return requests.get(stats_url, timeout=5).json()
+            except requests.exceptions.RequestException:
+                return {}
+        return {}
+
+    print(f"{'path':<9}{'conc':>6}{'reqs':>7}{'ok':>6}{'429':>6}{'err':>6}{'req/s':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'j0/req':>8}"
+          + (f"{'cb':>6}{'missed':>8}{'poll/req':>10}" if args.callbacks else ""))
+    for path in args.paths:
+        for concurrency in args.concurrency:
+            stats_before = judge0_stats()
+            callbacks_before = callback_counts(app_url) if args.callbacks else (0, 0)
+            result = run_level(app_url, path, args.language_id, concurrency, args.requests,
+                               unique=not args.repeat_inputs, batch_cases=args.batch_cases)
+            stats_after = judge0_stats()
+            before, after = judge0_calls(stats_before), judge0_calls(stats_after)
+            per_request = (after - before) / result["requests"] if (before or after) else None
+            line = (f"{path:<9}{concurrency:>6}{result['requests']:>7}{result['ok']:>6}{result['shed']:>6}"
+                    f"{result['errors']:>6}{result['req_per_s']:>9.1f}{fmt(result['p50_ms']):>10}"
+                    f"{fmt(result['p95_ms']):>10}{fmt(result['p99_ms']):>10}{fmt(result['max_ms']):>10}"
+                    f"{fmt(per_request):>8}")
+            if args.callbacks:
+                delivered, missed = (now - then for now, then in zip(callback_counts(app_url), callbacks_before))
+                polls = stats_after.get("fetches", 0) - stats_before.get("fetches", 0) if stats_after else None
+                line += f"{delivered:>6}{missed:>8}{fmt(polls / result['requests'] if polls is not None else None):>10}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# mock_judge0.py - Local Judge0 stand-in for load-testing the execution path offline
+#
+# Usage (from the repo root):
+#   python benchmarks/mock_judge0.py --port 2358 --queue 0.2 --processing 0.3
+#   python benchmarks/mock_judge0.py --failure-rate 0.05 --http-error-rate 0.02 --http-error-status 503
+#   python benchmarks/mock_judge0.py --callback-failure-rate 0.2
+#
+# Speaks the subset of the Judge0 CE API the app uses: POST /submissions
+# (wait=true/false, callback_url), GET /submissions/<token>, POST/GET
+# /submissions/batch. Each submission spends `queue` seconds "In Queue", then
+# `processing` seconds "Processing" (both +/- jitter) and finishes with stdout
+# equal to its stdin ("hi\n" without stdin), graded against expected_output.
+# Submissions with a callback_url get it PUT when they finish, except for a
+# `callback_failure_rate` share that is dropped like an unreachable callback.
+# No code is executed. GET /stats returns request counters so a load test can
+# report how many Judge0 calls each app request cost.
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ACCEPTED = {"id": 3, "description": "Accepted"}
+WRONG_ANSWER = {"id": 4, "description": "Wrong Answer"}
+INTERNAL_ERROR = {"id": 13, "description": "Internal Error"}
+IN_QUEUE = {"id": 1, "description": "In Queue"}
+PROCESSING = {"id": 2, "description": "Processing"}
+
+
+class MockConfig:
+    """Latency and failure behaviour of the mock; rates are probabilities per submission / request"""
+
+    def __init__(self, queue=0.2, processing=0.3, jitter=0.1, failure_rate=0.0, http_error_rate=0.0,
+                 http_error_status=503, allow_wait=True, callback_failure_rate=0.0, seed=None):
+        self.queue = queue
+        self.processing = processing
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.http_error_rate = http_error_rate
+        self.http_error_status = http_error_status
+        self.allow_wait = allow_wait
+        self.callback_failure_rate = callback_failure_rate
+        self.random = random.Random(seed)
+
+
+class MockJudge0:
+    """In-memory submissions plus the HTTP server that serves them"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self._submissions = {}
+        self._lock = threading.Lock()
+        self.counters = {"submissions": 0, "fetches": 0, "batch_submissions": 0, "batch_fetches": 0,
+                         "callbacks": 0, "callback_failures": 0, "http_errors": 0, "internal_errors": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread; returns the base URL"""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, stored=len(self._submissions))
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    # ---- Submission lifecycle ----
+
+    def _spread(self, seconds):
+        return max(seconds + self.config.random.uniform(-self.config.jitter, self.config.jitter), 0.0)
+
+    def create(self, body):
+        token = str(uuid.uuid4())
+        now = time.time()
+        queued_until = now + self._spread(self.config.queue)
+        submission = {
+            "body": body,
+            "queued_until": queued_until,
+            "finished_at": queued_until + self._spread(self.config.processing),
+            "failed": self.config.random.random() < self.config.failure_rate
+        }
+        with self._lock:
+            self._submissions[token] = submission
+        if body.get("callback_url"):
+            threading.Thread(target=self._send_callback, args=(token,), daemon=True).start()
+        return token
+
+    def state(self, token):
+        with self._lock:
+            submission = self._submissions.get(token)
+        if submission is None:
+            return None
+        now = time.time()
+        if now < submission["queued_until"]:
+            return {"token": token, "status": IN_QUEUE}
+        if now < submission["finished_at"]:
+            return {"token": token, "status": PROCESSING}
+        return self._finished(token, submission)
+
+    def _finished(self, token, submission):
+        if submission["failed"]:
+            self._count("internal_errors")
+            return {"token": token, "status": INTERNAL_ERROR, "stdout": None, "stderr": None,
+                    "compile_output": None, "message": "Mock internal error", "time": None,
+                    "wall_time": None, "memory": None, "exit_code": None}
+        body = submission["body"]
+        stdout = body.get("stdin") or "hi\n"
+        status = ACCEPTED
+        expected = body.get("expected_output")
+        if expected is not None and expected.strip() != stdout.strip():
+            status = WRONG_ANSWER
+        run_seconds = submission["finished_at"] - submission["queued_until"]
+        return {"token": token, "status": status, "stdout": stdout, "stderr": None, "compile_output": None,
+                "message": None, "time": f"{run_seconds * 0.8:.3f}", "wall_time": f"{run_seconds:.3f}",
+                "memory": 3000 + len(stdout) // 1024, "exit_code": 0}
+
+    def wait_until_finished(self, token):
+        with self._lock:
+            finished_at = self._submissions[token]["finished_at"]
+        time.sleep(max(finished_at - time.time(), 0))
+        return self.state(token)
+
+    def _send_callback(self, token):
+        """PUT the finished submission to its callback_url, base64 encoded like Judge0 does"""
+        result = self.wait_until_finished(token)
+        if self.config.random.random() < self.config.callback_failure_rate:
+            self._count("callback_failures")  # Never sent: the app has to poll for it
+            return
+        with self._lock:
+            callback_url = self._submissions[token]["body"]["callback_url"]
+        for field in ("stdout", "stderr", "compile_output", "message"):
+            if result.get(field):
+                result[field] = base64.b64encode(result[field].encode('utf-8')).decode('ascii')
+        try:
+            requests.put(callback_url, json=result, timeout=5)
+            self._count("callbacks")
+        except requests.exceptions.RequestException:
+            self._count("callback_failures")
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _injected_error(self):
+                if mock.config.random.random() < mock.config.http_error_rate:
+                    mock._count("http_errors")
+                    self._send(mock.config.http_error_status, {"error": "Mock injected failure"})
+                    return True
+                return False
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, {"error": "Invalid JSON"})
+                if self._injected_error():
+                    return
+
+                url = urlparse(self.path)
+                if url.path.rstrip("/").endswith("/batch"):
+                    submissions = body.get("submissions") or []
+                    mock._count("batch_submissions")
+                    return self._send(201, [{"token": mock.create(item)} for item in submissions])
+
+                mock._count("submissions")
+                token = mock.create(body)
+                if "wait=true" in url.query and mock.config.allow_wait:
+                    return self._send(201, mock.wait_until_finished(token))
+                self._send(201, {"token": token})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/stats":
+                    return self._send(200, mock.stats())
+                if self._injected_error():
+                    return
+
+                if url.path.rstrip("/").endswith("/batch"):
+                    mock._count("batch_fetches")
+                    tokens = (parse_qs(url.query).get("tokens") or [""])[0].split(",")
+                    return self._send(200, {"submissions": [mock.state(token) for token in tokens]})
+
+                mock._count("fetches")
+                token = url.path.rsplit("/", 1)[-1]
+                result = mock.state(token)
+                if result is None:
+                    return self._send(404, {"error": "Not found"})
+                self._send(200, result)
+
+        return Handler
+
+
+def add_config_arguments(parser):
+    """Mock behaviour flags, shared with load_test.py"""
+    parser.add_argument("--queue", type=float, default=0.2, help="Seconds each submission spends In Queue")
+    parser.add_argument("--processing", type=float, default=0.3, help="Seconds each submission spends Processing")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- seconds added to queue and processing")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of submissions ending in Internal Error")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Share of requests answered with an HTTP error")
+    parser.add_argument("--http-error-status", type=int, default=503)
+    parser.add_argument("--no-wait", action="store_true", help="Ignore wait=true like the public API")
+    parser.add_argument("--callback-failure-rate", type=float, default=0.0,
+                        help="Share of callback_url PUTs that are dropped instead of sent")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args):
+    return MockConfig(queue=args.queue, processing=args.processing, jitter=args.jitter,
+                      failure_rate=args.failure_rate, http_error_rate=args.http_error_rate,
+                      http_error_status=args.http_error_status, allow_wait=not args.no_wait,
+                      callback_failure_rate=args.callback_failure_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Judge0 stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2358)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    mock = MockJudge0(config_from_args(args), host=args.host, port=args.port)
+    print(f"Mock Judge0 listening on {mock.url} (stats at {mock.url}/stats)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(mock.stats()))
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# code_canonical.py - Canonical (alpha-renamed) form of Python code for AI cache keys
+#
+# Two submissions that differ only in local names, docstrings, comments or
+# formatting get the same canonical source, so they share one cached Gemini
+# answer. The answer is stored with the user's names swapped for
+# placeholders (__v0__, __v1__, ...) and mapped back to the next user's names
+# when it is served.
+import re
+import ast
+import hashlib
+import builtins
+
+PLACEHOLDER = re.compile(r'__v(\d+)__')
+BUILTIN_NAMES = frozenset(dir(builtins))
+
+# Calls that read variables by their spelling: renaming would change behaviour
+REFLECTIVE_CALLS = {"globals", "locals", "vars", "eval", "exec"}
+
+# Features whose answers cite line numbers: the statement layout joins the key
+LINE_SENSITIVE_FEATURES = {"debug", "quality", "visualize", "bundle"}
+
+# Response fields holding code rather than prose
+CODE_FIELDS = {"code", "code_snippet", "optimized_code", "fixed_code"}
+
+CODE_TOKENS = re.compile(
+    r'(#[^\n]*)|("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|(?<![\w.])([A-Za-z_]\w*)'
+)
+IDENTIFIER = re.compile(r'(?<![\w.])[A-Za-z_]\w*')
+
+# English function words that are also plausible variable names. In prose
+# they are left as written (the placeholder would turn "a loop" into "n
+# loop"), so their spelling joins the cache key instead: answers mentioning
+# them are only shared between submissions that use the same names.
+PROSE_WORDS = frozenset({
+    "a", "an", "the", "i", "it", "its", "me", "my", "we", "us", "he", "she", "they", "them", "this", "that",
+    "these", "those", "to", "of", "on", "at", "by", "up", "be", "do", "no", "so", "than", "then", "also",
+    "all", "any", "each", "some", "both", "either", "neither"
+})
+
+
+def _placeholder(index):
+    return f"__v{index}__"
+
+
+def _is_dunder(name):
+    return name.startswith('__') and name.endswith('__')
+
+
+def _strip_docstring(node):
+    body = node.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        node.body = body[1:] or [ast.Pass()]
+
+
+class _Bindings(ast.NodeVisitor):
+    """
+    Names the code binds, in first-binding order, plus names that must keep
+    their spelling: attributes, keyword arguments, imported modules and
+    names, and class-body members (all reached by name from elsewhere).
+    """
+
+    def __init__(self):
+        self.bound = {}
+        self.fixed = set()
+        self.reflective = False
+        self.star_import = False
+
+    def _bind(self, name):
+        if name:
+            self.bound.setdefault(name, None)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._bind(node.id)
+        elif node.id in REFLECTIVE_CALLS:
+            self.reflective = True
+
+    def visit_arg(self, node):
+        self._bind(node.arg)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self._bind(node.name)
+        for stmt in node.body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.fixed.add(stmt.name)
+            elif isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+                for target in targets:
+                    self.fixed.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        self.fixed.add(node.attr)
+        self.generic_visit(node)
+
+    def visit_keyword(self, node):
+        if node.arg:
+            self.fixed.add(node.arg)
+        self.generic_visit(node)
+
+    def visit_alias(self, node):
+        if node.name == '*':
+            self.star_import = True
+        elif node.asname:
+            self._bind(node.asname)
+        else:
+            self.fixed.add(node.name.split('.')[0])
+
+    def visit_ExceptHandler(self, node):
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchAs(self, node):
+        self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        self._bind(node.name)
+
+    def visit_MatchMapping(self, node):
+        self._bind(node.rest)
+        self.generic_visit(node)
+
+    def visit_MatchClass(self, node):
+        self.fixed.update(node.kwd_attrs)
+        self.generic_visit(node)
+
+
+class _Renamer(ast.NodeTransformer):
+    """Apply the name -> placeholder mapping everywhere a name is spelled; drop docstrings"""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+
+    def _new(self, name):
+        return self.mapping.get(name, name) if name else name
+
+    def visit_Module(self, node):
+        _strip_docstring(node)
+        self.generic_visit(node)
+        return node
+
+    def visit_Name(self, node):
+        node.id = self._new(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self._new(node.arg)
+        self.generic_visit(node)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self._new(node.name)
+        _strip_docstring(node)
+        self.generic_visit(node)
+        return node
+
+    visit_AsyncFunctionDef = visit_ClassDef = visit_FunctionDef
+
+    def visit_alias(self, node):
+        node.asname = self._new(node.asname)
+        return node
+
+    def visit_Global(self, node):
+        node.names = [self._new(name) for name in node.names]
+        return node
+
+    visit_Nonlocal = visit_Global
+
+    def visit_ExceptHandler(self, node):
+        node.name = self._new(node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_MatchAs(self, node):
+        node.name = self._new(node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_MatchStar(self, node):
+        node.name = self._new(node.name)
+        return node
+
+    def visit_MatchMapping(self, node):
+        node.rest = self._new(node.rest)
+        self.generic_visit(node)
+        return node
+
+
+class CanonicalCode:
+    """
+    Canonical source of one submission plus the names its placeholders
+    stand for. to_canonical() rewrites an answer about this submission into
+    placeholder form for storage; from_canonical() rewrites a stored answer
+    into this submission's names.
+    """
+
+    def __init__(self, source, names, layout):
+        self.source = source
+        self.names = names
+        self.layout = layout
+        self.fingerprint = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        self._placeholders = {name: _placeholder(i) for i, name in enumerate(names)}
+
+    def key_extra(self, feature, extra=None):
+        """Extra cache key material: other prompt inputs in placeholder form, and
+        the statement line layout for features that answer with line numbers"""
+        return {
+            "canonical": 2,
+            "layout": self.layout if feature in LINE_SENSITIVE_FEATURES else None,
+            "verbatim": [[i, name] for i, name in enumerate(self.names) if name.lower() in PROSE_WORDS] or None,
+            "extra": self.to_canonical(extra)
+        }
+
+    def _encode_prose(self, text):
+        # Every standalone mention of a local name is rewritten, so a shared
+        # answer never carries another user's names; PROSE_WORDS stay as
+        # written (unless quoted, called or the whole string) and are keyed
+        if text in self._placeholders:
+            return self._placeholders[text]
+
+        def replace(match):
+            name = match.group(0)
+            placeholder = self._placeholders.get(name)
+            if placeholder is None:
+                return name
+            before = text[match.start() - 1] if match.start() else ' '
+            after = text[match.end()] if match.end() < len(text) else ' '
+            if name.lower() not in PROSE_WORDS or before in '`\'"' or after in '`\'"(':
+                return placeholder
+            return name
+        return IDENTIFIER.sub(replace, text)
+
+    def _encode_code(self, text):
+        def replace(match):
+            comment, string, name = match.groups()
+            if comment:
+                return self._encode_prose(comment)
+            if string:
+                return string
+            return self._placeholders.get(name, name)
+        return CODE_TOKENS.sub(replace, text)
+
+    def _decode(self, text):
+        names = self.names
+        return PLACEHOLDER.sub(
+            lambda m: names[int(m.group(1))] if int(m.group(1)) < len(names) else m.group(0), text)
+
+    def to_canonical(self, value, field=None):
+        if isinstance(value, str):
+            return self._encode_code(value) if field in CODE_FIELDS else self._encode_prose(value)
+        if isinstance(value, dict):
+            return {self._placeholders.get(k, k) if isinstance(k, str) else k: self.to_canonical(v, k)
+                    for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.to_canonical(item, field) for item in value]
+        return value
+
+    def from_canonical(self, value):
+        if isinstance(value, str):
+            return self._decode(value)
+        if isinstance(value, dict):
+            return {self._decode(k) if isinstance(k, str) else k: self.from_canonical(v)
+                    for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.from_canonical(item) for item in value]
+        return value
+
+
+def canonicalize_python(code):
+    """
+    CanonicalCode for a Python submission, or None when it can't be safely
+    canonicalized (syntax error, star import, reflective name access, or
+    source that already uses placeholder spellings).
+
+    Local names (variables, functions, classes, parameters, import aliases)
+    are renamed to placeholders in first-binding order; builtins, imported
+    names, attributes and keyword arguments keep their spelling. Docstrings
+    and comments are dropped and formatting comes from ast.unparse. Literal
+    spelling is normalized (0x10 == 16, quote style, implicit concatenation)
+    but values are kept, since answers quote them.
+    """
+    if not code or PLACEHOLDER.search(code):
+        return None
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+
+    bindings = _Bindings()
+    bindings.visit(tree)
+    if bindings.reflective or bindings.star_import:
+        return None
+
+    layout = [[node.lineno, node.end_lineno] for node in ast.walk(tree) if isinstance(node, ast.stmt)]
+    names = [name for name in bindings.bound
+             if name not in bindings.fixed and name not in BUILTIN_NAMES and not _is_dunder(name)]
+    tree = _Renamer({name: _placeholder(i) for i, name in enumerate(names)}).visit(tree)
+    try:
+        source = ast.unparse(tree)
+    except (ValueError, RecursionError):
+        return None
+    return CanonicalCode(source, names, layout)
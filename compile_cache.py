@@ -0,0 +1,232 @@
+# compile_cache.py - Compile-once, run-many artifacts for C/C++/Java on Judge0
+#
+# A normal C/C++/Java submission makes Judge0 recompile the source for every
+# stdin. With this cache the source is compiled once through Judge0's
+# "Multi-file program" language (id 89): a build submission compiles it and
+# prints the resulting binary / class files as a base64 tarball. Later runs
+# ship that artifact back as `additional_files` with a run-only script, so
+# Judge0 skips compilation entirely. Artifacts are built inside Judge0's own
+# image, so they always match the runtime they execute on.
+import io
+import os
+import json
+import time
+import base64
+import hashlib
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from execution_cache import normalize_source
+
+load_dotenv()
+
+# Compile cache configuration
+COMPILE_CACHE_ENABLED = os.getenv('COMPILE_CACHE_ENABLED', 'True').lower() == 'true'
+COMPILE_CACHE_SIZE = int(os.getenv('COMPILE_CACHE_SIZE', 128))  # Artifacts kept per worker
+COMPILE_CACHE_MAX_BYTES = int(os.getenv('COMPILE_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # Total artifact bytes
+COMPILE_CACHE_MAX_ARTIFACT = int(os.getenv('COMPILE_CACHE_MAX_ARTIFACT', 2 * 1024 * 1024))  # Larger builds aren't cached
+COMPILE_CACHE_TTL = int(os.getenv('COMPILE_CACHE_TTL', 3600))  # Seconds
+COMPILE_CACHE_RETRY_AFTER = int(os.getenv('COMPILE_CACHE_RETRY_AFTER', 60))  # Pause after a failed build
+
+MULTI_FILE_LANGUAGE_ID = 89
+
+# How each language is built and run inside the judge0/judge0:1.13 image
+# (toolchain paths match Judge0 CE's own language definitions)
+COMPILE_RECIPES = {
+    50: {  # C (GCC 9.2.0)
+        "source": "main.c",
+        "compile": "/usr/local/gcc-9.2.0/bin/gcc main.c -o a.out {flags}",
+        "flags": os.getenv('COMPILE_FLAGS_C', '-lm'),
+        "artifacts": "a.out",
+        "run": "./a.out"
+    },
+    54: {  # C++ (GCC 9.2.0)
+        "source": "main.cpp",
+        "compile": "/usr/local/gcc-9.2.0/bin/g++ main.cpp -o a.out {flags}",
+        "flags": os.getenv('COMPILE_FLAGS_CPP', ''),
+        "artifacts": "a.out",
+        "run": "./a.out"
+    },
+    62: {  # Java (OpenJDK 13)
+        "source": "Main.java",
+        "compile": "/usr/local/openjdk13/bin/javac Main.java {flags}",
+        "flags": os.getenv('COMPILE_FLAGS_JAVA', ''),
+        "artifacts": "*.class",
+        "run": "/usr/local/openjdk13/bin/java Main"
+    }
+}
+
+
+def _zip_b64(files):
+    """Zip {name: (bytes, mode)} and base64 it for Judge0's additional_files"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, (data, mode) in files.items():
+            info = zipfile.ZipInfo(name)
+            info.external_attr = (0o100000 | mode) << 16  # Keep the executable bit through unzip
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class CompiledArtifact:
+    """A built program ready to run: the additional_files archive plus build metadata"""
+
+    def __init__(self, archive, size, compile_seconds, compile_output=None):
+        self.archive = archive
+        self.size = size
+        self.compile_seconds = compile_seconds
+        self.compile_output = compile_output
+        self.created_at = time.time()
+
+
+class CompileCache:
+    """
+    Bounded LRU of compiled artifacts keyed by (normalized source, language,
+    compiler flags), evicted by entry count, total bytes and age. Artifacts
+    live in the memory of each worker; a miss only costs one extra compile.
+    """
+
+    def __init__(self, enabled=COMPILE_CACHE_ENABLED, max_entries=COMPILE_CACHE_SIZE,
+                 max_bytes=COMPILE_CACHE_MAX_BYTES, ttl=COMPILE_CACHE_TTL):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._artifacts = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "builds": 0, "build_failures": 0,
+                          "compile_errors": 0, "evictions": 0}
+        self._time_saved = 0.0
+        self._paused_until = 0.0
+
+    def supports(self, language_id):
+        """True if this language can use compile-once mode right now"""
+        return self.enabled and language_id in COMPILE_RECIPES and time.time() >= self._paused_until
+
+    def build_failed(self):
+        """
+        A build produced no artifact (e.g. the endpoint doesn't offer the
+        multi-file language): use plain submissions for a while
+        """
+        with self._lock:
+            self._counters["build_failures"] += 1
+            self._paused_until = time.time() + COMPILE_CACHE_RETRY_AFTER
+
+    def key(self, code, language_id):
+        recipe = COMPILE_RECIPES[language_id]
+        material = json.dumps({
+            "source": normalize_source(code or ""),
+            "language_id": int(language_id),
+            "compile": recipe["compile"],
+            "flags": recipe["flags"]
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached artifact (counting a hit and the compile time it saves) or None"""
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is not None and artifact.created_at + self.ttl < time.time():
+                self._remove_locked(key)
+                artifact = None
+            if artifact is None:
+                self._counters["misses"] += 1
+                return None
+            self._artifacts.move_to_end(key)
+            self._counters["hits"] += 1
+            self._time_saved += artifact.compile_seconds
+            return artifact
+
+    def put(self, key, artifact):
+        if artifact.size > COMPILE_CACHE_MAX_ARTIFACT:
+            return
+        with self._lock:
+            if key in self._artifacts:
+                self._remove_locked(key)
+            self._artifacts[key] = artifact
+            self._bytes += artifact.size
+            while self._artifacts and (len(self._artifacts) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove_locked(next(iter(self._artifacts)))
+                self._counters["evictions"] += 1
+
+    def _remove_locked(self, key):
+        artifact = self._artifacts.pop(key)
+        self._bytes -= artifact.size
+
+    def record(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # ---- Judge0 payloads ----
+
+    def build_payload(self, code, language_id):
+        """Submission that compiles the source and prints the artifacts as a base64 tarball"""
+        recipe = COMPILE_RECIPES[language_id]
+        compile_cmd = recipe["compile"].format(flags=recipe["flags"]).strip()
+        # Judge0 runs `compile` first and reports a non-zero exit as Compilation Error;
+        # the compiler's own duration is shipped back in .compile_ms
+        compile_script = (
+            "started=$(date +%s%N)\n"
+            f"{compile_cmd} || exit $?\n"
+            "echo $(( ($(date +%s%N) - started) / 1000000 )) > .compile_ms\n"
+        )
+        files = {
+            recipe["source"]: (code.encode('utf-8'), 0o644),
+            "compile": (compile_script.encode('utf-8'), 0o755),
+            "run": (f"tar czf - .compile_ms {recipe['artifacts']} | base64 -w0\n".encode('utf-8'), 0o755)
+        }
+        return {
+            "language_id": MULTI_FILE_LANGUAGE_ID,
+            "additional_files": _zip_b64(files)
+        }
+
+    def artifact_from_build(self, result, language_id, round_trip_seconds):
+        """Turn a finished build submission into a CompiledArtifact (None if it produced no artifacts)"""
+        compile_seconds = round_trip_seconds
+        try:
+            tarball = base64.b64decode((result.get("stdout") or "").strip(), validate=True)
+            files = {}
+            with tarfile.open(fileobj=io.BytesIO(tarball), mode='r:gz') as tar:
+                for member in tar.getmembers():
+                    if not member.isfile() or '/' in member.name or member.name in ("run", "compile"):
+                        continue
+                    data = tar.extractfile(member).read()
+                    if member.name == ".compile_ms":
+                        compile_seconds = int(data.strip() or 0) / 1000
+                        continue
+                    files[member.name] = (data, member.mode & 0o777)
+        except (ValueError, tarfile.TarError, OSError):
+            return None
+        if not files:
+            return None
+
+        recipe = COMPILE_RECIPES[language_id]
+        files["run"] = (f"{recipe['run']}\n".encode('utf-8'), 0o755)
+        archive = _zip_b64(files)
+        return CompiledArtifact(archive, len(archive), compile_seconds, result.get("compile_output"))
+
+    def run_payload(self, artifact, stdin=""):
+        """Submission that runs a cached artifact without compiling"""
+        return {
+            "language_id": MULTI_FILE_LANGUAGE_ID,
+            "additional_files": artifact.archive,
+            "stdin": stdin
+        }
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters["hits"] + counters["misses"]
+            counters.update({
+                "enabled": self.enabled,
+                "entries": len(self._artifacts),
+                "bytes": self._bytes,
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                "time_saved_seconds": round(self._time_saved, 3)
+            })
+            return counters
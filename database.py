@@ -19,6 +19,22 @@ MYSQL_CONFIG = {
 # PostgreSQL configuration (for Render deployment)
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
+# Execution resource usage stored with 'run' history entries. Added after
+# code_history first shipped, so init adds any that an existing table lacks.
+HISTORY_EXECUTION_COLUMNS = [
+    ("exec_status_id", "INTEGER"),  # Judge0 status id
+    ("exec_time", "REAL"),  # CPU seconds
+    ("exec_wall_time", "REAL"),  # Wall-clock seconds
+    ("exec_memory", "INTEGER")  # Peak KB
+]
+
+def add_history_execution_columns(cursor, existing_columns):
+    """ALTER code_history to add any execution columns missing from existing_columns"""
+    existing = {name.lower() for name in existing_columns}
+    for name, column_type in HISTORY_EXECUTION_COLUMNS:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE code_history ADD COLUMN {name} {column_type} NULL")
+
 def get_db_connection():
     """Get database connection based on DB_TYPE"""
     try:
@@ -100,6 +116,12 @@ def init_mysql_database():
             )
         ''')
         
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'code_history'",
+            (db_name,)
+        )
+        add_history_execution_columns(cursor, [row[0] for row in cursor.fetchall()])
+        
         # Create shared_codes table (separate from history for better organization)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS shared_codes (
@@ -135,12 +157,43 @@ def init_mysql_database():
             )
         ''')
         
+        # Create ai_cache table (persistent tier of the Gemini response cache)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                cache_key CHAR(64) PRIMARY KEY,
+                feature VARCHAR(50) NOT NULL,
+                response MEDIUMTEXT NOT NULL,
+                expires_at DOUBLE NOT NULL,
+                last_used_at DOUBLE NOT NULL,
+                INDEX idx_ai_cache_last_used (last_used_at)
+            )
+        ''')
+        
+        # Create ai_precompute_tasks table (background AI runs for saved/shared code)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_precompute_tasks (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                task_key CHAR(64) UNIQUE NOT NULL,
+                feature VARCHAR(50) NOT NULL,
+                language VARCHAR(50) NOT NULL,
+                code_snippet MEDIUMTEXT NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                attempts INT DEFAULT 0,
+                error TEXT NULL,
+                available_at DOUBLE NOT NULL,
+                updated_at DOUBLE NOT NULL,
+                INDEX idx_ai_precompute_status (status, available_at)
+            )
+        ''')
+        
         conn.commit()
         print(f"✅ MySQL database '{db_name}' initialized successfully!")
         print(f"   - users table created")
         print(f"   - code_history table created")
         print(f"   - shared_codes table created")
         print(f"   - projects table created")
+        print(f"   - ai_cache table created")
+        print(f"   - ai_precompute_tasks table created")
         cursor.close()
         conn.close()
         return True
@@ -193,6 +246,8 @@ def init_postgresql_database():
             )
         ''')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_created ON code_history(user_id, created_at)')
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'code_history'")
+        add_history_execution_columns(cursor, [row[0] for row in cursor.fetchall()])
         
         # Create shared_codes table
         cursor.execute('''
@@ -225,6 +280,35 @@ def init_postgresql_database():
         ''')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_projects ON projects(user_id, updated_at)')
         
+        # Create ai_cache table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                cache_key CHAR(64) PRIMARY KEY,
+                feature VARCHAR(50) NOT NULL,
+                response TEXT NOT NULL,
+                expires_at DOUBLE PRECISION NOT NULL,
+                last_used_at DOUBLE PRECISION NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache(last_used_at)')
+        
+        # Create ai_precompute_tasks table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_precompute_tasks (
+                id SERIAL PRIMARY KEY,
+                task_key CHAR(64) UNIQUE NOT NULL,
+                feature VARCHAR(50) NOT NULL,
+                language VARCHAR(50) NOT NULL,
+                code_snippet TEXT NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                available_at DOUBLE PRECISION NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_precompute_status ON ai_precompute_tasks(status, available_at)')
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -233,6 +317,8 @@ def init_postgresql_database():
         print("   - code_history table created")
         print("   - shared_codes table created")
         print("   - projects table created")
+        print("   - ai_cache table created")
+        print("   - ai_precompute_tasks table created")
         return True
         
     except Exception as e:
@@ -284,6 +370,8 @@ def init_db():
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
             )
         ''')
+        cursor.execute('PRAGMA table_info(code_history)')
+        add_history_execution_columns(cursor, [row[1] for row in cursor.fetchall()])
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS shared_codes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -309,6 +397,31 @@ def init_db():
                 FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                cache_key CHAR(64) PRIMARY KEY,
+                feature VARCHAR(50) NOT NULL,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache(last_used_at)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_precompute_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_key CHAR(64) UNIQUE NOT NULL,
+                feature VARCHAR(50) NOT NULL,
+                language VARCHAR(50) NOT NULL,
+                code_snippet TEXT NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                available_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ai_precompute_status ON ai_precompute_tasks(status, available_at)')
         conn.commit()
         conn.close()
         print("✅ SQLite database initialized successfully!")
@@ -389,7 +502,7 @@ def fetch_one(query, params=None):
         conn.close()
         raise
 
-def add_to_history(user_id, activity_type, code_snippet, language, title, output=None):
+def add_to_history(user_id, activity_type, code_snippet, language, title, output=None, result=None):
     """
     Add an activity to user's history
     
@@ -400,12 +513,15 @@ def add_to_history(user_id, activity_type, code_snippet, language, title, output
         language: Programming language
         title: Short description/title generated from code
         output: Result/output of the operation
+        result: ExecutionResult of a run (stores status, CPU/wall time and memory)
     """
     query = '''
-        INSERT INTO code_history (user_id, activity_type, code_snippet, language, title, output)
-        VALUES (?, ?, ?, ?, ?, ?)
+        INSERT INTO code_history (user_id, activity_type, code_snippet, language, title, output,
+                                  exec_status_id, exec_time, exec_wall_time, exec_memory)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     '''
-    return execute_query(query, (user_id, activity_type, code_snippet, language, title, output))
+    execution = (result.status_id, result.time, result.wall_time, result.memory) if result else (None, None, None, None)
+    return execute_query(query, (user_id, activity_type, code_snippet, language, title, output) + execution)
 
 def get_user_history(user_id, limit=50):
     """
@@ -419,7 +535,8 @@ def get_user_history(user_id, limit=50):
         List of history records
     """
     query = '''
-        SELECT id, activity_type, code_snippet, language, title, output, created_at
+        SELECT id, activity_type, code_snippet, language, title, output, created_at,
+               exec_status_id, exec_time, exec_wall_time, exec_memory
         FROM code_history
         WHERE user_id = ?
         ORDER BY created_at DESC
@@ -430,12 +547,178 @@ def get_user_history(user_id, limit=50):
 def get_history_by_id(history_id, user_id):
     """Get a specific history item (with user verification)"""
     query = '''
-        SELECT id, activity_type, code_snippet, language, title, output, created_at
+        SELECT id, activity_type, code_snippet, language, title, output, created_at,
+               exec_status_id, exec_time, exec_wall_time, exec_memory
         FROM code_history
         WHERE id = ? AND user_id = ?
     '''
     return fetch_one(query, (history_id, user_id))
 
+def get_runtime_stats(user_id=None):
+    """
+    Aggregate stored run results per language (all users, or one user)
+    
+    Returns:
+        List of tuples: (language, runs, accepted, time_limit, runtime_errors,
+        compile_errors, avg_time, max_time, avg_memory, max_memory)
+    """
+    query = '''
+        SELECT language,
+               COUNT(*),
+               SUM(CASE WHEN exec_status_id = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN exec_status_id = 5 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN exec_status_id BETWEEN 7 AND 12 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN exec_status_id = 6 THEN 1 ELSE 0 END),
+               AVG(exec_time), MAX(exec_time), AVG(exec_memory), MAX(exec_memory)
+        FROM code_history
+        WHERE exec_status_id IS NOT NULL
+    '''
+    params = ()
+    if user_id is not None:
+        query += ' AND user_id = ?'
+        params = (user_id,)
+    query += ' GROUP BY language ORDER BY COUNT(*) DESC'
+    return execute_query(query, params, fetch=True)
+
+def get_ai_cache_entry(cache_key, now):
+    """
+    Get a cached AI response and mark it as recently used
+    
+    Returns:
+        The stored JSON text, or None when missing or expired
+    """
+    row = fetch_one('SELECT response, expires_at FROM ai_cache WHERE cache_key = ?', (cache_key,))
+    if not row:
+        return None
+    if row[1] < now:
+        execute_query('DELETE FROM ai_cache WHERE cache_key = ?', (cache_key,))
+        return None
+    execute_query('UPDATE ai_cache SET last_used_at = ? WHERE cache_key = ?', (now, cache_key))
+    return row[0]
+
+def set_ai_cache_entry(cache_key, feature, response, expires_at, now):
+    """Insert or replace a cached AI response (response is JSON text)"""
+    if DB_TYPE == 'mysql':
+        query = '''
+            INSERT INTO ai_cache (cache_key, feature, response, expires_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON DUPLICATE KEY UPDATE feature = VALUES(feature), response = VALUES(response),
+                                    expires_at = VALUES(expires_at), last_used_at = VALUES(last_used_at)
+        '''
+    elif DB_TYPE == 'postgresql':
+        query = '''
+            INSERT INTO ai_cache (cache_key, feature, response, expires_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (cache_key) DO UPDATE SET feature = EXCLUDED.feature, response = EXCLUDED.response,
+                                                  expires_at = EXCLUDED.expires_at, last_used_at = EXCLUDED.last_used_at
+        '''
+    else:
+        query = '''
+            INSERT OR REPLACE INTO ai_cache (cache_key, feature, response, expires_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+        '''
+    return execute_query(query, (cache_key, feature, response, expires_at, now))
+
+def prune_ai_cache(max_entries, now):
+    """
+    Drop expired AI cache entries, then the least recently used ones beyond max_entries
+    
+    Returns:
+        Number of entries left
+    """
+    execute_query('DELETE FROM ai_cache WHERE expires_at < ?', (now,))
+    count = fetch_one('SELECT COUNT(*) FROM ai_cache')[0]
+    excess = count - max_entries
+    if excess > 0:
+        if DB_TYPE == 'mysql':
+            execute_query('DELETE FROM ai_cache ORDER BY last_used_at ASC LIMIT ?', (excess,))
+        else:
+            execute_query('''
+                DELETE FROM ai_cache WHERE cache_key IN (
+                    SELECT cache_key FROM ai_cache ORDER BY last_used_at ASC LIMIT ?
+                )
+            ''', (excess,))
+        count = max_entries
+    return count
+
+def _execute_rowcount(query, params):
+    """Run a write statement and return how many rows it changed"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if DB_TYPE in ['mysql', 'postgresql']:
+            query = query.replace('?', '%s')
+        cursor.execute(query, params)
+        changed = cursor.rowcount
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return changed
+
+def enqueue_ai_task(task_key, feature, language, code_snippet, now):
+    """
+    Queue a background AI run unless the same task is already queued or running
+    (a finished one is queued again, with the latest code). Both steps are
+    single conditional statements, so concurrent saves of the same code
+    queue it once.
+    
+    Returns:
+        True if the task was queued
+    """
+    columns = "(task_key, feature, language, code_snippet, status, attempts, available_at, updated_at)"
+    values = "VALUES (?, ?, ?, ?, 'queued', 0, ?, ?)"
+    if DB_TYPE == 'mysql':
+        insert = f"INSERT IGNORE INTO ai_precompute_tasks {columns} {values}"
+    elif DB_TYPE == 'postgresql':
+        insert = f"INSERT INTO ai_precompute_tasks {columns} {values} ON CONFLICT (task_key) DO NOTHING"
+    else:
+        insert = f"INSERT OR IGNORE INTO ai_precompute_tasks {columns} {values}"
+    if _execute_rowcount(insert, (task_key, feature, language, code_snippet, now, now)) == 1:
+        return True
+    return _execute_rowcount('''
+        UPDATE ai_precompute_tasks SET status = 'queued', feature = ?, language = ?, code_snippet = ?, attempts = 0,
+            error = NULL, available_at = ?, updated_at = ?
+        WHERE task_key = ? AND status IN ('done', 'failed')
+    ''', (feature, language, code_snippet, now, now, task_key)) == 1
+
+def claim_ai_task(now, lease):
+    """
+    Take the oldest due task: queued and available, or running for longer
+    than lease seconds (its worker died). The status change is conditional,
+    so two workers never take the same task.
+    
+    Returns:
+        (id, feature, language, code_snippet, attempts) or None
+    """
+    due = "(status = 'queued' AND available_at <= ?) OR (status = 'running' AND updated_at < ?)"
+    row = fetch_one(f'SELECT id FROM ai_precompute_tasks WHERE {due} ORDER BY available_at ASC LIMIT 1',
+                    (now, now - lease))
+    if not row:
+        return None
+    query = f"UPDATE ai_precompute_tasks SET status = 'running', updated_at = ? WHERE id = ? AND ({due})"
+    if _execute_rowcount(query, (now, row[0], now, now - lease)) != 1:
+        return None  # Another worker got it first
+    return fetch_one('SELECT id, feature, language, code_snippet, attempts FROM ai_precompute_tasks WHERE id = ?',
+                     (row[0],))
+
+def finish_ai_task(task_id, status, attempts, now, available_at=None, error=None):
+    """Record a task's outcome: 'done', 'failed', or 'queued' again to retry at available_at"""
+    return execute_query('''
+        UPDATE ai_precompute_tasks SET status = ?, attempts = ?, error = ?, available_at = ?, updated_at = ?
+        WHERE id = ?
+    ''', (status, attempts, error, available_at or now, now, task_id))
+
+def prune_ai_tasks(before):
+    """Drop finished tasks last updated before the given time"""
+    return execute_query("DELETE FROM ai_precompute_tasks WHERE status IN ('done', 'failed') AND updated_at < ?",
+                         (before,))
+
+def count_ai_tasks():
+    """Number of background AI tasks per status, e.g. {'queued': 3, 'done': 10}"""
+    rows = execute_query('SELECT status, COUNT(*) FROM ai_precompute_tasks GROUP BY status', fetch=True)
+    return {status: count for status, count in rows or []}
+
 def delete_history_item(history_id, user_id):
     """Delete a history item (with user verification)"""
     query = 'DELETE FROM code_history WHERE id = ? AND user_id = ?'
@@ -0,0 +1,162 @@
+# execution_benchmark.py - Repeated-run timing statistics for /api/benchmark
+import os
+import random
+import string
+import statistics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Benchmark limits (runs x inputs is submitted per variant)
+BENCHMARK_MAX_RUNS = int(os.getenv('BENCHMARK_MAX_RUNS', 20))
+BENCHMARK_MAX_INPUTS = int(os.getenv('BENCHMARK_MAX_INPUTS', 5))
+BENCHMARK_MAX_GENERATED_SIZE = 100000  # Values per generated input
+BENCHMARK_MIN_EFFECT = 0.05  # Changes under 5% are never called a win or a loss
+
+# Metrics read from a finished Judge0-shaped submission: name -> (field, unit)
+METRICS = {
+    "cpu_time": ("time", "s"),
+    "wall_time": ("wall_time", "s"),
+    "memory": ("memory", "KB")
+}
+
+
+def generate_inputs(spec):
+    """
+    Build stdin strings from a generator spec, e.g.
+    {"kind": "integers", "sizes": [100, 1000], "min": 0, "max": 10**6, "seed": 1}
+    gives "100\\n<100 ints>\\n" and "1000\\n<1000 ints>\\n".
+    Kinds: integers (count line + values line), string (one random lowercase line).
+    The seed makes original and optimized code see identical inputs.
+    """
+    kind = spec.get("kind", "integers")
+    sizes = spec.get("sizes") or [spec.get("size", 100)]
+    rng = random.Random(spec.get("seed", 42))
+    low, high = int(spec.get("min", 0)), int(spec.get("max", 1000))
+    if low > high:
+        raise ValueError("Generator min is greater than max")
+
+    inputs = []
+    for size in sizes[:BENCHMARK_MAX_INPUTS]:
+        size = int(size)
+        if not 0 < size <= BENCHMARK_MAX_GENERATED_SIZE:
+            raise ValueError(f"Generated input size must be between 1 and {BENCHMARK_MAX_GENERATED_SIZE}")
+        if kind == "integers":
+            values = " ".join(str(rng.randint(low, high)) for _ in range(size))
+            inputs.append(f"{size}\n{values}\n")
+        elif kind == "string":
+            inputs.append("".join(rng.choice(string.ascii_lowercase) for _ in range(size)) + "\n")
+        else:
+            raise ValueError(f"Unknown generator kind: {kind}")
+    return inputs
+
+
+def _metric(result, field):
+    try:
+        value = result.get(field)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def describe(samples):
+    """min/median/p95/mean/stdev and coefficient of variation for a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    mean = statistics.fmean(ordered)
+    stdev = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    return {
+        "min": round(ordered[0], 4),
+        "median": round(statistics.median(ordered), 4),
+        "p95": round(_percentile(ordered, 0.95), 4),
+        "mean": round(mean, 4),
+        "stdev": round(stdev, 4),
+        "cv": round(stdev / mean, 4) if mean else 0.0,
+        "samples": len(ordered)
+    }
+
+
+def summarize(results):
+    """
+    Statistics over the finished submissions of one variant. Only Accepted
+    runs count towards timings; the rest are reported as failures.
+    """
+    accepted = [r for r in results if (r.get("status") or {}).get("description") == "Accepted"]
+    failures = [r for r in results if r not in accepted]
+    summary = {
+        "runs": len(results),
+        "accepted": len(accepted),
+        "failed": len(failures)
+    }
+    for name, (field, unit) in METRICS.items():
+        stats = describe([v for v in (_metric(r, field) for r in accepted) if v is not None])
+        summary[name] = dict(stats, unit=unit) if stats else None
+    if failures:
+        first = failures[0]
+        summary["first_failure"] = {
+            "status": (first.get("status") or {}).get("description"),
+            "stderr": first.get("stderr"),
+            "compile_output": first.get("compile_output")
+        }
+    return summary
+
+
+def compare(original, optimized, metric="cpu_time"):
+    """
+    Verdict on optimized vs original medians for one metric. A change only
+    counts when it is larger than both BENCHMARK_MIN_EFFECT and the noisier
+    variant's coefficient of variation; otherwise it's within noise.
+    """
+    before, after = original.get(metric), optimized.get(metric)
+    if not before or not after:
+        return {"metric": metric, "verdict": "inconclusive", "reason": "not enough successful runs"}
+    if before["median"] <= 0 or after["median"] <= 0:
+        return {"metric": metric, "verdict": "inconclusive", "reason": "runs too short to time"}
+
+    change = (after["median"] - before["median"]) / before["median"]
+    noise = max(before["cv"], after["cv"], BENCHMARK_MIN_EFFECT)
+    if change <= -noise:
+        verdict = "faster" if metric != "memory" else "smaller"
+    elif change >= noise:
+        verdict = "slower" if metric != "memory" else "larger"
+    else:
+        verdict = "no significant difference"
+    return {
+        "metric": metric,
+        "verdict": verdict,
+        "change_percent": round(change * 100, 1),
+        "ratio": round(before["median"] / after["median"], 2),  # >1 means optimized uses less
+        "noise_percent": round(noise * 100, 1)
+    }
+
+
+def combine(comparisons):
+    """
+    Overall verdict from per-input comparisons of one metric. Inputs of
+    different sizes can't be pooled (their spread would swamp any change),
+    so each input is judged on its own and the ratios are averaged
+    geometrically.
+    """
+    decided = [c for c in comparisons if c["verdict"] != "inconclusive"]
+    if not decided:
+        return {"metric": comparisons[0]["metric"] if comparisons else None, "verdict": "inconclusive"}
+
+    significant = {c["verdict"] for c in decided if c["verdict"] != "no significant difference"}
+    if not significant:
+        verdict = "no significant difference"
+    elif len(significant) == 1:
+        verdict = significant.pop()
+    else:
+        verdict = "mixed"
+    ratio = statistics.geometric_mean([c["ratio"] for c in decided if c["ratio"] > 0])
+    return {
+        "metric": decided[0]["metric"],
+        "verdict": verdict,
+        "ratio": round(ratio, 2),
+        "inputs_judged": len(decided)
+    }
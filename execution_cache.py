@@ -0,0 +1,257 @@
+# execution_cache.py - Content-addressed cache for code execution results
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration
+EXEC_CACHE_ENABLED = os.getenv('EXEC_CACHE_ENABLED', 'True').lower() == 'true'
+EXEC_CACHE_SIZE = int(os.getenv('EXEC_CACHE_SIZE', 512))  # In-process LRU entries
+EXEC_CACHE_TTL = int(os.getenv('EXEC_CACHE_TTL', 3600))  # Seconds
+EXEC_CACHE_BACKEND = os.getenv('EXEC_CACHE_BACKEND', 'memory').lower()  # memory/sqlite/redis
+EXEC_CACHE_PATH = os.getenv('EXEC_CACHE_PATH', 'exec_cache.db')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+
+def normalize_source(code):
+    """
+    Normalize source so cosmetic edits map to the same key.
+    Only line endings and trailing whitespace are touched - leading
+    indentation is significant in Python and must be preserved.
+    """
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip('\n')
+
+
+def make_cache_key(kind, code, language_id, stdin="", limits=None):
+    """
+    Build a content-addressed key from (kind, normalized source, language, stdin, limits).
+    `kind` separates cached value shapes: 'result' entries (the only kind in use)
+    hold an ExecutionResult.to_dict() shared by /run, /compile and async jobs.
+    """
+    material = json.dumps({
+        "kind": kind,
+        "source": normalize_source(code or ""),
+        "language_id": int(language_id),
+        "stdin": stdin or "",
+        "limits": limits or {}
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe bounded LRU with per-entry expiry"""
+
+    def __init__(self, max_size=EXEC_CACHE_SIZE, ttl=EXEC_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    """Shared cache tier backed by a SQLite file (shared by all workers on one host)"""
+
+    def __init__(self, path=EXEC_CACHE_PATH):
+        self.path = path
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS exec_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value, expires_at FROM exec_cache WHERE cache_key = ?', (key,)).fetchone()
+            if not row:
+                return None
+            if row[1] < time.time():
+                conn.execute('DELETE FROM exec_cache WHERE cache_key = ?', (key,))
+                conn.commit()
+                return None
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT OR REPLACE INTO exec_cache (cache_key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(value), time.time() + ttl))
+            conn.execute('DELETE FROM exec_cache WHERE expires_at < ?', (time.time(),))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class RedisTier:
+    """Shared cache tier backed by Redis (shared across hosts)"""
+
+    def __init__(self, url=REDIS_URL):
+        import redis  # Optional dependency - only needed for EXEC_CACHE_BACKEND=redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(f"exec_cache:{key}")
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(f"exec_cache:{key}", int(ttl), json.dumps(value))
+
+
+class ExecutionCache:
+    """
+    Two-tier execution result cache: a bounded in-process LRU in front of an
+    optional shared tier (SQLite or Redis). Shared tier failures are logged and
+    treated as misses so execution never breaks because of the cache.
+    """
+
+    def __init__(self, enabled=EXEC_CACHE_ENABLED, backend=EXEC_CACHE_BACKEND,
+                 max_size=EXEC_CACHE_SIZE, ttl=EXEC_CACHE_TTL):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.shared = None
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+        if enabled and backend in ('sqlite', 'redis'):
+            try:
+                self.shared = SQLiteTier() if backend == 'sqlite' else RedisTier()
+                print(f"✅ Execution cache shared tier enabled: {backend}")
+            except Exception as e:
+                print(f"⚠️ Execution cache shared tier unavailable ({backend}): {e}")
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        """Look up a result; returns None on miss"""
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.shared:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"⚠️ Execution cache read error: {e}")
+                self._count("errors")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("shared_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        """Store a successful result in both tiers"""
+        if not self.enabled:
+            return
+        self.memory.set(key, value)
+        if self.shared:
+            try:
+                self.shared.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"⚠️ Execution cache write error: {e}")
+                self._count("errors")
+        self._count("stores")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters["memory_hits"] + counters["shared_hits"]
+        lookups = hits + counters["misses"]
+        counters.update({
+            "enabled": self.enabled,
+            "backend": type(self.shared).__name__ if self.shared else "memory",
+            "entries": len(self.memory),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        })
+        return counters
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight work: the first caller for a key runs the
+    function, concurrent callers with the same key wait on its shared future.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["leaders"] += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "submissions": self._counters["leaders"],
+                "submissions_saved": self._counters["coalesced"]
+            }
@@ -0,0 +1,147 @@
+# execution_jobs.py - Background job manager for asynchronous code execution
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Job configuration
+EXEC_JOB_WORKERS = int(os.getenv('EXEC_JOB_WORKERS', 8))  # Background poller threads
+EXEC_JOB_MAX_PENDING = int(os.getenv('EXEC_JOB_MAX_PENDING', 200))  # Reject new jobs beyond this
+EXEC_JOB_TTL = int(os.getenv('EXEC_JOB_TTL', 600))  # Seconds a finished job stays queryable
+
+# Job lifecycle: queued -> compiling (compiled languages) -> running -> done | failed
+JOB_FINAL_STATUSES = ("done", "failed")
+
+
+class Job:
+    """State of one execution job; every change bumps `version` so waiters can detect it"""
+
+    def __init__(self, user_id=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = "queued"
+        self.detail = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+
+    @property
+    def finished(self):
+        return self.status in JOB_FINAL_STATUSES
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "detail": self.detail,
+            "result": self.result,
+            "error": self.error,
+            "version": self.version,
+            "elapsed": round(self.updated_at - self.created_at, 3)
+        }
+
+
+class JobManager:
+    """
+    Runs execution jobs on a bounded background pool so web workers return
+    immediately. Clients follow a job by long-polling (wait_for_change) or
+    by Server-Sent Events (events).
+
+    Jobs live in the memory of the worker process that created them; when
+    running several gunicorn workers, route a client's job requests to the
+    same worker (sticky sessions) or run a single worker with threads.
+    """
+
+    def __init__(self, workers=EXEC_JOB_WORKERS, max_pending=EXEC_JOB_MAX_PENDING, ttl=EXEC_JOB_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exec-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def submit(self, fn, user_id=None):
+        """
+        Queue fn(job) -> result dict to run in the background.
+        Returns the new Job, or None if too many jobs are already pending.
+        """
+        with self._lock:
+            self._expire_locked()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                return None
+            job = Job(user_id=user_id)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        try:
+            result = fn(job)
+            self.update(job, "done", result=result)
+        except Exception as e:
+            print(f"❌ Execution job {job.id} failed: {e}")
+            self.update(job, "failed", error=str(e))
+
+    def update(self, job, status, detail=None, result=None, error=None):
+        """Move a job to a new status and wake everyone waiting on it"""
+        with self._changed:
+            if job.finished:
+                return
+            job.status = status
+            job.detail = detail
+            if result is not None:
+                job.result = result
+            if error is not None:
+                job.error = error
+            job.updated_at = time.time()
+            job.version += 1
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait_for_change(self, job, since_version, timeout):
+        """Block until the job's version passes since_version (or timeout); returns its state"""
+        deadline = time.time() + timeout
+        with self._changed:
+            while job.version <= since_version and not job.finished:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return job.to_dict()
+
+    def events(self, job, heartbeat=15):
+        """Yield Server-Sent Events for each status transition until the job finishes"""
+        version = -1
+        while True:
+            state = self.wait_for_change(job, version, heartbeat)
+            if state["version"] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = state["version"]
+            yield f"event: status\ndata: {json.dumps(state)}\n\n"
+            if state["status"] in JOB_FINAL_STATUSES:
+                return
+
+    def _expire_locked(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"jobs": len(self._jobs), "by_status": counts}
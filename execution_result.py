@@ -0,0 +1,132 @@
+# execution_result.py - Typed result of one code execution (shared by /run, /compile and history)
+from urllib.parse import urlparse
+
+# Judge0 status ids grouped into the outcomes callers branch on
+STATUS_KINDS = {
+    1: "pending", 2: "pending",
+    3: "accepted",
+    4: "wrong_answer",
+    5: "time_limit",
+    6: "compile_error",
+    7: "runtime_error", 8: "runtime_error", 9: "runtime_error",
+    10: "runtime_error", 11: "runtime_error", 12: "runtime_error",
+    13: "internal_error", 14: "internal_error"
+}
+
+
+def _seconds(value):
+    """Judge0 reports times as strings ("0.012"); None when missing or malformed"""
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ExecutionResult:
+    """
+    One finished execution with its resource usage.
+
+    time and wall_time are seconds, memory is peak KB, endpoint is the host
+    that ran it ("local" for the local executor) and latency is the full
+    round trip seen by this server. queue_latency is the part of the round
+    trip not spent executing (queueing, compilation, network).
+    """
+
+    def __init__(self, status_id=None, status=None, stdout=None, stderr=None, compile_output=None,
+                 message=None, time=None, wall_time=None, memory=None, exit_code=None,
+                 endpoint=None, latency=None, cached=False, compile_cache=None):
+        self.status_id = status_id
+        self.status = status
+        self.stdout = stdout
+        self.stderr = stderr
+        self.compile_output = compile_output
+        self.message = message
+        self.time = time
+        self.wall_time = wall_time
+        self.memory = memory
+        self.exit_code = exit_code
+        self.endpoint = endpoint
+        self.latency = latency
+        self.cached = cached
+        self.compile_cache = compile_cache
+
+    @classmethod
+    def from_judge0(cls, result, endpoint=None, latency=None):
+        """Build from a finished Judge0-shaped submission dict"""
+        status = result.get("status") or {}
+        if endpoint and endpoint != "local":
+            endpoint = urlparse(endpoint).netloc or endpoint
+        return cls(
+            status_id=status.get("id"),
+            status=status.get("description"),
+            stdout=result.get("stdout"),
+            stderr=result.get("stderr"),
+            compile_output=result.get("compile_output"),
+            message=result.get("message"),
+            time=_seconds(result.get("time")),
+            wall_time=_seconds(result.get("wall_time")),
+            memory=result.get("memory"),
+            exit_code=result.get("exit_code"),
+            endpoint=endpoint,
+            latency=round(latency, 3) if latency is not None else None
+        )
+
+    @classmethod
+    def from_dict(cls, data, cached=False):
+        """Rebuild from to_dict() output (e.g. an execution cache entry)"""
+        fields = {name: data.get(name) for name in (
+            "status_id", "status", "stdout", "stderr", "compile_output", "message", "time",
+            "wall_time", "memory", "exit_code", "endpoint", "latency", "compile_cache"
+        )}
+        return cls(cached=cached, **fields)
+
+    @property
+    def kind(self):
+        """accepted, wrong_answer, time_limit, compile_error, runtime_error, internal_error or pending"""
+        return STATUS_KINDS.get(self.status_id, "internal_error" if self.status_id else "pending")
+
+    @property
+    def queue_latency(self):
+        if self.latency is None:
+            return None
+        return round(max(self.latency - (self.wall_time or self.time or 0), 0), 3)
+
+    @property
+    def is_cacheable(self):
+        """Time limits depend on load, so those results are never cached"""
+        return self.kind != "time_limit"
+
+    def display_output(self):
+        """Flatten into the /run display string"""
+        output = ""
+        if self.stdout:
+            output += self.stdout
+        if self.stderr:
+            output += "\n[stderr]:\n" + self.stderr
+        if self.compile_output:
+            output += "\n[compile_output]:\n" + self.compile_output
+        if not output and self.status and self.status != "Accepted":
+            return f"⚠️ {self.status}"
+        return output or "⚠️ No output"
+
+    def to_dict(self):
+        data = {
+            "status": self.status,
+            "status_id": self.status_id,
+            "kind": self.kind,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "compile_output": self.compile_output,
+            "message": self.message,
+            "time": self.time,
+            "wall_time": self.wall_time,
+            "memory": self.memory,
+            "exit_code": self.exit_code,
+            "endpoint": self.endpoint,
+            "latency": self.latency,
+            "queue_latency": self.queue_latency,
+            "cached": self.cached
+        }
+        if self.compile_cache is not None:
+            data["compile_cache"] = self.compile_cache
+        return data
@@ -0,0 +1,240 @@
+# execution_scheduler.py - Admission control and fair queuing for code execution
+import os
+import math
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Scheduler configuration
+EXEC_SCHED_ENABLED = os.getenv('EXEC_SCHED_ENABLED', 'True').lower() == 'true'
+EXEC_USER_MAX_INFLIGHT = int(os.getenv('EXEC_USER_MAX_INFLIGHT', 2))  # Running executions per user
+EXEC_USER_MAX_QUEUED = int(os.getenv('EXEC_USER_MAX_QUEUED', 4))  # Waiting executions per user
+EXEC_SCHED_MAX_QUEUE = int(os.getenv('EXEC_SCHED_MAX_QUEUE', 64))  # Waiting executions per backend
+EXEC_SCHED_MAX_WAIT = float(os.getenv('EXEC_SCHED_MAX_WAIT', 15))  # Seconds before a queued run gives up
+EXEC_SCHED_AUTH_WEIGHT = float(os.getenv('EXEC_SCHED_AUTH_WEIGHT', 2))  # Fair share of logged-in vs anonymous users
+# Concurrent executions per backend, e.g. "judge0=16,local=4"
+EXEC_BACKEND_LIMITS = os.getenv('EXEC_BACKEND_LIMITS', 'judge0=16,local=4')
+
+DEFAULT_BACKEND_LIMIT = 8
+WAIT_SAMPLES = 512  # Recent queue waits kept for the p50/p95 gauges
+
+
+def parse_limits(spec=EXEC_BACKEND_LIMITS):
+    """Parse "judge0=16,local=4" into {"judge0": 16, "local": 4}, skipping malformed entries"""
+    limits = {}
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        try:
+            limits[name.strip()] = int(value)
+        except ValueError:
+            continue
+    return limits
+
+
+class SchedulerRejected(Exception):
+    """Execution shed by admission control; retry_after is a whole number of seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user_key", "tag", "enqueued_at")
+
+    def __init__(self, user_key, tag):
+        self.user_key = user_key
+        self.tag = tag
+        self.enqueued_at = time.time()
+
+
+class _Lane:
+    """Queue, budget and gauges of one backend"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = []
+        self.virtual_time = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.service_time = None  # EWMA seconds per execution
+        self.counters = {"admitted": 0, "waited": 0, "rejected": 0, "timed_out": 0}
+        self.max_queue_depth = 0
+
+
+class Ticket:
+    """
+    One execution's claim on a backend slot. Nothing happens until the
+    ticket is entered, so callers can create it up front and only enter it
+    when a run actually reaches the backend (cache hits never queue).
+    """
+
+    def __init__(self, scheduler, user_key, backend, weight):
+        self.scheduler = scheduler
+        self.user_key = user_key
+        self.backend = backend
+        self.weight = weight
+        self._started_at = None
+
+    def __enter__(self):
+        self.scheduler._acquire(self)
+        self._started_at = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler._release(self, time.time() - self._started_at)
+        return False
+
+
+class ExecutionScheduler:
+    """
+    Admission control in front of the execution backends.
+
+    Each backend has a global concurrency budget; each user (or anonymous
+    client IP) may have EXEC_USER_MAX_INFLIGHT runs executing and
+    EXEC_USER_MAX_QUEUED waiting. Waiting runs are released in weighted fair
+    order (start-time fair queuing): a user's next run is tagged one
+    1/weight step after their previous one, so a user with many queued runs
+    cannot starve someone who just clicked Run once. Anything over the limits,
+    or still queued after EXEC_SCHED_MAX_WAIT, is rejected with a Retry-After
+    estimate instead of tying up a web worker.
+
+    State is per process: with several gunicorn workers each one enforces
+    its own budget, so size EXEC_BACKEND_LIMITS per worker.
+    """
+
+    def __init__(self, enabled=EXEC_SCHED_ENABLED, limits=None, user_max_inflight=EXEC_USER_MAX_INFLIGHT,
+                 user_max_queued=EXEC_USER_MAX_QUEUED, max_queue=EXEC_SCHED_MAX_QUEUE,
+                 max_wait=EXEC_SCHED_MAX_WAIT):
+        self.enabled = enabled
+        self.limits = parse_limits() if limits is None else limits
+        self.user_max_inflight = user_max_inflight
+        self.user_max_queued = user_max_queued
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lanes = {}
+        self._users = {}  # user_key -> {"in_flight", "queued", "last_tags"}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def ticket(self, user_key, backend="judge0", weight=1.0):
+        return Ticket(self, user_key, backend, max(weight, 0.01))
+
+    def _lane(self, backend):
+        lane = self._lanes.get(backend)
+        if lane is None:
+            lane = self._lanes[backend] = _Lane(self.limits.get(backend, DEFAULT_BACKEND_LIMIT))
+        return lane
+
+    def _user(self, user_key):
+        user = self._users.get(user_key)
+        if user is None:
+            user = self._users[user_key] = {"in_flight": 0, "queued": 0, "last_tags": {}}
+        return user
+
+    def _retry_after_locked(self, lane, ahead):
+        """Seconds until roughly `ahead` queued runs have drained through the lane's budget"""
+        service = lane.service_time or 1.0
+        return max(1, math.ceil((ahead / max(lane.limit, 1) + 1) * service))
+
+    def _reject_locked(self, lane, reason, ahead, counter="rejected"):
+        lane.counters[counter] += 1
+        raise SchedulerRejected(reason, self._retry_after_locked(lane, ahead))
+
+    def _acquire(self, ticket):
+        if not self.enabled:
+            return
+        with self._changed:
+            lane = self._lane(ticket.backend)
+            user = self._user(ticket.user_key)
+
+            if user["queued"] >= self.user_max_queued:
+                self._forget_idle_locked(ticket.user_key)
+                self._reject_locked(lane, "Too many executions queued for this user",
+                                    user["queued"] + user["in_flight"])
+            if len(lane.waiting) >= self.max_queue:
+                self._forget_idle_locked(ticket.user_key)
+                self._reject_locked(lane, f"{ticket.backend} execution queue is full", len(lane.waiting))
+
+            # Start-time fair queuing: never tag behind the lane's clock, and
+            # space one user's runs 1/weight apart
+            tag = max(lane.virtual_time, user["last_tags"].get(ticket.backend, 0.0)) + 1.0 / ticket.weight
+            user["last_tags"][ticket.backend] = tag
+            waiter = _Waiter(ticket.user_key, tag)
+            lane.waiting.append(waiter)
+            user["queued"] += 1
+            lane.max_queue_depth = max(lane.max_queue_depth, len(lane.waiting))
+
+            deadline = waiter.enqueued_at + self.max_wait
+            while not self._is_next_locked(lane, waiter):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    lane.waiting.remove(waiter)
+                    user["queued"] -= 1
+                    self._forget_idle_locked(ticket.user_key)
+                    self._changed.notify_all()  # Someone behind may be eligible now
+                    self._reject_locked(lane, "Timed out waiting for an execution slot", len(lane.waiting),
+                                        counter="timed_out")
+                self._changed.wait(remaining)
+
+            user["queued"] -= 1
+            lane.waiting.remove(waiter)
+            lane.virtual_time = max(lane.virtual_time, waiter.tag)
+            lane.in_flight += 1
+            user["in_flight"] += 1
+            lane.counters["admitted"] += 1
+            wait = time.time() - waiter.enqueued_at
+            if wait > 0.001:
+                lane.counters["waited"] += 1
+            lane.waits.append(wait)
+
+    def _forget_idle_locked(self, user_key):
+        user = self._users.get(user_key)
+        if user and user["in_flight"] == 0 and user["queued"] == 0:
+            del self._users[user_key]
+
+    def _is_next_locked(self, lane, waiter):
+        """True if a slot is free and waiter has the lowest tag among users under their cap"""
+        if lane.in_flight >= lane.limit:
+            return False
+        if self._users[waiter.user_key]["in_flight"] >= self.user_max_inflight:
+            return False
+        for other in lane.waiting:
+            # Ties go to whoever queued first
+            if ((other.tag, other.enqueued_at) < (waiter.tag, waiter.enqueued_at)
+                    and self._users[other.user_key]["in_flight"] < self.user_max_inflight):
+                return False
+        return True
+
+    def _release(self, ticket, elapsed):
+        if not self.enabled:
+            return
+        with self._changed:
+            lane = self._lane(ticket.backend)
+            user = self._users[ticket.user_key]
+            lane.in_flight -= 1
+            user["in_flight"] -= 1
+            lane.service_time = elapsed if lane.service_time is None else 0.8 * lane.service_time + 0.2 * elapsed
+            self._forget_idle_locked(ticket.user_key)
+            self._changed.notify_all()
+
+    def stats(self):
+        """Per-backend gauges: in flight vs budget, queue depth and recent queue wait percentiles"""
+        with self._lock:
+            lanes = {}
+            for backend, lane in self._lanes.items():
+                waits = sorted(lane.waits)
+                lanes[backend] = dict(
+                    lane.counters,
+                    limit=lane.limit,
+                    in_flight=lane.in_flight,
+                    queue_depth=len(lane.waiting),
+                    max_queue_depth=lane.max_queue_depth,
+                    wait_p50_ms=round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                    wait_p95_ms=round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 1) if waits else 0.0,
+                    service_time_ms=round(lane.service_time * 1000, 1) if lane.service_time else None
+                )
+            return {"enabled": self.enabled, "active_users": len(self._users), "backends": lanes}
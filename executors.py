@@ -0,0 +1,513 @@
+# executors.py - Pluggable code execution backends (Judge0 or local sandbox)
+import os
+import sys
+import json
+import atexit
+import time
+import codecs
+import signal
+import select
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-language backend selection, e.g. "71=local" runs Python locally and
+# everything else on Judge0 (the default for unlisted languages).
+EXECUTION_BACKENDS = os.getenv('EXECUTION_BACKENDS', '')
+
+# Local sandbox limits (defaults mirror Judge0/judge0.conf)
+LOCAL_EXEC_WORKERS = int(os.getenv('LOCAL_EXEC_WORKERS', os.cpu_count() or 2))
+LOCAL_EXEC_CPU_LIMIT = int(os.getenv('LOCAL_EXEC_CPU_LIMIT', 5))  # CPU seconds
+LOCAL_EXEC_WALL_LIMIT = float(os.getenv('LOCAL_EXEC_WALL_LIMIT', 10))  # Wall-clock seconds
+LOCAL_EXEC_MEMORY_LIMIT = int(os.getenv('LOCAL_EXEC_MEMORY_LIMIT', 256000))  # KB
+LOCAL_EXEC_FILE_SIZE_LIMIT = int(os.getenv('LOCAL_EXEC_FILE_SIZE_LIMIT', 1024))  # KB
+LOCAL_EXEC_MAX_OUTPUT = int(os.getenv('LOCAL_EXEC_MAX_OUTPUT', 64 * 1024))  # Bytes kept per stream
+# Kill the program as soon as a stream passes LOCAL_EXEC_MAX_OUTPUT instead of letting it run on
+LOCAL_EXEC_STOP_ON_OUTPUT_LIMIT = os.getenv('LOCAL_EXEC_STOP_ON_OUTPUT_LIMIT', 'True').lower() == 'true'
+LOCAL_EXEC_REQUIRE_NO_NETWORK = os.getenv('LOCAL_EXEC_REQUIRE_NO_NETWORK', 'True').lower() == 'true'
+LOCAL_EXEC_MAX_PROCESSES = int(os.getenv('LOCAL_EXEC_MAX_PROCESSES', 16))  # RLIMIT_NPROC inside the sandbox
+LOCAL_EXEC_TMP_SIZE = int(os.getenv('LOCAL_EXEC_TMP_SIZE', 4096))  # KB, the program's private /tmp
+LOCAL_EXEC_UID = int(os.getenv('LOCAL_EXEC_UID', 65534))  # Host uid for programs when the app runs as root
+
+# Warm pool of pre-spawned, pre-imported interpreters (0 disables it)
+LOCAL_EXEC_WARM_POOL = int(os.getenv('LOCAL_EXEC_WARM_POOL', 4))
+LOCAL_EXEC_WARM_MAX_AGE = float(os.getenv('LOCAL_EXEC_WARM_MAX_AGE', 300))  # Seconds an idle worker is kept
+LOCAL_EXEC_PRELOAD = os.getenv(
+    'LOCAL_EXEC_PRELOAD',
+    'math,random,collections,itertools,functools,heapq,bisect,string,re,json,datetime,decimal,fractions,statistics'
+)
+
+PYTHON_LANGUAGE_IDS = (71, 92, 93, 94)
+
+SANDBOX_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_runner.py')
+SANDBOX_SETUP_FAILED = 125  # Must match sandbox_runner.SANDBOX_SETUP_FAILED
+
+# Judge0 status ids/descriptions, so local results look like Judge0 results
+STATUS_ACCEPTED = {"id": 3, "description": "Accepted"}
+STATUS_TIME_LIMIT = {"id": 5, "description": "Time Limit Exceeded"}
+STATUS_OUTPUT_LIMIT = {"id": 8, "description": "Runtime Error (SIGXFSZ)"}  # What Judge0's isolate reports
+STATUS_RUNTIME_ERROR = {"id": 11, "description": "Runtime Error (NZEC)"}
+STATUS_SIGNALED = {"id": 12, "description": "Runtime Error (Other)"}
+
+
+def parse_backends(spec=EXECUTION_BACKENDS):
+    """Parse "71=local,62=judge0" into {71: "local", 62: "judge0"}"""
+    backends = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        language_id, backend = item.split('=', 1)
+        try:
+            backends[int(language_id.strip())] = backend.strip().lower()
+        except ValueError:
+            print(f"⚠️ Ignoring invalid EXECUTION_BACKENDS entry: {item}")
+    return backends
+
+
+class ExecutorUnavailable(Exception):
+    """The backend cannot run this submission; the caller should fall back to Judge0"""
+
+
+class Executor:
+    """
+    Execution backend interface. run() returns a finished submission shaped
+    like a Judge0 result: status {id, description}, stdout, stderr,
+    compile_output, message, time, wall_time, memory, exit_code.
+
+    Backends that can stream call on_output(stream, text) with "stdout" /
+    "stderr" chunks as the program produces them; others ignore it.
+    """
+
+    name = "base"
+
+    def supports(self, language_id):
+        return False
+
+    def run(self, code, language_id, stdin="", on_output=None):
+        raise NotImplementedError
+
+
+class WarmInterpreterPool:
+    """
+    Keeps `size` sandbox runner processes spawned and waiting for a job, with
+    their stdlib imports already done. A worker runs exactly one snippet and
+    then exits (no state can leak between untrusted programs); a background
+    thread replenishes the pool and retires workers idle for longer than
+    max_age. Each gunicorn worker builds its own pool lazily after fork.
+
+    Idle workers only isolate themselves once their job arrives, so they
+    must be out of reach of running programs: those see neither their
+    pids nor their files (pid and mount namespaces). As a second line,
+    discard_idle() drops every idle worker after a run whose program left
+    processes behind or had to be killed.
+    """
+
+    def __init__(self, spawn, size=LOCAL_EXEC_WARM_POOL, max_age=LOCAL_EXEC_WARM_MAX_AGE):
+        self._spawn = spawn
+        self.size = size
+        self.max_age = max_age
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._owner_pid = None
+        self._refill_thread = None
+        self._counters = {"warm_hits": 0, "cold_spawns": 0, "retired": 0, "flushes": 0}
+
+    def _ensure_started(self):
+        # A pool inherited through fork belongs to the parent - start fresh
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid == os.getpid():
+                return
+            self._idle.clear()
+            self._owner_pid = os.getpid()
+            self._refill_thread = threading.Thread(target=self._refill_loop, name="warm-pool", daemon=True)
+            self._refill_thread.start()
+            atexit.register(self.shutdown)
+
+    def start(self):
+        """Begin filling the pool now instead of on the first run"""
+        if self.size > 0:
+            self._ensure_started()
+            self._wake.set()
+
+    def acquire(self):
+        """Return a worker tuple from spawn(): a warm worker if one is ready, else a freshly spawned one"""
+        if self.size <= 0:
+            self._count("cold_spawns")
+            return self._spawn()
+
+        self._ensure_started()
+        now = time.time()
+        while True:
+            with self._lock:
+                entry = self._idle.popleft() if self._idle else None
+            if entry is None:
+                break
+            worker, spawned_at = entry
+            if worker[0].poll() is None and now - spawned_at < self.max_age:
+                self._count("warm_hits")
+                return worker
+            self._discard(*worker)
+
+        self._count("cold_spawns")
+        return self._spawn()
+
+    def replenish(self):
+        """
+        Ask the background thread to top the pool back up. Called once a run
+        has finished rather than from acquire(), so spawning the replacement
+        does not compete for CPU with the snippet that just took a worker.
+        """
+        if self.size > 0:
+            self._wake.set()
+
+    def shutdown(self):
+        """Stop idle workers and remove their working directories (runs at interpreter exit)"""
+        with self._lock:
+            self.size = 0
+        self._wake.set()
+        if self._refill_thread and self._refill_thread is not threading.current_thread():
+            self._refill_thread.join(timeout=5)  # Let an in-progress spawn land so it gets cleaned up
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for worker, _ in idle:
+            self._discard(*worker)
+
+    def discard_idle(self):
+        """Replace every idle worker with a freshly spawned one"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._counters["flushes"] += 1
+        for worker, _ in idle:
+            self._discard(*worker)
+        self.replenish()
+
+    def _refill_loop(self):
+        while True:
+            self._wake.wait(timeout=self.max_age / 2)
+            self._wake.clear()
+            if self.size <= 0:
+                return  # shut down
+            self._retire_stale()
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.size:
+                        break
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    print(f"⚠️ Warm pool could not spawn interpreter: {e}")
+                    break
+                with self._lock:
+                    keep = len(self._idle) < self.size  # shutdown() may have run meanwhile
+                    if keep:
+                        self._idle.append((worker, time.time()))
+                if not keep:
+                    self._discard(*worker)
+                    break
+
+    def _retire_stale(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            stale = [entry for entry in self._idle if entry[1] < cutoff]
+            for entry in stale:
+                self._idle.remove(entry)
+        for worker, _ in stale:
+            self._discard(*worker)
+
+    def _discard(self, proc, workdir, status):
+        self._count("retired")
+        try:
+            proc.stdin.close()  # Runner exits on EOF without running anything
+            proc.wait(timeout=1)
+        except Exception:
+            proc.kill()
+        status.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, idle=len(self._idle), size=self.size)
+
+
+class LocalPythonExecutor(Executor):
+    """
+    Runs Python snippets on this host in a locked-down child interpreter.
+
+    Each run gets its own `python -I sandbox_runner.py` process (taken warm
+    from a WarmInterpreterPool when possible). Before running the code it
+    enters new user, mount, pid, ipc and uts namespaces (plus network with
+    require_no_network), pivots into a read-only root that only holds the
+    system and Python library directories and a private size-limited /tmp,
+    and runs the program as an unprivileged uid without capabilities,
+    under rlimits on CPU time, address space, file size, open files and
+    processes. The program's pid namespace dies with it, so nothing it
+    started outlives the run, and a wall-clock timeout kills the runner
+    (and with it the namespace). A stream that passes max_output is
+    truncated and, with stop_on_output_limit, the program is killed right
+    away (Judge0's SIGXFSZ status). At most LOCAL_EXEC_WORKERS runs execute
+    at once.
+
+    Needs Linux with unprivileged user namespaces. If the sandbox cannot
+    be set up the code is never run: the run raises ExecutorUnavailable
+    (the caller falls back to Judge0) and the backend disables itself.
+    """
+
+    name = "local"
+
+    def __init__(self, workers=LOCAL_EXEC_WORKERS, cpu_limit=LOCAL_EXEC_CPU_LIMIT,
+                 wall_limit=LOCAL_EXEC_WALL_LIMIT, memory_limit_kb=LOCAL_EXEC_MEMORY_LIMIT,
+                 file_size_limit_kb=LOCAL_EXEC_FILE_SIZE_LIMIT, max_output=LOCAL_EXEC_MAX_OUTPUT,
+                 require_no_network=LOCAL_EXEC_REQUIRE_NO_NETWORK, warm_pool_size=LOCAL_EXEC_WARM_POOL,
+                 preload=LOCAL_EXEC_PRELOAD, stop_on_output_limit=LOCAL_EXEC_STOP_ON_OUTPUT_LIMIT,
+                 max_processes=LOCAL_EXEC_MAX_PROCESSES, tmp_size_kb=LOCAL_EXEC_TMP_SIZE, uid=LOCAL_EXEC_UID):
+        self.cpu_limit = cpu_limit
+        self.wall_limit = wall_limit
+        self.max_output = max_output
+        self.stop_on_output_limit = stop_on_output_limit
+        self.limits = {
+            "cpu_seconds": cpu_limit,
+            "memory_bytes": memory_limit_kb * 1024,
+            "file_size_bytes": file_size_limit_kb * 1024,
+            "max_processes": max_processes,
+            "tmp_bytes": tmp_size_kb * 1024,
+            "uid": uid,
+            "no_network": require_no_network
+        }
+        self.preload = preload
+        self._slots = threading.BoundedSemaphore(workers)
+        self._disabled_reason = None if sys.platform.startswith('linux') else "local sandbox requires Linux"
+        self.pool = WarmInterpreterPool(self._spawn, size=warm_pool_size if self._disabled_reason is None else 0)
+
+    def supports(self, language_id):
+        return language_id in PYTHON_LANGUAGE_IDS and self._disabled_reason is None
+
+    def _spawn(self):
+        """
+        Start a runner in a new empty working directory (the mount point of
+        its new root); returns (process, workdir, status): status is the
+        read end of the pipe the sandbox's init reports the program's exit
+        status on.
+        """
+        workdir = tempfile.mkdtemp(prefix="codex-run-")
+        status_read, status_write = os.pipe()
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, '-I', SANDBOX_RUNNER, self.preload, str(status_write)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=workdir,
+                env={"PATH": "/usr/bin:/bin", "PYTHONIOENCODING": "utf-8", "PYTHONDONTWRITEBYTECODE": "1"},
+                pass_fds=(status_write,),
+                start_new_session=True  # Own process group, killed as a whole on timeout
+            )
+        except Exception:
+            os.close(status_read)
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        finally:
+            os.close(status_write)
+        return proc, workdir, os.fdopen(status_read, 'rb')
+
+    def _drain(self, stream, sink, name=None, on_output=None, on_limit=None):
+        """
+        Read a pipe to EOF, keeping at most max_output bytes. Kept chunks are
+        forwarded to on_output as they arrive (read1 returns whatever is
+        available instead of waiting for a full buffer); on_limit is called
+        once when the stream passes the cap.
+        """
+        kept = 0
+        truncated = False
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') if on_output else None
+        while True:
+            chunk = stream.read1(8192)
+            if not chunk:
+                break
+            piece = chunk[:max(self.max_output - kept, 0)]
+            if piece:
+                sink.append(piece)
+                kept += len(piece)
+                if on_output:
+                    text = decoder.decode(piece)
+                    if text:
+                        on_output(name, text)
+            if len(piece) < len(chunk) and not truncated:
+                truncated = True
+                sink.append(None)  # Marks truncation
+                if on_limit:
+                    on_limit()
+        stream.close()
+
+    def run(self, code, language_id=71, stdin="", on_output=None):
+        if not self.supports(language_id):
+            raise ExecutorUnavailable(self._disabled_reason or f"language {language_id} not supported locally")
+
+        with self._slots:
+            proc, workdir, status = self.pool.acquire()
+            try:
+                return self._run_in(proc, status, code, stdin, on_output)
+            except ExecutorUnavailable as e:
+                self._disable(str(e))
+                raise
+            finally:
+                status.close()
+                shutil.rmtree(workdir, ignore_errors=True)
+                self.pool.replenish()
+
+    def _disable(self, reason):
+        """Stop using the local backend after the sandbox failed to set up (it would fail every time)"""
+        if self._disabled_reason is None:
+            print(f"❌ Local sandbox disabled, running on Judge0 instead: {reason}")
+            self._disabled_reason = f"local sandbox unavailable: {reason}"
+            self.pool.shutdown()
+
+    def _run_in(self, proc, status, code, stdin, on_output=None):
+        started = time.time()
+        job = {"code": code, "stdin": stdin or "", "limits": self.limits}
+        if on_output:
+            job["line_buffered"] = True  # Flush each printed line so it can be streamed
+        job = json.dumps(job) + "\n"
+
+        # The reaper and a reader hitting the output cap may both want to
+        # kill the process group; never signal it once it has been reaped
+        reap_lock = threading.Lock()
+        reaped = False
+        output_limited = threading.Event()
+
+        def stop_on_limit():
+            output_limited.set()
+            if self.stop_on_output_limit:
+                with reap_lock:
+                    if not reaped:
+                        try:
+                            os.killpg(proc.pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+
+        stdout_chunks, stderr_chunks = [], []
+        readers = [
+            threading.Thread(target=self._drain, args=(proc.stdout, stdout_chunks, "stdout", on_output,
+                                                       stop_on_limit), daemon=True),
+            threading.Thread(target=self._drain, args=(proc.stderr, stderr_chunks, "stderr", on_output,
+                                                       stop_on_limit), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+
+        try:
+            proc.stdin.write(job.encode('utf-8'))
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        # Reap with wait4 to get the child's CPU time and peak memory
+        timed_out = False
+        deadline = started + self.wall_limit
+        while True:
+            with reap_lock:
+                pid, wait_status, rusage = os.wait4(proc.pid, os.WNOHANG)
+                if not pid and time.time() > deadline:
+                    timed_out = True
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    pid, wait_status, rusage = os.wait4(proc.pid, 0)
+                if pid:
+                    reaped = True
+                    break
+            time.sleep(0.005)
+        wall_time = time.time() - started
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)  # Anything left in the group outside the sandbox's namespace
+        except (ProcessLookupError, PermissionError):
+            pass
+        runner_exit = os.waitstatus_to_exitcode(wait_status)
+        report = self._read_status(status)
+        # Setup failed: init says the program never got ready, or the runner
+        # failed before forking init (exit code only counts without a report)
+        setup_failed = report.get("setup_failed") or (not report and runner_exit == SANDBOX_SETUP_FAILED)
+        if "exit_status" in report:
+            proc.returncode = os.waitstatus_to_exitcode(report["exit_status"])  # The program, not the runner
+        else:
+            proc.returncode = runner_exit  # Killed before init reported (timeout, output limit)
+        if timed_out or output_limited.is_set() or report.get("descendants", True):
+            self.pool.discard_idle()  # Killed, or left processes behind: don't trust idle workers
+
+        for reader in readers:
+            reader.join(timeout=1)
+
+        stdout, stdout_truncated = self._join(stdout_chunks)
+        stderr, stderr_truncated = self._join(stderr_chunks)
+
+        if setup_failed:
+            raise ExecutorUnavailable(stderr.strip() or "sandbox setup failed")
+
+        cpu_time = rusage.ru_utime + rusage.ru_stime
+        stopped_for_output = (output_limited.is_set() and self.stop_on_output_limit
+                              and proc.returncode == -signal.SIGKILL and not timed_out)
+        if stopped_for_output:
+            status = STATUS_OUTPUT_LIMIT
+        elif timed_out or proc.returncode == -signal.SIGXCPU or cpu_time >= self.cpu_limit:
+            status = STATUS_TIME_LIMIT
+        elif proc.returncode == 0:
+            status = STATUS_ACCEPTED
+        elif proc.returncode < 0:
+            status = STATUS_SIGNALED
+        else:
+            status = STATUS_RUNTIME_ERROR
+
+        message = None
+        if stopped_for_output:
+            message = f"Output limit exceeded: program stopped after {self.max_output} bytes on one stream"
+        elif stdout_truncated or stderr_truncated:
+            message = f"Output truncated to {self.max_output} bytes per stream"
+
+        return {
+            "status": status,
+            "stdout": stdout or None,
+            "stderr": stderr or None,
+            "compile_output": None,
+            "message": message,
+            "time": f"{cpu_time:.3f}",
+            "wall_time": f"{wall_time:.3f}",
+            "memory": rusage.ru_maxrss,  # KB on Linux
+            "exit_code": proc.returncode
+        }
+
+    @staticmethod
+    def _read_status(status, timeout=1):
+        """The sandbox init's report ({} if it never got to write one, e.g. killed or setup failed)"""
+        data = b""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not select.select([status], [], [], max(deadline - time.time(), 0))[0]:
+                break
+            chunk = os.read(status.fileno(), 4096)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            return json.loads(data) if data else {}
+        except ValueError:
+            return {}
+
+    @staticmethod
+    def _join(chunks):
+        truncated = None in chunks
+        data = b"".join(chunk for chunk in chunks if chunk is not None)
+        return data.decode('utf-8', errors='replace'), truncated
@@ -0,0 +1,253 @@
+# judge0_callbacks.py - Receive finished Judge0 submissions via callback_url instead of polling
+#
+# Each submission gets an unguessable nonce and callback_url
+# "<JUDGE0_CALLBACK_URL>/api/judge0/callback/<nonce>". Judge0 PUTs the finished
+# submission there; the route stores it in a result store and wakes whoever
+# is waiting on that nonce. With several gunicorn workers the callback can
+# land on a different worker than the waiting request, so use the sqlite
+# (one host) or redis (many hosts) store there.
+import os
+import json
+import time
+import base64
+import secrets
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Callback configuration
+JUDGE0_CALLBACK_URL = os.getenv('JUDGE0_CALLBACK_URL', '').rstrip('/')  # Public base URL of this app; empty disables callbacks
+JUDGE0_CALLBACK_STORE = os.getenv('JUDGE0_CALLBACK_STORE', 'memory').lower()  # memory/sqlite/redis
+JUDGE0_CALLBACK_STORE_PATH = os.getenv('JUDGE0_CALLBACK_STORE_PATH', 'judge0_callbacks.db')
+JUDGE0_CALLBACK_GRACE = float(os.getenv('JUDGE0_CALLBACK_GRACE', 10))  # Seconds before the first fallback poll
+JUDGE0_CALLBACK_POLL_INTERVAL = float(os.getenv('JUDGE0_CALLBACK_POLL_INTERVAL', 10))  # Seconds between fallback polls
+JUDGE0_CALLBACK_TTL = 600  # Seconds a pending or delivered entry is kept
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+CALLBACK_PATH = '/api/judge0/callback'
+SHARED_STORE_CHECK_INTERVAL = 0.1  # Local read of a shared store while waiting
+
+# Judge0 sends callbacks base64 encoded regardless of how the submission was made
+BASE64_FIELDS = ("stdout", "stderr", "compile_output", "message")
+
+
+def decode_callback(data):
+    """Turn a Judge0 callback body into the plain submission shape poll() returns"""
+    result = dict(data)
+    for field in BASE64_FIELDS:
+        value = result.get(field)
+        if value:
+            try:
+                result[field] = base64.b64decode(value, validate=False).decode('utf-8', errors='replace')
+            except (ValueError, TypeError):
+                pass  # Leave undecodable values as sent
+    return result
+
+
+class MemoryCallbackStore:
+    """Pending nonces and delivered results in this process only"""
+
+    shared = False
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add_pending(self, nonce):
+        with self._lock:
+            cutoff = time.time() - JUDGE0_CALLBACK_TTL
+            for stale in [key for key, (_, created) in self._entries.items() if created < cutoff]:
+                del self._entries[stale]
+            self._entries[nonce] = (None, time.time())
+
+    def complete(self, nonce, result):
+        with self._lock:
+            entry = self._entries.get(nonce)
+            if entry is None or entry[0] is not None:
+                return False
+            self._entries[nonce] = (result, entry[1])
+            return True
+
+    def get(self, nonce):
+        with self._lock:
+            entry = self._entries.get(nonce)
+            return entry[0] if entry else None
+
+    def discard(self, nonce):
+        with self._lock:
+            self._entries.pop(nonce, None)
+
+
+class SQLiteCallbackStore:
+    """Callback results in a SQLite file shared by all workers on one host"""
+
+    shared = True
+
+    def __init__(self, path=JUDGE0_CALLBACK_STORE_PATH):
+        self.path = path
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS judge0_callbacks (
+                nonce TEXT PRIMARY KEY,
+                result TEXT,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def add_pending(self, nonce):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM judge0_callbacks WHERE expires_at < ?', (time.time(),))
+            conn.execute('INSERT OR REPLACE INTO judge0_callbacks (nonce, result, expires_at) VALUES (?, NULL, ?)',
+                         (nonce, time.time() + JUDGE0_CALLBACK_TTL))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def complete(self, nonce, result):
+        conn = self._connect()
+        try:
+            cursor = conn.execute('UPDATE judge0_callbacks SET result = ? WHERE nonce = ? AND result IS NULL',
+                                  (json.dumps(result), nonce))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def get(self, nonce):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT result FROM judge0_callbacks WHERE nonce = ?', (nonce,)).fetchone()
+            return json.loads(row[0]) if row and row[0] else None
+        finally:
+            conn.close()
+
+    def discard(self, nonce):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM judge0_callbacks WHERE nonce = ?', (nonce,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class RedisCallbackStore:
+    """Callback results in Redis (shared across hosts)"""
+
+    shared = True
+    PENDING = b"pending"
+
+    def __init__(self, url=REDIS_URL):
+        import redis  # Optional dependency - only needed for JUDGE0_CALLBACK_STORE=redis
+        self.client = redis.Redis.from_url(url)
+
+    def add_pending(self, nonce):
+        self.client.set(f"judge0_cb:{nonce}", self.PENDING, ex=JUDGE0_CALLBACK_TTL)
+
+    def complete(self, nonce, result):
+        key = f"judge0_cb:{nonce}"
+        if self.client.get(key) != self.PENDING:
+            return False
+        return bool(self.client.set(key, json.dumps(result), xx=True, ex=JUDGE0_CALLBACK_TTL))
+
+    def get(self, nonce):
+        raw = self.client.get(f"judge0_cb:{nonce}")
+        return json.loads(raw) if raw and raw != self.PENDING else None
+
+    def discard(self, nonce):
+        self.client.delete(f"judge0_cb:{nonce}")
+
+
+class CallbackRegistry:
+    """
+    Tracks submissions waiting for a Judge0 callback. Waiters in this
+    process are woken as soon as the callback route delivers; with a shared
+    store, waiters also re-read the store every SHARED_STORE_CHECK_INTERVAL
+    (a local read, not a Judge0 request) to catch callbacks that landed on
+    another worker. Store failures disable nothing - the client simply falls
+    back to polling Judge0.
+    """
+
+    def __init__(self, base_url=JUDGE0_CALLBACK_URL, backend=JUDGE0_CALLBACK_STORE):
+        self.base_url = base_url
+        self.enabled = bool(base_url)
+        self.store = MemoryCallbackStore()
+        self._changed = threading.Condition()
+        self._deliveries = 0  # Bumped with every accepted callback, so a waiter can tell one raced its read
+        self._counters = {"registered": 0, "delivered": 0, "rejected": 0, "missed": 0}
+
+        if self.enabled and backend in ('sqlite', 'redis'):
+            try:
+                self.store = SQLiteCallbackStore() if backend == 'sqlite' else RedisCallbackStore()
+                print(f"✅ Judge0 callback store: {backend}")
+            except Exception as e:
+                print(f"⚠️ Judge0 callback store unavailable ({backend}), using memory: {e}")
+
+    def _count(self, name):
+        with self._changed:
+            self._counters[name] += 1
+
+    def register(self):
+        """Reserve a nonce for one submission; returns (nonce, callback_url) or None if unavailable"""
+        nonce = secrets.token_urlsafe(24)
+        try:
+            self.store.add_pending(nonce)
+        except Exception as e:
+            print(f"⚠️ Judge0 callback store write error: {e}")
+            return None
+        self._count("registered")
+        return nonce, f"{self.base_url}{CALLBACK_PATH}/{nonce}"
+
+    def deliver(self, nonce, result):
+        """Record a callback body; False if the nonce is unknown, expired or already delivered"""
+        try:
+            accepted = self.store.complete(nonce, result)
+        except Exception as e:
+            print(f"⚠️ Judge0 callback store write error: {e}")
+            accepted = False
+        with self._changed:
+            self._counters["delivered" if accepted else "rejected"] += 1
+            if accepted:
+                self._deliveries += 1
+                self._changed.notify_all()
+        return accepted
+
+    def wait(self, nonce, timeout):
+        """Block until the callback for nonce arrives (returns the submission) or timeout (None)"""
+        deadline = time.time() + timeout
+        while True:
+            with self._changed:
+                seen = self._deliveries
+            try:
+                result = self.store.get(nonce)
+            except Exception as e:
+                print(f"⚠️ Judge0 callback store read error: {e}")
+                result = None
+            if result is not None:
+                return result
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                if self._deliveries == seen:  # Else a callback landed after our read: look again
+                    self._changed.wait(min(remaining, SHARED_STORE_CHECK_INTERVAL) if self.store.shared else remaining)
+
+    def discard(self, nonce, missed=False):
+        """Forget a nonce once its waiter is done (missed=True when polling had to finish the job)"""
+        if missed:
+            self._count("missed")
+        try:
+            self.store.discard(nonce)
+        except Exception as e:
+            print(f"⚠️ Judge0 callback store write error: {e}")
+
+    def stats(self):
+        with self._changed:
+            return dict(self._counters, enabled=self.enabled, store=type(self.store).__name__)
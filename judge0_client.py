@@ -0,0 +1,560 @@
+# judge0_client.py - Pooled, keep-alive HTTP client for Judge0 execution endpoints
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+from judge0_callbacks import JUDGE0_CALLBACK_GRACE, JUDGE0_CALLBACK_POLL_INTERVAL
+
+load_dotenv()
+
+# ---------------- JUDGE0 ENDPOINTS ----------------
+# NOTE: Multiple endpoints ensure execution always works - never shows "Cannot connect" error!
+JUDGE0_URLS = [
+    # "http://localhost:2358",  # ❌ DISABLED: cgroup v2 incompatibility on Windows
+    "https://ce.judge0.com",  # Primary: Free Public API
+    "https://judge0.p.rapidapi.com",  # Fallback 1: RapidAPI (auto-handled)
+    "https://judge0-ce.p.rapidapi.com"  # Fallback 2: RapidAPI CE
+]
+
+# RapidAPI key from environment or hardcoded
+RAPIDAPI_KEY = os.getenv('JUDGE0_API_KEY', None)  # Set in .env file or here
+
+# Connection pool configuration (per base URL)
+JUDGE0_POOL_SIZE = int(os.getenv('JUDGE0_POOL_SIZE', 10))
+JUDGE0_MAX_RETRIES = int(os.getenv('JUDGE0_MAX_RETRIES', 2))
+JUDGE0_RETRY_BACKOFF = float(os.getenv('JUDGE0_RETRY_BACKOFF', 0.3))
+
+# Submission states that mean "keep polling"
+PENDING_STATUSES = ("In Queue", "Processing")
+
+# Languages Judge0 compiles before running (C, C++, Java)
+COMPILED_LANGUAGE_IDS = (50, 54, 62)
+
+# Adaptive polling: short first intervals, exponential backoff with jitter
+POLL_INITIAL_DELAY = float(os.getenv('JUDGE0_POLL_INITIAL_DELAY', 0.1))  # Seconds
+POLL_BACKOFF_FACTOR = float(os.getenv('JUDGE0_POLL_BACKOFF_FACTOR', 1.6))
+POLL_MAX_DELAY = float(os.getenv('JUDGE0_POLL_MAX_DELAY', 2.0))  # Seconds between polls
+
+# Overall polling deadline per language (seconds). Compiled languages need
+# room for compilation on the free API; Python/JS results arrive quickly.
+POLL_BUDGETS = {
+    50: 60,   # C
+    54: 60,   # C++
+    62: 90,   # Java
+}
+POLL_DEFAULT_BUDGET = int(os.getenv('JUDGE0_POLL_BUDGET', 30))
+
+# Judge0 rejects batches larger than MAX_SUBMISSION_BATCH_SIZE (20 by default)
+JUDGE0_BATCH_SIZE = int(os.getenv('JUDGE0_BATCH_SIZE', 20))
+
+# Health-scored routing: circuit breaker and hedged submissions
+JUDGE0_CIRCUIT_FAILURES = int(os.getenv('JUDGE0_CIRCUIT_FAILURES', 3))  # Consecutive failures to trip
+JUDGE0_CIRCUIT_COOLDOWN = float(os.getenv('JUDGE0_CIRCUIT_COOLDOWN', 30))  # Seconds before retrying
+JUDGE0_HEDGE_PERCENTILE = float(os.getenv('JUDGE0_HEDGE_PERCENTILE', 0.95))
+JUDGE0_HEDGE_DEFAULT_DELAY = float(os.getenv('JUDGE0_HEDGE_DEFAULT_DELAY', 10))  # Until enough samples
+JUDGE0_HEDGE_MIN_DELAY = float(os.getenv('JUDGE0_HEDGE_MIN_DELAY', 1))
+JUDGE0_MAX_HEDGES = int(os.getenv('JUDGE0_MAX_HEDGES', 1))
+JUDGE0_ATTEMPT_WORKERS = int(os.getenv('JUDGE0_ATTEMPT_WORKERS', 64))
+
+
+def poll_budget(language_id):
+    """Polling deadline in seconds for a language"""
+    return POLL_BUDGETS.get(language_id, POLL_DEFAULT_BUDGET)
+
+
+def poll_delays(initial=POLL_INITIAL_DELAY, factor=POLL_BACKOFF_FACTOR, max_delay=POLL_MAX_DELAY):
+    """
+    Yield sleep intervals for polling: exponential growth capped at max_delay,
+    with "equal jitter" (half fixed, half random) so many waiting requests
+    don't poll Judge0 in lock-step.
+    """
+    delay = initial
+    while True:
+        yield delay / 2 + random.uniform(0, delay / 2)
+        delay = min(delay * factor, max_delay)
+
+
+class PollTelemetry:
+    """Per-language polling stats (poll counts and time-to-result) for tuning the schedule"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._languages = {}
+
+    def record(self, language_id, polls, elapsed, outcome):
+        with self._lock:
+            entry = self._languages.setdefault(language_id, {
+                "completed": 0, "timeouts": 0, "errors": 0, "cancelled": 0, "polls": 0, "callbacks": 0,
+                "durations": deque(maxlen=self._window)
+            })
+            entry["polls"] += polls
+            if outcome in ("completed", "callback"):
+                entry["completed"] += 1
+                entry["durations"].append(elapsed)
+                if outcome == "callback":
+                    entry["callbacks"] += 1
+            elif outcome == "timeout":
+                entry["timeouts"] += 1
+            elif outcome == "cancelled":
+                entry["cancelled"] += 1  # Hedge loser
+            else:
+                entry["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            summary = {}
+            for language_id, entry in self._languages.items():
+                durations = sorted(entry["durations"])
+                finished = entry["completed"] + entry["timeouts"] + entry["errors"] + entry["cancelled"]
+                summary[str(language_id)] = {
+                    "completed": entry["completed"],
+                    "timeouts": entry["timeouts"],
+                    "errors": entry["errors"],
+                    "cancelled": entry["cancelled"],
+                    "by_callback": entry["callbacks"],
+                    "avg_polls": round(entry["polls"] / finished, 2) if finished else 0,
+                    "p50_seconds": round(durations[len(durations) // 2], 3) if durations else None,
+                    "p95_seconds": round(durations[int(len(durations) * 0.95)], 3) if durations else None,
+                    "budget_seconds": poll_budget(language_id)
+                }
+            return summary
+
+
+class EndpointRouter:
+    """
+    Rolling health score per Judge0 base URL.
+
+    Tracks a success-rate EWMA, a latency EWMA and recent attempt latencies
+    per language. Endpoints that fail JUDGE0_CIRCUIT_FAILURES times in a row
+    are skipped for JUDGE0_CIRCUIT_COOLDOWN seconds (circuit open); after the
+    cooldown one failure re-opens the circuit, one success closes it.
+    """
+
+    EWMA_ALPHA = 0.2
+    MIN_SAMPLES = 10
+
+    def __init__(self, failure_threshold=JUDGE0_CIRCUIT_FAILURES, cooldown=JUDGE0_CIRCUIT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._health = {}
+
+    def _entry(self, base_url):
+        return self._health.setdefault(base_url, {
+            "success_rate": 1.0,
+            "latency": None,
+            "consecutive_failures": 0,
+            "open_until": 0.0,
+            "successes": 0,
+            "failures": 0,
+            "latencies": {}
+        })
+
+    def record_success(self, base_url, elapsed, language_id=None):
+        with self._lock:
+            entry = self._entry(base_url)
+            entry["successes"] += 1
+            entry["consecutive_failures"] = 0
+            entry["open_until"] = 0.0
+            entry["success_rate"] += self.EWMA_ALPHA * (1.0 - entry["success_rate"])
+            if entry["latency"] is None:
+                entry["latency"] = elapsed
+            else:
+                entry["latency"] += self.EWMA_ALPHA * (elapsed - entry["latency"])
+            entry["latencies"].setdefault(language_id, deque(maxlen=200)).append(elapsed)
+
+    def record_failure(self, base_url):
+        with self._lock:
+            entry = self._entry(base_url)
+            entry["failures"] += 1
+            entry["consecutive_failures"] += 1
+            entry["success_rate"] -= self.EWMA_ALPHA * entry["success_rate"]
+            if entry["consecutive_failures"] >= self.failure_threshold:
+                entry["open_until"] = time.time() + self.cooldown
+
+    def is_available(self, base_url):
+        with self._lock:
+            return self._entry(base_url)["open_until"] <= time.time()
+
+    def ordered(self, base_urls):
+        """
+        Endpoints best-first: closed circuits before open ones, healthy
+        (success rate >= 50%) before degraded, then lowest latency. Endpoints
+        without latency data keep their configured order after measured ones.
+        Open circuits are still returned last so there is always something to try.
+        """
+        now = time.time()
+        with self._lock:
+            def rank(item):
+                index, url = item
+                entry = self._entry(url)
+                is_open = entry["open_until"] > now
+                latency = entry["latency"] if entry["latency"] is not None else float('inf')
+                return (is_open, entry["success_rate"] < 0.5, latency, index)
+            return [url for _, url in sorted(enumerate(base_urls), key=rank)]
+
+    def hedge_delay(self, base_url, language_id=None):
+        """Seconds to wait on an attempt before hedging: the configured latency percentile"""
+        with self._lock:
+            samples = sorted(self._entry(base_url)["latencies"].get(language_id, ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return JUDGE0_HEDGE_DEFAULT_DELAY
+        index = min(int(len(samples) * JUDGE0_HEDGE_PERCENTILE), len(samples) - 1)
+        return max(samples[index], JUDGE0_HEDGE_MIN_DELAY)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                url: {
+                    "success_rate": round(entry["success_rate"], 3),
+                    "latency_ewma": round(entry["latency"], 3) if entry["latency"] is not None else None,
+                    "successes": entry["successes"],
+                    "failures": entry["failures"],
+                    "circuit": "open" if entry["open_until"] > now else "closed"
+                }
+                for url, entry in self._health.items()
+            }
+
+
+class Judge0Client:
+    """
+    Thread-safe Judge0 client that owns one pooled requests.Session per base URL.
+
+    Sessions are created lazily on first use, so each gunicorn worker opens its
+    own connections after fork and then reuses them (keep-alive) for every
+    submission and poll instead of doing a fresh TCP+TLS handshake each time.
+    """
+
+    def __init__(self, base_urls, api_key=None, pool_size=JUDGE0_POOL_SIZE,
+                 max_retries=JUDGE0_MAX_RETRIES, backoff_factor=JUDGE0_RETRY_BACKOFF, callbacks=None):
+        self.base_urls = list(base_urls)
+        self.api_key = api_key
+        self.callbacks = callbacks  # CallbackRegistry, or None to always poll
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.poll_telemetry = PollTelemetry()
+        self.router = EndpointRouter()
+        self.max_hedges = JUDGE0_MAX_HEDGES
+        self._executor = ThreadPoolExecutor(max_workers=JUDGE0_ATTEMPT_WORKERS, thread_name_prefix="judge0")
+        self._hedge_counters = {"hedges": 0, "hedge_wins": 0, "failovers": 0, "cancelled": 0}
+        self._attempt = threading.local()  # .cancelled: Event set when run_hedged no longer needs the attempt
+
+    def is_enabled(self, base_url):
+        """RapidAPI endpoints are only usable when an API key is configured"""
+        return "rapidapi.com" not in base_url or bool(self.api_key)
+
+    def enabled_urls(self):
+        """Base URLs that can be tried, in priority order"""
+        return [url for url in self.base_urls if self.is_enabled(url)]
+
+    def headers_for(self, base_url):
+        """Request headers for a base URL (adds RapidAPI auth when needed)"""
+        headers = {"Content-Type": "application/json"}
+        if "rapidapi.com" in base_url and self.api_key:
+            headers.update({
+                "X-RapidAPI-Key": self.api_key,
+                "X-RapidAPI-Host": "judge0-ce.p.rapidapi.com"
+            })
+        return headers
+
+    def _build_session(self, base_url):
+        # Only GETs are retried on bad gateway responses - a retried POST could
+        # create a duplicate submission. Connection errors happen before the
+        # request is sent, so those are safe to retry for every method.
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers_for(base_url))
+        return session
+
+    def session_for(self, base_url):
+        """Get (or lazily create) the pooled session for a base URL"""
+        session = self._sessions.get(base_url)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(base_url)
+                if session is None:
+                    session = self._build_session(base_url)
+                    self._sessions[base_url] = session
+        return session
+
+    def submit(self, base_url, payload, wait=False, timeout=15):
+        """POST a submission; with wait=True Judge0 blocks until the result is ready"""
+        return self.session_for(base_url).post(
+            f"{base_url}/submissions/?base64_encoded=false&wait={'true' if wait else 'false'}",
+            json=payload,
+            timeout=timeout
+        )
+
+    def fetch(self, base_url, token, timeout=15):
+        """GET the current state of a submission by token"""
+        return self.session_for(base_url).get(
+            f"{base_url}/submissions/{token}?base64_encoded=false",
+            timeout=timeout
+        )
+
+    def poll(self, base_url, token, language_id=71, deadline=None, request_timeout=15, on_status=None):
+        """
+        Poll a submission with adaptive backoff until it leaves the queue.
+
+        on_status, if given, is called with each new Judge0 status description
+        ("In Queue", "Processing", ...) as it changes.
+
+        Returns (result, error): the finished submission dict, or None and a
+        reason when the server errors or the language's polling budget runs out.
+        """
+        started = time.time()
+        deadline = deadline or started + poll_budget(language_id)
+        polls = 0
+        last_status = None
+
+        for delay in poll_delays():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if self._pause(min(delay, remaining)):
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "cancelled")
+                return None, "Cancelled: another attempt finished first"
+            polls += 1
+
+            res = self.fetch(base_url, token, timeout=request_timeout)
+            if res.status_code != 200:
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "error")
+                return None, f"Server returned status {res.status_code}"
+
+            result = res.json()
+            status = result.get("status", {}).get("description")
+            if on_status and status != last_status:
+                on_status(status)
+                last_status = status
+            if status not in PENDING_STATUSES:
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "completed")
+                return result, None
+
+        self.poll_telemetry.record(language_id, polls, time.time() - started, "timeout")
+        return None, "Timeout waiting for execution"
+
+    def await_callback(self, base_url, token, nonce, language_id=71, deadline=None, request_timeout=15,
+                       on_status=None):
+        """
+        Wait for a submission's result to arrive through its callback_url.
+
+        Judge0 is not polled during the first JUDGE0_CALLBACK_GRACE seconds;
+        if the callback still hasn't arrived (lost, or this host isn't
+        reachable from Judge0) the token is fetched every
+        JUDGE0_CALLBACK_POLL_INTERVAL seconds, with the callback still able to
+        win in between. Returns (result, error) like poll().
+        """
+        started = time.time()
+        deadline = deadline or started + poll_budget(language_id)
+        polls = 0
+        if on_status:
+            on_status("In Queue")
+
+        try:
+            result = self.callbacks.wait(nonce, min(JUDGE0_CALLBACK_GRACE, deadline - started))
+            while result is None and time.time() < deadline:
+                if self._pause(0):
+                    self.poll_telemetry.record(language_id, polls, time.time() - started, "cancelled")
+                    return None, "Cancelled: another attempt finished first"
+                polls += 1
+                res = self.fetch(base_url, token, timeout=request_timeout)
+                if res.status_code != 200:
+                    self.poll_telemetry.record(language_id, polls, time.time() - started, "error")
+                    return None, f"Server returned status {res.status_code}"
+                fetched = res.json()
+                if fetched.get("status", {}).get("description") not in PENDING_STATUSES:
+                    self.callbacks.discard(nonce, missed=True)
+                    self.poll_telemetry.record(language_id, polls, time.time() - started, "completed")
+                    if on_status:
+                        on_status(fetched.get("status", {}).get("description"))
+                    return fetched, None
+                result = self.callbacks.wait(nonce, min(JUDGE0_CALLBACK_POLL_INTERVAL, deadline - time.time()))
+        finally:
+            self.callbacks.discard(nonce)
+
+        if result is None:
+            self.poll_telemetry.record(language_id, polls, time.time() - started, "timeout")
+            return None, "Timeout waiting for execution"
+        self.poll_telemetry.record(language_id, polls, time.time() - started, "callback")
+        if on_status:
+            on_status(result.get("status", {}).get("description"))
+        return result, None
+
+    def _pause(self, seconds):
+        """Sleep between polls; True (at once) if run_hedged has cancelled the attempt on this thread"""
+        cancelled = getattr(self._attempt, "cancelled", None)
+        if cancelled is None:
+            time.sleep(seconds)
+            return False
+        return cancelled.wait(seconds)
+
+    def submit_batch(self, base_url, submissions, timeout=15):
+        """POST several submissions at once; returns one {"token": ...} per submission"""
+        return self.session_for(base_url).post(
+            f"{base_url}/submissions/batch?base64_encoded=false",
+            json={"submissions": submissions},
+            timeout=timeout
+        )
+
+    def fetch_batch(self, base_url, tokens, timeout=15):
+        """GET the state of several submissions in one request"""
+        return self.session_for(base_url).get(
+            f"{base_url}/submissions/batch?tokens={','.join(tokens)}&base64_encoded=false",
+            timeout=timeout
+        )
+
+    def poll_batch(self, base_url, tokens, language_id=71, deadline=None, request_timeout=15):
+        """
+        Poll a batch of submissions together until none are pending.
+
+        Returns (results, error): finished submission dicts in token order, or
+        None and a reason on server error or when the polling budget runs out.
+        """
+        started = time.time()
+        deadline = deadline or started + poll_budget(language_id)
+        polls = 0
+
+        for delay in poll_delays():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if self._pause(min(delay, remaining)):
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "cancelled")
+                return None, "Cancelled: another attempt finished first"
+            polls += 1
+
+            res = self.fetch_batch(base_url, tokens, timeout=request_timeout)
+            if res.status_code != 200:
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "error")
+                return None, f"Server returned status {res.status_code}"
+
+            results = res.json().get("submissions") or []
+            if len(results) == len(tokens) and all(
+                r and r.get("status", {}).get("description") not in PENDING_STATUSES for r in results
+            ):
+                self.poll_telemetry.record(language_id, polls, time.time() - started, "completed")
+                return results, None
+
+        self.poll_telemetry.record(language_id, polls, time.time() - started, "timeout")
+        return None, "Timeout waiting for batch execution"
+
+    def run_hedged(self, attempt, language_id=None):
+        """
+        Run attempt(base_url) -> (result, error) against the best endpoint first.
+
+        If it fails, the next endpoint is tried right away (failover). If the
+        newest attempt is still running after its endpoint's latency
+        percentile for this language (measured from when it started), a
+        duplicate attempt is started on the next endpoint (hedge) and the
+        first usable result wins. Attempts still running then are cancelled:
+        their poll() / poll_batch() / await_callback() loops stop at the next
+        poll instead of querying Judge0 for a result nobody reads.
+
+        Returns (result, error, base_url).
+        """
+        urls = self.router.ordered(self.enabled_urls())
+        if not urls:
+            return None, "No Judge0 endpoints available", None
+
+        pending = {}
+        next_index = 0
+        hedges = 0
+        last_error = None
+        hedge_at = None
+
+        def timed_attempt(base_url, cancelled):
+            self._attempt.cancelled = cancelled
+            started = time.time()
+            try:
+                result, error = attempt(base_url)
+            except Exception as e:
+                result, error = None, f"Unexpected error: {str(e)}"
+            finally:
+                self._attempt.cancelled = None
+            if result is not None:
+                self.router.record_success(base_url, time.time() - started, language_id)
+            elif not cancelled.is_set():  # A cancelled loser says nothing about the endpoint
+                self.router.record_failure(base_url)
+            return result, error
+
+        def launch(hedge=False):
+            nonlocal next_index, hedge_at
+            base_url = urls[next_index]
+            next_index += 1
+            cancelled = threading.Event()
+            pending[self._executor.submit(timed_attempt, base_url, cancelled)] = (base_url, hedge, cancelled)
+            hedge_at = time.time() + self.router.hedge_delay(base_url, language_id)
+            return base_url
+
+        def cancel_pending():
+            for _, _, cancelled in pending.values():
+                cancelled.set()
+                self._count("cancelled")
+
+        launch()
+        while pending:
+            can_hedge = next_index < len(urls) and hedges < self.max_hedges
+            timeout = max(hedge_at - time.time(), 0) if can_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                hedges += 1
+                self._count("hedges")
+                launch(hedge=True)
+                continue
+
+            for future in done:
+                base_url, hedge, _ = pending.pop(future)
+                result, error = future.result()
+                if result is not None:
+                    if hedge:
+                        self._count("hedge_wins")
+                    cancel_pending()
+                    return result, None, base_url
+                last_error = error
+
+            if not pending and next_index < len(urls):
+                self._count("failovers")
+                launch()
+
+        return None, last_error, None
+
+    def _count(self, name):
+        with self._lock:
+            self._hedge_counters[name] += 1
+
+    def routing_stats(self):
+        with self._lock:
+            counters = dict(self._hedge_counters)
+        return {"endpoints": self.router.stats(), **counters}
+
+    def close(self):
+        """Close all pooled sessions (e.g. on worker shutdown)"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,366 @@
+# sandbox_runner.py - Child-process bootstrap for the local Python executor
+#
+# Started as `python -I sandbox_runner.py [module,module,...] STATUS_FD` by
+# executors.LocalPythonExecutor. Optionally pre-imports the listed stdlib
+# modules (so warm pool workers pay import time before a job arrives), then
+# reads one JSON job line from stdin: {"code": str, "stdin": str, "limits": {...}}
+# and only then isolates itself and runs the untrusted code:
+#
+#   runner (host)        unshares user, mount, pid, ipc, uts (and network)
+#                        namespaces, builds a new root and forks
+#     init (pid 1)       reaps; when it exits the kernel kills every process
+#                        left in the namespace, setsid() or not
+#       program (pid 2)  drops to an unprivileged uid with no capabilities,
+#                        sets rlimits (processes included) and runs the code
+#
+# The new root is a read-only tmpfs holding read-only binds of the system and
+# Python library directories, four /dev nodes and a private, size-limited
+# /tmp (the working directory). The app's own files, .env included, are not
+# in it. init writes {"exit_status": ..., "descendants": bool} to STATUS_FD.
+# Each process runs exactly one job. Never import this module from the web app.
+import sys
+import os
+import io
+import json
+import select
+import signal
+import traceback
+
+# Exit code reserved for "sandbox could not be set up" (the code never ran)
+SANDBOX_SETUP_FAILED = 125
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+MNT_DETACH = 0x2
+
+PR_SET_PDEATHSIG = 1
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41}
+
+# Flags a bind remount must keep (the kernel locks them inside a user namespace)
+STATVFS_MOUNT_FLAGS = {os.ST_NOSUID: MS_NOSUID, os.ST_NODEV: MS_NODEV, os.ST_NOEXEC: MS_NOEXEC,
+                       os.ST_NOATIME: MS_NOATIME, os.ST_NODIRATIME: MS_NODIRATIME,
+                       os.ST_RELATIME: MS_RELATIME}
+
+# Read-only in the new root; missing paths are skipped, symlinks recreated
+SYSTEM_PATHS = ("/usr", "/bin", "/sbin", "/lib", "/lib32", "/lib64", "/etc/ld.so.cache")
+DEVICES = ("null", "zero", "random", "urandom")
+
+# uid/gid of the program inside its namespaces
+SANDBOX_UID = 65534
+
+_libc = None
+
+
+def _call(name, *args):
+    import ctypes
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if getattr(_libc, name)(*args) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{name} failed: {os.strerror(errno)}")
+
+
+def _mount(source, target, fstype, flags, data=None):
+    import ctypes
+    encode = lambda value: value.encode() if isinstance(value, str) else value
+    _call("mount", encode(source), encode(target), encode(fstype), ctypes.c_ulong(flags), encode(data))
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def _bind_readonly(source, root):
+    """Mirror source at the same path under root, read-only (symlinks are recreated as symlinks)"""
+    target = root + source
+    if os.path.lexists(target):
+        return
+    if os.path.islink(source):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.symlink(os.readlink(source), target)
+        return
+    if os.path.isdir(source):
+        os.makedirs(target)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        open(target, "w").close()
+    _mount(source, target, None, MS_BIND)
+    locked = os.statvfs(source).f_flag
+    flags = MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID
+    flags |= sum(flag for st_flag, flag in STATVFS_MOUNT_FLAGS.items() if locked & st_flag)
+    _mount(None, target, None, flags)
+
+
+def _python_paths():
+    """The interpreter's own library directories: the stdlib and its extension modules"""
+    import sysconfig
+    paths = {sys.base_prefix}
+    paths.update(sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib"))
+    return sorted(path for path in paths if os.path.exists(path))
+
+
+def _unshare_mapped(flags, id_map):
+    """unshare(flags), with id_map written as our uid and gid map by a child still in the host namespace"""
+    target = os.getpid()
+    go_read, go_write = os.pipe()
+    helper = os.fork()
+    if not helper:
+        os.close(go_write)
+        if not os.read(go_read, 1):
+            os._exit(1)  # unshare failed
+        try:
+            _write(f"/proc/{target}/uid_map", id_map)
+            _write(f"/proc/{target}/gid_map", id_map)
+        except OSError:
+            os._exit(1)
+        os._exit(0)
+    os.close(go_read)
+    try:
+        _call("unshare", flags)
+        os.write(go_write, b"1")
+    finally:
+        os.close(go_write)
+        _, wait_status = os.waitpid(helper, 0)
+    if wait_status != 0:
+        raise OSError("could not write the sandbox uid/gid map")
+
+
+def _isolate(limits):
+    """
+    Move this process into new namespaces and pivot into a minimal root
+    built on the (empty) working directory. The next fork is pid 1 of the
+    new pid namespace. Raises OSError if any step fails: the caller must
+    not run the code then.
+    """
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWIPC | CLONE_NEWUTS
+    if limits.get("no_network", True):
+        flags |= CLONE_NEWNET  # Only a down loopback, no routes
+    if uid == 0:
+        # A root web server keeps root inside for the setup and maps the
+        # program to an unprivileged host uid. Only a process left in the
+        # host namespace may write a two-line map (what newuidmap does).
+        sandbox_id = int(limits.get("uid", SANDBOX_UID))
+        _unshare_mapped(flags, f"0 0 1\n{SANDBOX_UID} {sandbox_id} 1")
+    else:
+        # Any other uid can only map itself: the program keeps this host uid (without capabilities)
+        _call("unshare", flags)
+        _write("/proc/self/setgroups", "deny")
+        _write("/proc/self/uid_map", f"{SANDBOX_UID} {uid} 1")
+        _write("/proc/self/gid_map", f"{SANDBOX_UID} {gid} 1")
+
+    root = os.getcwd()
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)  # Nothing below propagates back to the host
+    _mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "size=1m,mode=0755")
+    for path in SYSTEM_PATHS + tuple(_python_paths()):
+        if os.path.lexists(path):
+            _bind_readonly(path, root)
+    os.makedirs(root + "/dev", exist_ok=True)
+    for name in DEVICES:
+        _bind_readonly("/dev/" + name, root)
+    os.mkdir(root + "/tmp")
+    tmp_size = int(limits.get("tmp_bytes", 4 * 1024 * 1024))
+    _mount("tmpfs", root + "/tmp", "tmpfs", MS_NOSUID | MS_NODEV,
+           f"size={tmp_size},mode=1777")
+
+    import ctypes
+    import platform
+    syscall_number = SYS_PIVOT_ROOT.get(platform.machine())
+    if syscall_number is None:
+        raise OSError(f"pivot_root is not known on {platform.machine()}")
+    os.chdir(root)
+    _call("syscall", ctypes.c_long(syscall_number), b".", b".")
+    _call("umount2", b".", MNT_DETACH)  # The host's root, stacked under the new one
+    os.chdir("/")
+    _mount(None, "/", None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+def _drop_privileges(as_root):
+    """Become SANDBOX_UID with no capabilities and no way to gain any"""
+    import ctypes
+    if as_root:
+        os.setgroups([])
+    os.setresgid(SANDBOX_UID, SANDBOX_UID, SANDBOX_UID)
+    os.setresuid(SANDBOX_UID, SANDBOX_UID, SANDBOX_UID)
+    _call("prctl", PR_SET_NO_NEW_PRIVS, ctypes.c_ulong(1), ctypes.c_ulong(0), ctypes.c_ulong(0), ctypes.c_ulong(0))
+    header = (ctypes.c_uint32 * 2)(LINUX_CAPABILITY_VERSION_3, 0)
+    data = (ctypes.c_uint32 * 6)()  # effective, permitted, inheritable x 2: all empty
+    _call("capset", header, data)
+
+
+def _apply_limits(limits):
+    import resource
+    cpu = int(limits.get("cpu_seconds", 5))
+    memory = int(limits.get("memory_bytes", 256 * 1024 * 1024))
+    file_size = int(limits.get("file_size_bytes", 1024 * 1024))
+    processes = int(limits.get("max_processes", 16))
+
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+
+
+def _setup_failed(e):
+    sys.stderr.write(f"sandbox setup failed: {e}\n")
+    sys.stderr.flush()
+    os._exit(SANDBOX_SETUP_FAILED)
+
+
+def _init(program, parent_alive, program_ready, status_fd):
+    """
+    pid 1 of the sandbox: wait for the program, reap orphans reparented to
+    us, report, exit. Dies with the runner (PDEATHSIG), so a runner killed
+    on a timeout takes the whole namespace with it. program_ready gets a
+    byte once the program has locked itself down; without it the program
+    exited in setup and never ran the code.
+    """
+    import ctypes
+    try:
+        _call("prctl", PR_SET_PDEATHSIG, ctypes.c_ulong(signal.SIGKILL), ctypes.c_ulong(0), ctypes.c_ulong(0),
+              ctypes.c_ulong(0))
+    except OSError:
+        os._exit(SANDBOX_SETUP_FAILED)
+    if select.select([parent_alive], [], [], 0)[0]:
+        os._exit(SANDBOX_SETUP_FAILED)  # Runner died before PDEATHSIG was armed (EOF)
+    os.close(parent_alive)
+
+    while True:
+        pid, exit_status = os.waitpid(-1, 0)
+        if pid == program:
+            break
+    setup_failed = os.read(program_ready, 1) != b"1"  # The program and its copy of the pipe are gone: no blocking
+    descendants = False
+    try:
+        while True:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                descendants = True  # Still running; killed when we exit
+                break
+    except ChildProcessError:
+        pass
+    if status_fd is not None:
+        os.write(status_fd, json.dumps({"exit_status": exit_status, "descendants": descendants,
+                                        "setup_failed": setup_failed}).encode())
+    os._exit(SANDBOX_SETUP_FAILED if setup_failed else 0)
+
+
+def _sandbox(limits, status_fd):
+    """Isolate, fork init and the program; returns in the program process only"""
+    as_root = os.getuid() == 0
+    try:
+        _isolate(limits)
+        parent_alive, alive_writer = os.pipe()
+    except Exception as e:
+        _setup_failed(e)
+
+    pid = os.fork()
+    if pid:
+        # Runner: exit 0, or SANDBOX_SETUP_FAILED if init says so. Never the
+        # program's exit code (a program may exit 125 too): that goes
+        # through status_fd
+        os.close(parent_alive)
+        if status_fd is not None:
+            os.close(status_fd)
+        _, wait_status = os.waitpid(pid, 0)
+        failed = os.waitstatus_to_exitcode(wait_status) == SANDBOX_SETUP_FAILED
+        os._exit(SANDBOX_SETUP_FAILED if failed else 0)
+
+    os.close(alive_writer)
+    program_ready, ready_writer = os.pipe()
+    program = os.fork()
+    if program:
+        os.close(ready_writer)
+        _init(program, parent_alive, program_ready, status_fd)
+
+    os.close(parent_alive)
+    os.close(program_ready)
+    if status_fd is not None:
+        os.close(status_fd)
+    try:
+        _apply_limits(limits)
+        _drop_privileges(as_root)
+        os.chdir("/tmp")
+        os.write(ready_writer, b"1")
+        os.close(ready_writer)
+    except Exception as e:
+        _setup_failed(e)
+
+
+def _preload(modules):
+    import importlib
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def main():
+    if len(sys.argv) > 1:
+        _preload(m for m in sys.argv[1].split(',') if m)
+    status_fd = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    line = sys.stdin.readline()
+    if not line:
+        return  # Pool shut down before a job arrived
+    job = json.loads(line)
+
+    _sandbox(job.get("limits", {}), status_fd)
+
+    sys.stdin = io.StringIO(job.get("stdin", ""))
+    if job.get("line_buffered"):
+        sys.stdout.reconfigure(line_buffering=True)  # Streamed runs: each print reaches the parent at once
+    globals_ns = {"__name__": "__main__", "__builtins__": __builtins__}
+    exit_code = 0
+    try:
+        exec(compile(job["code"], "main.py", "exec"), globals_ns)
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Hide this runner's frame so the traceback looks like a plain `python main.py`
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 1
+
+    # Skip interpreter teardown (module finalizers, GC of preloaded modules):
+    # run the program's atexit hooks, flush, and leave.
+    import atexit
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    os._exit(exit_code & 0xFF)
+
+
+if __name__ == "__main__":
+    main()